@@ -0,0 +1,343 @@
+import math
+import random
+import threading
+from dataclasses import replace
+
+from generacion import limitador_global
+from metricas import incrementar
+from resiliencia import CircuitoAbiertoError
+
+# --- Examen adaptativo con parada temprana ---
+# En lugar de 10 preguntas fijas del nivel elegido, cada pregunta se elige según las
+# respuestas anteriores y el examen termina en cuanto la habilidad del estudiante está
+# estimada con la precisión buscada. Menos preguntas generadas = menos llamadas al modelo.
+#
+# Modelo (teoría de respuesta al ítem, 3 parámetros con discriminación y azar fijos):
+#   P(correcta | θ, nivel) = AZAR + (1 - AZAR) / (1 + exp(-DISCRIMINACION * (θ - b[nivel])))
+# con b repartido de forma pareja entre -1.5 (primer nivel del catálogo) y 1.5 (último)
+# y AZAR = 1/4 por las cuatro opciones. La habilidad θ se estima con una posterior
+# bayesiana sobre una grilla:
+#   - global: prior N(b[nivel elegido por el estudiante], 1) y todas las respuestas;
+#     su desvío es el error de la estimación y decide cuándo parar
+#   - por sub-tema: prior normal centrada en la estimación global sin ese sub-tema
+#     (ensanchada en DISPERSION_SUB_TEMA, lo que se espera que un sub-tema se aparte del
+#     resto) y las respuestas del sub-tema
+# La siguiente pregunta es del nivel que más reduce, en valor esperado, la varianza de la
+# estimación global, y del sub-tema cuya estimación más se reduce con ella, ponderado por el
+# peso del sub-tema en el catálogo (así se recorren primero los sub-temas sin respuestas).
+# El examen para cuando el error global baja de ERROR_OBJETIVO (con al menos MIN_PREGUNTAS),
+# o al llegar a MAX_PREGUNTAS. Con ERROR_OBJETIVO = 0.6 el error real de la estimación es el
+# mismo que con el examen fijo de 10 preguntas, con unas 7 preguntas en promedio
+# (ver benchmarks/bench_adaptativo.py).
+
+DISCRIMINACION = 1.7
+AZAR = 0.25
+DISPERSION_SUB_TEMA = 0.7
+GRILLA = tuple(-4.0 + 0.1 * i for i in range(81))
+
+MIN_PREGUNTAS = 4
+MAX_PREGUNTAS = 15
+ERROR_OBJETIVO = 0.6
+
+
+def dificultades(niveles):
+    """Retorna {nivel: b}, repartiendo los niveles (en orden) de forma pareja en [-1.5, 1.5]."""
+    if len(niveles) == 1:
+        return {niveles[0]: 0.0}
+    paso = 3.0 / (len(niveles) - 1)
+    return {nivel: -1.5 + i * paso for i, nivel in enumerate(niveles)}
+
+
+def prob_correcta(theta, b):
+    return AZAR + (1 - AZAR) / (1 + math.exp(-DISCRIMINACION * (theta - b)))
+
+
+def dominio(theta, b):
+    """Probabilidad de saber (no adivinar) la respuesta de una pregunta de dificultad `b`."""
+    return 1 / (1 + math.exp(-DISCRIMINACION * (theta - b)))
+
+
+class Posterior:
+    """Distribución de la habilidad sobre GRILLA."""
+
+    __slots__ = ("pesos",)
+
+    def __init__(self, media=0.0, desvio=1.0):
+        self.pesos = [math.exp(-0.5 * ((t - media) / desvio) ** 2) for t in GRILLA]
+        self._normalizar()
+
+    def _normalizar(self):
+        total = sum(self.pesos)
+        self.pesos = [p / total for p in self.pesos]
+
+    def actualizar(self, b, correcta):
+        self.pesos = [
+            p * (prob_correcta(t, b) if correcta else 1 - prob_correcta(t, b))
+            for p, t in zip(self.pesos, GRILLA)
+        ]
+        self._normalizar()
+        return self
+
+    @property
+    def media(self):
+        return sum(p * t for p, t in zip(self.pesos, GRILLA))
+
+    @property
+    def desvio(self):
+        media = self.media
+        return math.sqrt(sum(p * (t - media) ** 2 for p, t in zip(self.pesos, GRILLA)))
+
+    def varianza_esperada(self, b):
+        """Varianza de la posterior que se espera tras una pregunta de dificultad `b`."""
+        aciertos = [p * prob_correcta(t, b) for p, t in zip(self.pesos, GRILLA)]
+        errores = [p - a for p, a in zip(self.pesos, aciertos)]
+        esperada = 0.0
+        for pesos in (aciertos, errores):
+            masa = sum(pesos)
+            if masa > 0:
+                media = sum(p * t for p, t in zip(pesos, GRILLA)) / masa
+                esperada += sum(p * (t - media) ** 2 for p, t in zip(pesos, GRILLA))
+        return esperada
+
+
+class EstimadorHabilidad:
+    """
+    Estimación de la habilidad del estudiante, global y por sub-tema, a partir de sus
+    respuestas (sub_tema, nivel, correcta).
+    """
+
+    def __init__(self, niveles, nivel_inicial):
+        self.niveles = list(niveles)
+        self.b = dificultades(self.niveles)
+        self.nivel_inicial = nivel_inicial
+        self.respuestas = []
+
+    def registrar(self, sub_tema, nivel, correcta):
+        self.respuestas.append((sub_tema, nivel if nivel in self.b else self.nivel_inicial, bool(correcta)))
+
+    def posterior(self, excepto=None):
+        """Posterior global; con `excepto` se omiten las respuestas de ese sub-tema."""
+        posterior = Posterior(self.b[self.nivel_inicial], 1.0)
+        for sub_tema, nivel, correcta in self.respuestas:
+            if sub_tema != excepto:
+                posterior.actualizar(self.b[nivel], correcta)
+        return posterior
+
+    def posterior_sub_tema(self, sub_tema):
+        previa = self.posterior(excepto=sub_tema)
+        posterior = Posterior(previa.media, math.sqrt(previa.desvio ** 2 + DISPERSION_SUB_TEMA ** 2))
+        for otro, nivel, correcta in self.respuestas:
+            if otro == sub_tema:
+                posterior.actualizar(self.b[nivel], correcta)
+        return posterior
+
+    @property
+    def error(self):
+        return self.posterior().desvio
+
+    def terminado(self, min_preguntas=MIN_PREGUNTAS, max_preguntas=MAX_PREGUNTAS, error_objetivo=ERROR_OBJETIVO):
+        n = len(self.respuestas)
+        return n >= max_preguntas or (n >= min_preguntas and self.error <= error_objetivo)
+
+    def candidatos(self, sub_temas, pesos=None):
+        """
+        Pares (sub_tema, nivel) ordenados del más al menos informativo. El nivel es el mismo
+        para todos (el que más informa sobre la habilidad global); los empates se rompen al azar.
+        """
+        global_ = self.posterior()
+        _, nivel = min((global_.varianza_esperada(b), nivel) for nivel, b in self.b.items())
+        puntajes = []
+        for sub_tema in sub_temas:
+            peso = (pesos or {}).get(sub_tema, 1)
+            if peso <= 0:
+                continue
+            posterior = self.posterior_sub_tema(sub_tema)
+            ganancia = posterior.desvio ** 2 - posterior.varianza_esperada(self.b[nivel])
+            puntajes.append((round(peso * ganancia, 9), random.random(), sub_tema, nivel))
+        puntajes.sort(reverse=True)
+        return [(sub_tema, nivel) for _, _, sub_tema, nivel in puntajes]
+
+    def resumen(self):
+        """
+        Resultado para la vista de resultados y el PDF: habilidad global con su intervalo del
+        95 %, nivel estimado, dominio del nivel del examen y el detalle por sub-tema.
+        """
+        posterior = self.posterior()
+        habilidad, error = posterior.media, posterior.desvio
+        b_examen = self.b[self.nivel_inicial]
+        por_sub_tema = {}
+        for sub_tema, _, correcta in self.respuestas:
+            fila = por_sub_tema.setdefault(sub_tema, {"sub_tema": sub_tema, "preguntas": 0, "aciertos": 0})
+            fila["preguntas"] += 1
+            fila["aciertos"] += int(correcta)
+        for sub_tema, fila in por_sub_tema.items():
+            fila["dominio"] = round(dominio(self.posterior_sub_tema(sub_tema).media, b_examen), 2)
+        return {
+            "preguntas": len(self.respuestas),
+            "habilidad": round(habilidad, 2),
+            "error": round(error, 2),
+            "nivel_estimado": min(self.b, key=lambda nivel: abs(self.b[nivel] - habilidad)),
+            "nivel_examen": self.nivel_inicial,
+            "dominio": round(dominio(habilidad, b_examen), 2),
+            "dominio_intervalo": (round(dominio(habilidad - 1.96 * error, b_examen), 2),
+                                  round(dominio(habilidad + 1.96 * error, b_examen), 2)),
+            "sub_temas": sorted(por_sub_tema.values(), key=lambda f: f["dominio"]),
+        }
+
+
+def estimar(preguntas, respuestas, niveles, nivel_examen):
+    """Arma el estimador a partir de las preguntas (con su sub_tema y nivel) y las respuestas del examen."""
+    estimador = EstimadorHabilidad(niveles, nivel_examen)
+    for respuesta in respuestas:
+        pregunta = respuesta.pregunta(preguntas)
+        estimador.registrar(pregunta.sub_tema, pregunta.nivel or nivel_examen, respuesta.es_correcta(preguntas))
+    return estimador
+
+
+class GeneradorExamenAdaptativo:
+    """
+    Genera el examen adaptativo de a una pregunta, en un hilo de fondo, después de cada
+    respuesta. Tiene la misma interfaz que GeneradorExamenProgresivo para la app
+    (`preguntas`, `esperar`, `avanzar_a`, `detener`) más `registrar(respuesta)` y `terminado`.
+
+    Como la siguiente pregunta depende de la última respuesta no se generan preguntas por
+    adelantado; para no esperar al modelo en cada una, se toman primero del banco
+    (`banco.extraer`) y del `generador_local`, y solo si no hay se pide una al modelo con
+    `generar_lote_fn` / `parse_lote_fn`. Si el sub-tema elegido falla, se prueba el siguiente
+    candidato. `filtro`, `pesos` y `preguntas_previas` funcionan igual que en
+    GeneradorExamenProgresivo; `respuestas_previas` son las respuestas ya dadas (al retomar).
+    Cada pregunta generada lleva su `sub_tema` y su `nivel`.
+    """
+
+    def __init__(self, sub_temas, niveles, nivel_inicial, generar_lote_fn, parse_lote_fn,
+                 pesos=None, limiter=None, banco=None, filtro=None, generador_local=None,
+                 preguntas_previas=(), respuestas_previas=(), min_preguntas=MIN_PREGUNTAS,
+                 max_preguntas=MAX_PREGUNTAS, error_objetivo=ERROR_OBJETIVO, max_fallos=3,
+                 inactividad_maxima=1800):
+        self.sub_temas = list(sub_temas)
+        self.pesos = pesos
+        self.generar_lote_fn = generar_lote_fn
+        self.parse_lote_fn = parse_lote_fn
+        self.limiter = limiter or limitador_global()
+        self.banco = banco
+        self.filtro = filtro
+        self.generador_local = generador_local
+        self.min_preguntas = min_preguntas
+        self.total = max_preguntas
+        self.error_objetivo = error_objetivo
+        self.max_fallos = max_fallos
+        self.inactividad_maxima = inactividad_maxima
+        self.preguntas = list(preguntas_previas)
+        self.estimador = estimar(self.preguntas, respuestas_previas, niveles, nivel_inicial)
+        self.error = None
+        self._detener = False
+        self._condicion = threading.Condition()
+        self._hilo = threading.Thread(target=self._trabajar, name="examen-adaptativo", daemon=True)
+        self._hilo.start()
+
+    @property
+    def terminado(self):
+        return self.estimador.terminado(self.min_preguntas, self.total, self.error_objetivo)
+
+    @property
+    def completo(self):
+        return self.terminado
+
+    def registrar(self, respuesta):
+        """Actualiza la estimación con la respuesta y, si el examen sigue, prepara la siguiente pregunta."""
+        with self._condicion:
+            pregunta = respuesta.pregunta(self.preguntas)
+            self.estimador.registrar(pregunta.sub_tema, pregunta.nivel, respuesta.es_correcta(self.preguntas))
+            self._condicion.notify_all()
+
+    def avanzar_a(self, indice):
+        with self._condicion:
+            self._condicion.notify_all()
+
+    def esperar(self, indice, timeout=None):
+        """
+        Bloquea hasta que la pregunta `indice` exista y la retorna.
+        Lanza la excepción del hilo de fondo si la generación falló, o TimeoutError.
+        """
+        with self._condicion:
+            listo = self._condicion.wait_for(
+                lambda: len(self.preguntas) > indice or self.error is not None or self._detener or self.terminado,
+                timeout=timeout,
+            )
+            if len(self.preguntas) > indice:
+                return self.preguntas[indice]
+            if self.error is not None:
+                raise self.error
+            if not listo:
+                raise TimeoutError(f"La pregunta {indice + 1} no estuvo lista a tiempo.")
+            raise RuntimeError("El examen adaptativo ya terminó." if self.terminado else "La generación del examen fue detenida.")
+
+    def detener(self):
+        with self._condicion:
+            self._detener = True
+            self._condicion.notify_all()
+
+    def _generar(self, sub_tema, nivel):
+        """Una pregunta de `sub_tema` y `nivel`: del banco, local o del modelo; None si no se pudo."""
+        if self.banco is not None:
+            for _, pregunta in self.banco.extraer([sub_tema], nivel, 1):
+                if self.filtro is None or self.filtro(pregunta):
+                    incrementar("examen_adaptativo_preguntas_total", origen="banco")
+                    return pregunta
+        if self.generador_local is not None:
+            pregunta = self.generador_local(sub_tema, nivel)
+            if pregunta is not None:
+                incrementar("examen_adaptativo_preguntas_total", origen="local")
+                return pregunta
+        self.limiter.acquire()
+        validas, _ = self.parse_lote_fn(self.generar_lote_fn([sub_tema], nivel), [sub_tema])
+        for _, pregunta in validas:
+            if self.filtro is None or self.filtro(pregunta):
+                incrementar("examen_adaptativo_preguntas_total", origen="modelo")
+                return pregunta
+        return None
+
+    def _trabajar(self):
+        fallos = 0
+        ultimo_error = None
+        candidatos = []
+        while True:
+            with self._condicion:
+                # Se espera a que el estudiante responda la última pregunta generada
+                hay_trabajo = self._condicion.wait_for(
+                    lambda: self._detener or len(self.preguntas) <= len(self.estimador.respuestas),
+                    timeout=self.inactividad_maxima,
+                )
+                if self._detener or not hay_trabajo or self.terminado:
+                    self._condicion.notify_all()
+                    return
+                if not candidatos:
+                    candidatos = self.estimador.candidatos(self.sub_temas, self.pesos)
+            sub_tema, nivel = candidatos.pop(0)
+            pregunta = None
+            try:
+                pregunta = self._generar(sub_tema, nivel)
+            except CircuitoAbiertoError as e:
+                # La API está caída: no tiene sentido seguir intentando
+                with self._condicion:
+                    self.error = e
+                    self._condicion.notify_all()
+                return
+            except Exception as e:
+                # Un error aislado (ya reintentado por el backend) cuenta como un intento fallido
+                ultimo_error = e
+            with self._condicion:
+                if pregunta is not None:
+                    self.preguntas.append(replace(pregunta, sub_tema=sub_tema, nivel=nivel))
+                    fallos = 0
+                    candidatos = []
+                else:
+                    # Se prueba con el siguiente sub-tema más informativo
+                    fallos += 1
+                    if fallos >= self.max_fallos or not candidatos:
+                        self.error = ultimo_error or RuntimeError(
+                            f"No se pudo generar una pregunta válida tras {fallos} intentos."
+                        )
+                self._condicion.notify_all()
+                if self.error is not None:
+                    return
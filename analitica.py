@@ -0,0 +1,271 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+
+# --- Analítica de exámenes terminados, para el instructor ---
+# Cada examen terminado (en la app o en la API) se agrega a un almacén SQLite propio,
+# separado de las sesiones, pensado para agregar rápido cientos de miles de respuestas:
+#   - los textos (temas, sub-temas, niveles, preguntas y opciones) se guardan una sola vez
+#     en `textos`; las respuestas solo llevan sus ids enteros (codificación por diccionario)
+#   - `respuestas` es una tabla angosta, una fila por respuesta, con índices que cubren las
+#     consultas: las agregaciones se resuelven con GROUP BY dentro de SQLite, sobre el
+#     índice, sin recorrer filas en Python; solo los resultados (pocas filas) se decodifican
+#   - cada examen (o lote de exámenes) se inserta en una sola transacción con executemany
+# Las consultas retornan listas de diccionarios, listas para st.dataframe.
+#
+# Uso por consola:
+#   python analitica.py [--tema "..."] [--nivel "..."] [--limite 10]
+# Archivo: ANALITICA_DB (por defecto analitica_examenes.sqlite3).
+
+RUTA_ANALITICA_POR_DEFECTO = os.environ.get("ANALITICA_DB", "analitica_examenes.sqlite3")
+
+# Máximo de parámetros por consulta con IN (...): el límite de SQLite es 999 en versiones antiguas
+_BLOQUE_IN = 500
+
+
+def _texto_opcion(opcion):
+    """Texto de la opción sin la letra ("B) 255.255.255.0" -> "255.255.255.0"): las letras se barajan."""
+    return opcion.partition(") ")[2] or opcion
+
+
+class AlmacenAnalitica:
+    """Respuestas de los exámenes terminados y las agregaciones de la vista del instructor."""
+
+    def __init__(self, ruta=RUTA_ANALITICA_POR_DEFECTO):
+        self.ruta = ruta
+        with self._conectar() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """CREATE TABLE IF NOT EXISTS textos (
+                       id INTEGER PRIMARY KEY,
+                       texto TEXT NOT NULL UNIQUE
+                   );
+                   CREATE TABLE IF NOT EXISTS examenes (
+                       id INTEGER PRIMARY KEY,
+                       exam_id TEXT NOT NULL UNIQUE,
+                       user_name TEXT NOT NULL,
+                       tema INTEGER NOT NULL,
+                       nivel INTEGER NOT NULL,
+                       score INTEGER NOT NULL,
+                       total INTEGER NOT NULL,
+                       registrado REAL NOT NULL
+                   );
+                   CREATE TABLE IF NOT EXISTS respuestas (
+                       examen INTEGER NOT NULL,
+                       tema INTEGER NOT NULL,
+                       nivel INTEGER NOT NULL,
+                       sub_tema INTEGER NOT NULL,
+                       pregunta INTEGER NOT NULL,
+                       elegida INTEGER NOT NULL,
+                       correcta INTEGER NOT NULL,
+                       segundos REAL
+                   );
+                   CREATE INDEX IF NOT EXISTS respuestas_por_tema
+                       ON respuestas (tema, nivel, sub_tema, pregunta, correcta, segundos);
+                   CREATE INDEX IF NOT EXISTS respuestas_incorrectas
+                       ON respuestas (correcta, tema, nivel, pregunta, elegida, sub_tema);"""
+            )
+
+    def _conectar(self):
+        # Una conexión por operación: sqlite3 no permite compartir conexiones entre hilos.
+        # closing(): `with conn` solo confirma la transacción, no cierra la conexión
+        return closing(sqlite3.connect(self.ruta, timeout=30))
+
+    # --- Escritura ---
+
+    @staticmethod
+    def _ids_textos(conn, textos):
+        """Retorna {texto: id}, agregando a `textos` los que todavía no tienen id."""
+        textos = list(set(textos))
+        conn.executemany("INSERT OR IGNORE INTO textos (texto) VALUES (?)", [(t,) for t in textos])
+        ids = {}
+        for i in range(0, len(textos), _BLOQUE_IN):
+            bloque = textos[i:i + _BLOQUE_IN]
+            marcadores = ",".join("?" for _ in bloque)
+            ids.update(conn.execute(f"SELECT texto, id FROM textos WHERE texto IN ({marcadores})", bloque))
+        return ids
+
+    def registrar_examenes(self, estados):
+        """
+        Agrega exámenes terminados. Cada estado es un diccionario con las claves de
+        st.session_state (el mismo formato que AlmacenSesiones.cargar): exam_id, user_name,
+        exam_level, exam_topic, score, total_questions, questions y user_answers.
+        Los exámenes ya registrados se ignoran, así que registrar dos veces no duplica respuestas.
+        Retorna la cantidad de respuestas agregadas.
+        """
+        estados = [e for e in estados if e.get('exam_id')]
+        if not estados:
+            return 0
+        textos = []
+        for estado in estados:
+            textos += (estado['exam_topic'], estado['exam_level'])
+            for respuesta in estado['user_answers']:
+                pregunta = respuesta.pregunta(estado['questions'])
+                textos += (pregunta.sub_tema or estado['exam_topic'], pregunta.nivel or estado['exam_level'],
+                           pregunta.question, _texto_opcion(pregunta.opcion(respuesta.user_choice_char)))
+
+        with self._conectar() as conn, conn:
+            ids = self._ids_textos(conn, textos)
+            filas = []
+            for estado in estados:
+                tema, nivel = ids[estado['exam_topic']], ids[estado['exam_level']]
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO examenes (exam_id, user_name, tema, nivel, score, total, registrado)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (estado['exam_id'], estado.get('user_name') or "", tema, nivel, estado['score'],
+                     estado['total_questions'], time.time()),
+                )
+                if not cursor.rowcount:
+                    continue
+                for respuesta in estado['user_answers']:
+                    pregunta = respuesta.pregunta(estado['questions'])
+                    # En el examen adaptativo cada pregunta tiene su propio nivel
+                    filas.append((
+                        cursor.lastrowid, tema, ids[pregunta.nivel] if pregunta.nivel else nivel,
+                        ids[pregunta.sub_tema or estado['exam_topic']],
+                        ids[pregunta.question], ids[_texto_opcion(pregunta.opcion(respuesta.user_choice_char))],
+                        int(respuesta.es_correcta(estado['questions'])), respuesta.segundos,
+                    ))
+            conn.executemany(
+                """INSERT INTO respuestas (examen, tema, nivel, sub_tema, pregunta, elegida, correcta, segundos)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                filas,
+            )
+        return len(filas)
+
+    def registrar_examen(self, estado):
+        return self.registrar_examenes([estado])
+
+    # --- Consultas ---
+
+    def _filtro(self, conn, tema, nivel, condiciones=()):
+        """Cláusula WHERE y parámetros para filtrar por tema y nivel (por texto)."""
+        condiciones, parametros = list(condiciones), []
+        for columna, valor in (("tema", tema), ("nivel", nivel)):
+            if valor is not None:
+                fila = conn.execute("SELECT id FROM textos WHERE texto = ?", (valor,)).fetchone()
+                condiciones.append(f"{columna} = ?")
+                parametros.append(fila[0] if fila else -1)
+        return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), parametros
+
+    @staticmethod
+    def _textos(conn, ids):
+        ids = list(set(ids))
+        textos = {}
+        for i in range(0, len(ids), _BLOQUE_IN):
+            bloque = ids[i:i + _BLOQUE_IN]
+            marcadores = ",".join("?" for _ in bloque)
+            textos.update(conn.execute(f"SELECT id, texto FROM textos WHERE id IN ({marcadores})", bloque))
+        return textos
+
+    def precision_por_sub_tema(self, tema=None, nivel=None):
+        """
+        Por sub-tema y nivel: respuestas, aciertos, precisión y segundos promedio por pregunta.
+        Ordenado de menor a mayor precisión (los sub-temas que más fallan primero).
+        """
+        with self._conectar() as conn:
+            donde, parametros = self._filtro(conn, tema, nivel)
+            filas = conn.execute(
+                f"""SELECT sub_tema, nivel, COUNT(*), SUM(correcta), AVG(segundos) FROM respuestas{donde}
+                    GROUP BY sub_tema, nivel ORDER BY AVG(correcta), COUNT(*) DESC""",
+                parametros,
+            ).fetchall()
+            textos = self._textos(conn, [f[0] for f in filas] + [f[1] for f in filas])
+        return [
+            {"sub_tema": textos[sub_tema], "nivel": textos[id_nivel], "respuestas": cantidad,
+             "aciertos": aciertos, "precision": aciertos / cantidad,
+             "segundos_promedio": round(segundos, 1) if segundos is not None else None}
+            for sub_tema, id_nivel, cantidad, aciertos, segundos in filas
+        ]
+
+    def distractores_frecuentes(self, tema=None, nivel=None, limite=20):
+        """Las opciones incorrectas más elegidas: pregunta, sub-tema, opción y veces elegida."""
+        with self._conectar() as conn:
+            donde, parametros = self._filtro(conn, tema, nivel, condiciones=["correcta = 0"])
+            filas = conn.execute(
+                f"""SELECT pregunta, elegida, MIN(sub_tema), COUNT(*) FROM respuestas{donde}
+                    GROUP BY pregunta, elegida ORDER BY COUNT(*) DESC LIMIT ?""",
+                parametros + [limite],
+            ).fetchall()
+            textos = self._textos(conn, [i for f in filas for i in f[:3]])
+        return [
+            {"sub_tema": textos[sub_tema], "pregunta": textos[pregunta], "opcion": textos[elegida], "veces": veces}
+            for pregunta, elegida, sub_tema, veces in filas
+        ]
+
+    def tiempo_por_pregunta(self, tema=None, nivel=None, limite=20):
+        """Las preguntas en que los estudiantes más tardan: segundos promedio, respuestas y precisión."""
+        with self._conectar() as conn:
+            donde, parametros = self._filtro(conn, tema, nivel, condiciones=["segundos IS NOT NULL"])
+            filas = conn.execute(
+                f"""SELECT pregunta, MIN(sub_tema), AVG(segundos), COUNT(*), AVG(correcta) FROM respuestas{donde}
+                    GROUP BY pregunta ORDER BY AVG(segundos) DESC LIMIT ?""",
+                parametros + [limite],
+            ).fetchall()
+            textos = self._textos(conn, [i for f in filas for i in f[:2]])
+        return [
+            {"sub_tema": textos[sub_tema], "pregunta": textos[pregunta], "segundos_promedio": round(segundos, 1),
+             "respuestas": cantidad, "precision": precision}
+            for pregunta, sub_tema, segundos, cantidad, precision in filas
+        ]
+
+    def resumen(self, tema=None, nivel=None):
+        """Cantidad de exámenes y respuestas, precisión global y segundos promedio por pregunta."""
+        with self._conectar() as conn:
+            donde, parametros = self._filtro(conn, tema, nivel)
+            examenes = conn.execute(f"SELECT COUNT(*) FROM examenes{donde}", parametros).fetchone()[0]
+            respuestas, precision, segundos = conn.execute(
+                f"SELECT COUNT(*), AVG(correcta), AVG(segundos) FROM respuestas{donde}", parametros
+            ).fetchone()
+        return {"examenes": examenes, "respuestas": respuestas, "precision": precision,
+                "segundos_promedio": round(segundos, 1) if segundos is not None else None}
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def almacen_analitica():
+    """Retorna el almacén de analítica compartido por el proceso, creándolo la primera vez."""
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None:
+            _almacen = AlmacenAnalitica()
+        return _almacen
+
+
+def _imprimir_tabla(titulo, filas):
+    print(f"\n{titulo}")
+    if not filas:
+        print("  (sin datos)")
+        return
+    for fila in filas:
+        print("  " + " | ".join(
+            f"{k}={v:.0%}" if k == "precision" else f"{k}={v}" for k, v in fila.items()
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen de los exámenes terminados para el instructor.")
+    parser.add_argument("--tema", default=None)
+    parser.add_argument("--nivel", default=None)
+    parser.add_argument("--limite", type=int, default=10, help="Filas de distractores y de tiempos")
+    parser.add_argument("--db", default=RUTA_ANALITICA_POR_DEFECTO)
+    args = parser.parse_args(argv)
+
+    almacen = AlmacenAnalitica(args.db)
+    resumen = almacen.resumen(args.tema, args.nivel)
+    print(f"Exámenes: {resumen['examenes']}  Respuestas: {resumen['respuestas']}  "
+          f"Precisión: {resumen['precision'] or 0:.0%}  Segundos por pregunta: {resumen['segundos_promedio']}")
+    _imprimir_tabla("Precisión por sub-tema y nivel", almacen.precision_por_sub_tema(args.tema, args.nivel))
+    _imprimir_tabla("Distractores más elegidos", almacen.distractores_frecuentes(args.tema, args.nivel, args.limite))
+    _imprimir_tabla("Preguntas más lentas", almacen.tiempo_por_pregunta(args.tema, args.nivel, args.limite))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
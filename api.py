@@ -0,0 +1,302 @@
+import argparse
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from analitica import almacen_analitica
+from catalogo import catalogo_actual
+from duplicados import FiltroDuplicados, historial_examen
+from generacion import generar_preguntas_examen_lote_async, limitador_global
+from metricas import incrementar
+from modelos import Answer
+from reporte_pdf import generate_exam_pdf_cached, hora_peru
+from resiliencia import CircuitoAbiertoError
+from sesiones import almacen_global, nuevo_id_examen
+from subredes import pregunta_local
+from tutor import (
+    explicar_concepto_async, generar_ejercicio_async, evaluar_respuesta_y_dar_feedback_async,
+    generar_pregunta_multiple_choice_async, parse_multiple_choice_question,
+    generar_preguntas_lote_async, parse_lote_preguntas,
+)
+
+# --- API HTTP (ASGI) del tutor, sin Streamlit ---
+# Uso:
+#   python api.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+#
+# Expone las mismas funciones que la app como endpoints JSON para integrarlas con un LMS:
+#   GET  /salud
+#   POST /explicar                    {"tema", "regenerar"?}            -> {"explicacion"}
+#                                     (tema o sub-tema del catálogo)
+#   POST /ejercicio                   {"tema", "nivel"}                 -> {"ejercicio"}
+#   POST /evaluar                     {"ejercicio", "respuesta"}        -> {"retroalimentacion"}
+#   POST /pregunta                    {"tema", "nivel"}                 -> pregunta con su respuesta
+#   POST /examenes                    {"user_name", "nivel", "tema", "total"?}
+#   GET  /examenes/{exam_id}
+#   POST /examenes/{exam_id}/respuestas  {"question_index", "user_choice_char", "segundos"?}
+#   GET  /examenes/{exam_id}/pdf      -> application/pdf
+# Las llamadas al modelo son asíncronas y usan el backend compartido del proceso (una sola
+# conexión reutilizada, con reintentos y circuit breaker). Los exámenes se guardan en el
+# mismo almacén que la app (sesiones.py), así que un examen se puede seguir en cualquiera
+# de las dos y en cualquier réplica. Al terminar, el examen se agrega a la analítica del
+# instructor (analitica.py); "segundos" es el tiempo que el estudiante tardó en responder.
+
+MAX_PREGUNTAS_EXAMEN = 50
+INTENTOS_PREGUNTA = 3
+
+
+class ErrorSolicitud(Exception):
+    """Error del cliente: se responde con `estado` y el mensaje en JSON."""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+async def _leer_json(request, *requeridos):
+    try:
+        datos = await request.json()
+    except ValueError:
+        raise ErrorSolicitud("El cuerpo debe ser JSON válido")
+    if not isinstance(datos, dict):
+        raise ErrorSolicitud("El cuerpo debe ser un objeto JSON")
+    for campo in requeridos:
+        if not (isinstance(datos.get(campo), str) and datos[campo].strip()):
+            raise ErrorSolicitud(f"Falta el campo de texto '{campo}'")
+    return datos
+
+
+def _validar_nivel(nivel):
+    if nivel not in catalogo_actual().niveles:
+        raise ErrorSolicitud(f"Nivel desconocido: {nivel!r}")
+
+
+def _validar_tema(tema):
+    # Las explicaciones se guardan en la caché persistente: solo se aceptan temas del catálogo
+    catalogo = catalogo_actual()
+    if tema not in catalogo.temas and tema not in catalogo.todos_los_sub_temas:
+        raise ErrorSolicitud(f"Tema desconocido: {tema!r}")
+
+
+async def _modelo(corrutina):
+    """Espera una llamada al modelo y convierte sus errores en respuestas 502/503."""
+    try:
+        return await corrutina
+    except CircuitoAbiertoError as e:
+        raise ErrorSolicitud(str(e), estado=503)
+    except ErrorSolicitud:
+        raise
+    except Exception as e:
+        raise ErrorSolicitud(f"Error del modelo: {type(e).__name__}: {e}", estado=502)
+
+
+def _pregunta_para_estudiante(indice, pregunta):
+    """La pregunta sin la respuesta correcta ni la explicación."""
+    return {"question_index": indice, "question": pregunta.question, "options": list(pregunta.options)}
+
+
+async def _cargar_examen(exam_id):
+    estado = await run_in_threadpool(almacen_global().cargar, exam_id)
+    if estado is None:
+        raise ErrorSolicitud(f"No existe el examen {exam_id!r}", estado=404)
+    return estado
+
+
+# --- Endpoints ---
+
+async def salud(request):
+    return JSONResponse({"estado": "ok", "catalogo": catalogo_actual().version})
+
+
+async def explicar(request):
+    datos = await _leer_json(request, "tema")
+    _validar_tema(datos["tema"])
+    texto = await _modelo(explicar_concepto_async(datos["tema"], regenerar=bool(datos.get("regenerar"))))
+    return JSONResponse({"tema": datos["tema"], "explicacion": texto})
+
+
+async def ejercicio(request):
+    datos = await _leer_json(request, "tema", "nivel")
+    _validar_nivel(datos["nivel"])
+    texto = await _modelo(generar_ejercicio_async(datos["tema"], datos["nivel"]))
+    return JSONResponse({"tema": datos["tema"], "nivel": datos["nivel"], "ejercicio": texto})
+
+
+async def evaluar(request):
+    datos = await _leer_json(request, "ejercicio", "respuesta")
+    texto = await _modelo(evaluar_respuesta_y_dar_feedback_async(datos["ejercicio"], datos["respuesta"]))
+    return JSONResponse({"retroalimentacion": texto})
+
+
+async def pregunta(request):
+    datos = await _leer_json(request, "tema", "nivel")
+    _validar_nivel(datos["nivel"])
+    local = pregunta_local(datos["tema"], datos["nivel"])
+    if local is not None:
+        return JSONResponse(local.a_dict())
+    for _ in range(INTENTOS_PREGUNTA):
+        await limitador_global().acquire_async()
+        parseada = parse_multiple_choice_question(
+            await _modelo(generar_pregunta_multiple_choice_async(datos["tema"], datos["nivel"]))
+        )
+        if parseada:
+            return JSONResponse(parseada.a_dict())
+    raise ErrorSolicitud("El modelo no generó una pregunta válida; inténtalo de nuevo", estado=502)
+
+
+async def crear_examen(request):
+    datos = await _leer_json(request, "user_name", "nivel", "tema")
+    _validar_nivel(datos["nivel"])
+    catalogo = catalogo_actual()
+    if datos["tema"] not in catalogo.temas:
+        raise ErrorSolicitud(f"Tema desconocido: {datos['tema']!r}")
+    total = datos.get("total", 10)
+    if isinstance(total, bool) or not isinstance(total, int) or not 1 <= total <= MAX_PREGUNTAS_EXAMEN:
+        raise ErrorSolicitud(f"'total' debe ser un entero entre 1 y {MAX_PREGUNTAS_EXAMEN}")
+
+    pesos = catalogo.sub_temas_para(datos["tema"], datos["nivel"]) or dict.fromkeys(catalogo.sub_temas_de(datos["tema"]), 1)
+    exam_id = nuevo_id_examen()
+    almacen = almacen_global()
+    # El historial del estudiante se arma desde el almacén en el hilo del filtro (ver duplicados.py)
+    historial = partial(historial_examen, exam_id, datos["user_name"], almacen)
+    preguntas = await _modelo(generar_preguntas_examen_lote_async(
+        list(pesos), datos["nivel"], total, generar_preguntas_lote_async, parse_lote_preguntas,
+        pesos=pesos, filtro=FiltroDuplicados(historial=historial).es_nueva,
+        generador_local=pregunta_local,
+    ))
+
+    def guardar():
+        almacen.crear(exam_id, datos["user_name"], datos["nivel"], datos["tema"], total)
+        almacen.guardar_preguntas(exam_id, 0, preguntas)
+
+    await run_in_threadpool(guardar)
+    incrementar("api_examenes_total")
+    return JSONResponse({
+        "exam_id": exam_id,
+        "total_questions": total,
+        "questions": [_pregunta_para_estudiante(i, p) for i, p in enumerate(preguntas)],
+    }, status_code=201)
+
+
+async def ver_examen(request):
+    estado = await _cargar_examen(request.path_params["exam_id"])
+    preguntas = estado["questions"]
+    return JSONResponse({
+        "exam_id": estado["exam_id"],
+        "user_name": estado["user_name"],
+        "level": estado["exam_level"],
+        "topic": estado["exam_topic"],
+        "total_questions": estado["total_questions"],
+        "score": estado["score"],
+        "current_question_index": estado["current_question_index"],
+        "exam_finished": estado["exam_finished"],
+        "exam_finished_at": estado["exam_finished_at"],
+        "questions": [_pregunta_para_estudiante(i, p) for i, p in enumerate(preguntas)],
+        "user_answers": [
+            dict(respuesta.a_dict(), correcta=respuesta.es_correcta(preguntas))
+            for respuesta in estado["user_answers"]
+        ],
+    })
+
+
+async def responder(request):
+    exam_id = request.path_params["exam_id"]
+    datos = await _leer_json(request, "user_choice_char")
+    estado = await _cargar_examen(exam_id)
+    if estado["exam_finished"]:
+        raise ErrorSolicitud("El examen ya terminó", estado=409)
+    indice = estado["current_question_index"]
+    # Las preguntas se responden en orden; así un reintento del cliente no cuenta dos veces
+    if datos.get("question_index", indice) != indice:
+        raise ErrorSolicitud(f"Se esperaba la respuesta a la pregunta {indice}", estado=409)
+    if indice >= len(estado["questions"]):
+        raise ErrorSolicitud("La pregunta todavía no está disponible", estado=409)
+    letra = datos["user_choice_char"].strip().upper()
+    pregunta_actual = estado["questions"][indice]
+    if not pregunta_actual.opcion(letra):
+        raise ErrorSolicitud(f"Opción inválida: {letra!r}")
+    segundos = datos.get("segundos")
+    if segundos is not None and (isinstance(segundos, bool) or not isinstance(segundos, (int, float)) or segundos < 0):
+        raise ErrorSolicitud("'segundos' debe ser un número no negativo")
+
+    respuesta = Answer(question_index=indice, user_choice_char=letra, segundos=segundos)
+    correcta = respuesta.es_correcta(estado["questions"])
+    score = estado["score"] + (1 if correcta else 0)
+    terminado = indice + 1 >= estado["total_questions"]
+    almacen = almacen_global()
+
+    def guardar():
+        almacen.registrar_respuesta(exam_id, len(estado["user_answers"]), respuesta, score, indice + 1, estado["total_questions"])
+        if terminado:
+            almacen.finalizar(exam_id, hora_peru(), estado["total_questions"])
+            almacen_analitica().registrar_examen(dict(estado, score=score, user_answers=estado["user_answers"] + [respuesta]))
+
+    await run_in_threadpool(guardar)
+    return JSONResponse({
+        "correcta": correcta,
+        "correct_answer_char": pregunta_actual.correct_answer_char,
+        "explanation": pregunta_actual.explanation,
+        "score": score,
+        "current_question_index": indice + 1,
+        "exam_finished": terminado,
+    })
+
+
+async def pdf_examen(request):
+    estado = await _cargar_examen(request.path_params["exam_id"])
+    if not estado["exam_finished"]:
+        raise ErrorSolicitud("El reporte está disponible cuando el examen termina", estado=409)
+    # La construcción del PDF usa CPU: se hace fuera del event loop
+    pdf_bytes = await run_in_threadpool(
+        generate_exam_pdf_cached,
+        estado["score"], estado["total_questions"], estado["user_answers"], estado["questions"],
+        user_name=estado["user_name"] or "Estudiante", level=estado["exam_level"],
+        topic=estado["exam_topic"], fecha=estado["exam_finished_at"],
+    )
+    return Response(pdf_bytes, media_type="application/pdf", headers={
+        "Content-Disposition": f'attachment; filename="Resultados_Examen_Redes_{estado["exam_id"]}.pdf"',
+    })
+
+
+async def _manejar_error_solicitud(request, error):
+    incrementar("api_errores_total", estado=error.estado)
+    encabezados = {"Retry-After": "30"} if error.estado == 503 else None
+    return JSONResponse({"error": str(error)}, status_code=error.estado, headers=encabezados)
+
+
+def crear_app():
+    return Starlette(
+        routes=[
+            Route("/salud", salud),
+            Route("/explicar", explicar, methods=["POST"]),
+            Route("/ejercicio", ejercicio, methods=["POST"]),
+            Route("/evaluar", evaluar, methods=["POST"]),
+            Route("/pregunta", pregunta, methods=["POST"]),
+            Route("/examenes", crear_examen, methods=["POST"]),
+            Route("/examenes/{exam_id}", ver_examen),
+            Route("/examenes/{exam_id}/respuestas", responder, methods=["POST"]),
+            Route("/examenes/{exam_id}/pdf", pdf_examen),
+        ],
+        exception_handlers={ErrorSolicitud: _manejar_error_solicitud},
+    )
+
+
+app = crear_app()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP del tutor de Arquitectura de Redes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de uvicorn")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
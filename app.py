@@ -1,283 +1,208 @@
 
 import streamlit as st
-import google.generativeai as genai
+import hmac
 import os
-import random
 import re
 import time
-from datetime import datetime
-import pytz # Para manejar zonas horarias
-
-# --- Importaciones para PDF ---
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT # Importar TA_RIGHT
-import io
-import base64
-# --- Fin Importaciones para PDF ---
-
-
-# Configurar Gemini API Key
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-model = genai.GenerativeModel('models/gemini-1.5-flash-latest')
-
-# --- Funciones Core del Chatbot ---
-
-def explicar_concepto(tema):
-    """Genera una explicación detallada de un concepto de red."""
-    prompt = f"""Eres un tutor de Arquitectura de Redes. Explica el concepto de {tema} de forma clara, concisa y paso a paso, como si se lo explicaras a un estudiante universitario. Incluye ejemplos si es pertinente."""
-    response = model.generate_content(prompt)
-    return response.text
-
-def generar_ejercicio(tema, nivel):
-    """Crea un problema nuevo y original sobre un tema específico para un nivel dado."""
-    prompt = f"""Eres un tutor de Arquitectura de Redes. Crea un problema nuevo y original sobre {tema} para un estudiante de nivel {nivel}. Asegúrate de que el problema sea relevante para el tema y el nivel de dificultad. No incluyas la solución."""
-    response = model.generate_content(prompt)
-    return response.text
-
-def evaluar_respuesta_y_dar_feedback(ejercicio, respuesta_estudiante):
-    """Evalúa la respuesta de un estudiante a un ejercicio y proporciona retroalimentación."""
-    prompt = f"""Eres un tutor de Arquitectura de Redes. Tu tarea es evaluar la respuesta de un estudiante a un problema y proporcionar retroalimentación detallada.
-    Problema: {ejercicio}
-    Respuesta del estudiante: {respuesta_estudiante}
-    Por favor, sigue estos pasos:
-    1. Primero, indica si la respuesta del estudiante es correcta o incorrecta.
-    2. Si es incorrecta, explica *por qué* es incorrecta, señalando los errores conceptuales o de cálculo.
-    3. Luego, proporciona la solución *completa y detallada* paso a paso del ejercicio original.
-    4. Usa formato Markdown para una mejor lectura (por ejemplo, listas numeradas para pasos).
+from functools import partial
+
+from adaptativo import ERROR_OBJETIVO, MAX_PREGUNTAS, GeneradorExamenAdaptativo, estimar
+from analitica import almacen_analitica
+from generacion import GeneradorExamenProgresivo, limitador_global
+from banco_preguntas import BancoPreguntas, RellenadorBanco
+from cache_respuestas import cache_explicaciones
+from catalogo import catalogo_actual
+from duplicados import FiltroDuplicados, historial_examen
+from metricas import escribir_prometheus, iniciar_servidor_metricas, medir
+from modelos import Answer
+from reporte_pdf import generate_exam_pdf_cached, hora_peru
+from sesiones import almacen_global, nuevo_id_examen
+from subredes import ejercicio_local, es_calculable, pregunta_local
+from tutor import (
+    explicar_concepto, generar_ejercicio, evaluar_respuesta_y_dar_feedback,
+    generar_pregunta_multiple_choice, parse_multiple_choice_question,
+    generar_preguntas_lote, parse_lote_preguntas,
+)
+
+# --- Escritura incremental en Streamlit ---
+def mostrar_en_streaming(chunks, estilo="markdown"):
     """
-    response = model.generate_content(prompt)
-    return response.text
-
-def generar_pregunta_multiple_choice(tema, nivel):
-    """
-    Crea una pregunta de opción múltiple con 4 opciones, una correcta y una explicación.
-    Se enfatiza la originalidad para evitar repeticiones.
-    """
-    prompt = f"""Eres un experto en Arquitectura de Redes. Crea una **pregunta nueva y original, diferente a las anteriores, y variada** de opción múltiple sobre **"{tema}"** para un estudiante de nivel **"{nivel}"**. La pregunta debe tener 4 opciones de respuesta (A, B, C, D), de las cuales solo una es correcta.
-    Formatea la salida estrictamente de la siguiente manera, sin texto adicional antes o después de este formato:
-
-    Pregunta: [Tu pregunta aquí]
-    A) [Opción A]
-    B) [Opción B]
-    C) [Opción C]
-    D) [Opción D]
-    Respuesta Correcta: [Letra de la opción correcta, por ejemplo, A]
-    Explicación: [Breve explicación de por qué la respuesta es correcta]
-    """
-    response = model.generate_content(prompt)
-    return response.text
-
-def parse_multiple_choice_question(raw_data):
+    Muestra los fragmentos de texto a medida que llegan, reescribiendo un único
+    contenedor con el elemento `estilo` ("markdown", "info", "success"...).
+    Retorna el texto completo cuando termina el stream.
     """
-    Parsea la cadena de texto de la pregunta de opción múltiple generada por Gemini.
-    Retorna un diccionario con la pregunta, opciones, respuesta correcta y explicación,
-    o None si el parseo falla o los datos son incompletos.
-    """
-    question_text = ""
-    options_raw = []
-    correct_answer_char = ""
-    explanation = ""
-
-    lines = raw_data.split('\n')
-    line_type = None
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        if line.startswith("Pregunta:"):
-            question_text = line.replace("Pregunta:", "").strip()
-            line_type = "question"
-        elif re.match(r"^[A-D]\)", line):
-            options_raw.append(line)
-            line_type = "option"
-        elif line.startswith("Respuesta Correcta:"):
-            correct_answer_match = re.search(r"Respuesta Correcta:\s*([A-D])", line)
-            if correct_answer_match:
-                correct_answer_char = correct_answer_match.group(1).strip()
-            line_type = "correct_answer"
-        elif line.startswith("Explicación:"):
-            explanation = line.replace("Explicación:", "").strip()
-            line_type = "explanation"
-        elif line_type == "explanation":
-            explanation += " " + line # Para explicaciones multilinea
-
-    # Validar que hemos encontrado todos los componentes esenciales
-    if not (question_text and len(options_raw) == 4 and correct_answer_char and explanation):
+    contenedor = st.empty()
+    mostrar = getattr(contenedor, estilo)
+    texto = ""
+    for parte in chunks:
+        texto += parte
+        mostrar(texto + "▌")
+    mostrar(texto)
+    return texto
+
+# --- Banco de preguntas compartido por el proceso ---
+@st.cache_resource
+def obtener_banco_preguntas():
+    """Abre el banco de preguntas y arranca (una sola vez por proceso) el hilo que lo rellena."""
+    banco = BancoPreguntas()
+    if os.environ.get("BANCO_RELLENO", "1") != "0":
+        # El hilo consulta el catálogo en cada pasada, así que sigue sus recargas.
+        # Los sub-temas calculables no se guardan: se generan localmente al momento
+        RellenadorBanco(banco, lambda: [(t, nivel) for t, nivel in catalogo_actual().grupos_con_peso()
+                                        if not es_calculable(t)],
+                        generar_pregunta_multiple_choice, parse_multiple_choice_question,
+                        limiter=limitador_global()).start()
+    return banco
+
+# --- Estilos CSS, leídos una sola vez por proceso ---
+@st.cache_resource
+def leer_css(ruta="style.css"):
+    """Retorna el bloque <style> con el contenido de `ruta`, o None si el archivo no existe."""
+    try:
+        with open(ruta) as f:
+            return f"<style>{f.read()}</style>"
+    except FileNotFoundError:
         return None
 
-    # Barajar las opciones y mapear la respuesta correcta a la nueva letra
-    shuffled_options_with_correct = []
-    original_option_map = {}
-    for opt_raw in options_raw:
-        char = opt_raw[0]
-        original_option_map[opt_raw] = (char == correct_answer_char)
-        shuffled_options_with_correct.append(opt_raw)
-
-    random.shuffle(shuffled_options_with_correct)
-
-    new_correct_char = ''
-    new_options_display = []
-    for i, opt_display in enumerate(shuffled_options_with_correct):
-        char_label = chr(65 + i) # Genera A, B, C, D
-        option_text = opt_display[3:].strip() if opt_display.startswith(tuple("ABCD)")) else opt_display.strip()
-        new_options_display.append(f"{char_label}) {option_text}")
-
-        if original_option_map.get(opt_display):
-            new_correct_char = char_label
-
-    if not new_correct_char:
+# --- Persistencia del examen en curso (ver sesiones.py) ---
+def guardar_preguntas_nuevas():
+    """Guarda en el almacén las preguntas generadas desde la última escritura."""
+    guardadas = st.session_state.get('exam_preguntas_guardadas', 0)
+    nuevas = st.session_state['questions'][guardadas:]
+    if nuevas:
+        almacen_global().guardar_preguntas(st.session_state['exam_id'], guardadas, nuevas)
+        st.session_state['exam_preguntas_guardadas'] = guardadas + len(nuevas)
+
+def retomar_examen(exam_id, catalogo):
+    """Carga en st.session_state un examen guardado, para continuarlo en este proceso."""
+    estado = almacen_global().cargar(exam_id)
+    if estado is None:
+        st.warning("No se encontró el examen indicado en la URL. Puedes comenzar uno nuevo.")
+        st.query_params.pop("examen", None)
+        return
+    st.session_state.update(estado)
+    if estado['exam_finished_at'] is None:
+        del st.session_state['exam_finished_at']
+    st.session_state['current_activity'] = 'examen'
+    st.session_state['exam_started'] = True
+    st.session_state['name_entered_for_exam'] = True
+    st.session_state['exam_active_session'] = not estado['exam_finished']
+    st.session_state['exam_preguntas_guardadas'] = len(estado['questions'])
+    st.session_state['current_progress'] = (estado['current_question_index'] / estado['total_questions']) * 100
+    # Los selectores muestran el nivel y el tema del examen retomado
+    if estado['exam_level'] in catalogo.niveles:
+        st.session_state['nivel_select'] = estado['exam_level']
+    if estado['exam_topic'] in catalogo.temas:
+        st.session_state['tema_select'] = estado['exam_topic']
+    pesos_examen = catalogo.sub_temas_para(estado['exam_topic'], estado['exam_level']) or \
+        dict.fromkeys(catalogo.sub_temas_de(estado['exam_topic']) or catalogo.todos_los_sub_temas, 1)
+    if not estado['exam_finished'] and estado['exam_adaptativo'] and estado['exam_level'] in catalogo.niveles:
+        # La estimación se reconstruye con las respuestas ya dadas y el examen sigue desde ahí
+        generador = GeneradorExamenAdaptativo(
+            list(pesos_examen),
+            catalogo.niveles,
+            estado['exam_level'],
+            generar_preguntas_lote,
+            parse_lote_preguntas,
+            pesos=pesos_examen,
+            banco=obtener_banco_preguntas(),
+            filtro=FiltroDuplicados(historial=partial(historial_examen, exam_id, estado['user_name'], almacen_global())).es_nueva,
+            generador_local=pregunta_local,
+            preguntas_previas=estado['questions'],
+            respuestas_previas=estado['user_answers'],
+        )
+        st.session_state['exam_generador'] = generador
+        st.session_state['questions'] = generador.preguntas
+    elif not estado['exam_finished'] and len(estado['questions']) < estado['total_questions']:
+        # Las preguntas que faltan se generan de nuevo, a continuación de las ya vistas
+        generador = GeneradorExamenProgresivo(
+            list(pesos_examen),
+            estado['exam_level'],
+            estado['total_questions'],
+            generar_preguntas_lote,
+            parse_lote_preguntas,
+            preguntas_previas=estado['questions'],
+            filtro=FiltroDuplicados(historial=partial(historial_examen, exam_id, estado['user_name'], almacen_global())).es_nueva,
+            pesos=pesos_examen,
+            generador_local=pregunta_local,
+        )
+        st.session_state['exam_generador'] = generador
+        st.session_state['questions'] = generador.preguntas
+
+# --- Resultado del examen adaptativo (ver adaptativo.py) ---
+def resumen_adaptativo(catalogo):
+    """Estimación del nivel del estudiante si el examen fue adaptativo; None en otro caso."""
+    if not st.session_state.get('exam_adaptativo') or st.session_state.get('exam_level') not in catalogo.niveles:
         return None
-
-    return {
-        'question': question_text,
-        'options': new_options_display,
-        'correct_answer_char': new_correct_char,
-        'explanation': explanation,
-        'original_correct_option_text': next((opt[3:].strip() for opt in options_raw if opt.startswith(correct_answer_char + ')')), "")
-    }
-
-
-# --- FUNCIÓN PARA GENERAR PDF ---
-def generate_exam_pdf(score, total_questions, user_answers, all_questions, user_name="Estudiante", level="N/A", topic="N/A"):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                            rightMargin=inch, leftMargin=inch,
-                            topMargin=inch, bottomMargin=inch)
-    styles = getSampleStyleSheet()
-
-    # Estilos personalizados para el PDF
-    styles.add(ParagraphStyle(name='TitleStyle', fontSize=20, leading=24,
-                               alignment=TA_CENTER, spaceAfter=20))
-    # --- MODIFICACIONES AQUÍ para la información del estudiante/examen ---
-    styles.add(ParagraphStyle(name='StudentInfoStyle', fontSize=9, leading=10, # Más pequeño
-                               alignment=TA_RIGHT, spaceAfter=2)) # Alineado a la derecha y más junto
-    styles.add(ParagraphStyle(name='HeaderStyle', fontSize=12, leading=16,
-                               alignment=TA_LEFT, spaceAfter=10, fontName='Helvetica-Bold'))
-    styles.add(ParagraphStyle(name='NormalStyle', fontSize=10, leading=12,
-                               alignment=TA_LEFT, spaceAfter=8, leftIndent=10))
-    styles.add(ParagraphStyle(name='OptionStyle', fontSize=9, leading=11,
-                               alignment=TA_LEFT, spaceAfter=4, leftIndent=30))
-    styles.add(ParagraphStyle(name='CorrectAnswerStyle', fontSize=10, leading=12,
-                               alignment=TA_LEFT, spaceAfter=8, textColor='green', fontName='Helvetica-Bold', leftIndent=10))
-    styles.add(ParagraphStyle(name='IncorrectAnswerStyle', fontSize=10, leading=12,
-                               alignment=TA_LEFT, spaceAfter=8, textColor='red', fontName='Helvetica-Bold', leftIndent=10))
-    styles.add(ParagraphStyle(name='ExplanationStyle', fontSize=9, leading=11,
-                               alignment=TA_LEFT, spaceBefore=5, spaceAfter=10, textColor='gray', leftIndent=20))
-
-
-    story = []
-
-    # Obtener la hora actual en la zona horaria de Puno, Perú
-    peru_tz = pytz.timezone('America/Lima') # Lima es la zona horaria para Puno, Perú
-    current_time_peru = datetime.now(peru_tz).strftime('%Y-%m-%d %H:%M:%S')
-
-    # Título principal del examen
-    story.append(Paragraph("Resultados del Examen de Arquitectura de Redes", styles['TitleStyle']))
-    story.append(Spacer(1, 0.2 * inch)) # Espacio después del título principal
-
-    # --- INFORMACIÓN DEL ESTUDIANTE/EXAMEN (MOVIDO Y AJUSTADO) ---
-    # Usamos un Frame o una tabla para controlar mejor la posición
-    # Para simplicidad sin usar Frames complejos, podemos usar Paragraphs con TA_RIGHT
-    # y control de espaciado.
-    story.append(Paragraph(f"Estudiante: {user_name}", styles['StudentInfoStyle']))
-    story.append(Paragraph(f"Nivel: {level}", styles['StudentInfoStyle']))
-    story.append(Paragraph(f"Tema General: {topic}", styles['StudentInfoStyle']))
-    story.append(Paragraph(f"Fecha y Hora: {current_time_peru}", styles['StudentInfoStyle']))
-    story.append(Spacer(1, 0.3 * inch)) # Espacio después de la información del estudiante
-
-    # Resumen de puntuación
-    story.append(Paragraph(f"Puntuación Final: {score} / {total_questions}", styles['HeaderStyle']))
-    story.append(Spacer(1, 0.2 * inch))
-
-    # Detalles de cada pregunta
-    for i, user_ans_data in enumerate(user_answers):
-        question_info = all_questions[user_ans_data['question_index']]
-        story.append(Paragraph(f"**{i + 1})** {question_info['question']}", styles['NormalStyle']))
-        story.append(Spacer(1, 0.1 * inch))
-
-        # Mostrar todas las opciones de la pregunta
-        story.append(Paragraph("Opciones:", styles['NormalStyle']))
-        for option_text in question_info['options']:
-            story.append(Paragraph(option_text, styles['OptionStyle']))
-        story.append(Spacer(1, 0.1 * inch))
-
-
-        # Mostrar la respuesta del usuario de forma completa
-        story.append(Paragraph(f"Tu respuesta: **{user_ans_data['user_choice_full_text']}**", styles['NormalStyle']))
-
-        # Mostrar la respuesta correcta de forma completa
-        correct_option_full_text = ""
-        for option in question_info['options']:
-            if option.startswith(user_ans_data['correct_char'] + ')'):
-                correct_option_full_text = option
-                break
-        story.append(Paragraph(f"Respuesta correcta: **{correct_option_full_text}**", styles['NormalStyle']))
-
-
-        if user_ans_data['user_choice_char'] == user_ans_data['correct_char']:
-            story.append(Paragraph("Estado: Correcto ✅", styles['CorrectAnswerStyle']))
-        else:
-            story.append(Paragraph("Estado: Incorrecto ❌", styles['IncorrectAnswerStyle']))
-            story.append(Paragraph(f"**Explicación:** {question_info['explanation']}", styles['ExplanationStyle']))
-
-        story.append(Spacer(1, 0.2 * inch))
-        if (i + 1) % 3 == 0 and (i + 1) != total_questions: # Añade un salto de página cada 3 preguntas
-            story.append(PageBreak())
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    return estimar(st.session_state['questions'], st.session_state['user_answers'],
+                   catalogo.niveles, st.session_state['exam_level']).resumen()
+
+# --- Vista del instructor (ver analitica.py) ---
+def es_instructor():
+    """True si ANALITICA_CLAVE está definida y la clave escrita en la barra lateral coincide."""
+    clave = os.environ.get("ANALITICA_CLAVE")
+    return bool(clave) and hmac.compare_digest(st.session_state.get('clave_instructor', ""), clave)
+
+@st.cache_data(ttl=60)
+def reporte_instructor(tema, nivel):
+    """Agregaciones de los exámenes terminados; se recalculan como máximo una vez por minuto."""
+    almacen = almacen_analitica()
+    return (almacen.resumen(tema, nivel), almacen.precision_por_sub_tema(tema, nivel),
+            almacen.distractores_frecuentes(tema, nivel), almacen.tiempo_por_pregunta(tema, nivel))
+
+def mostrar_vista_instructor(catalogo):
+    col_tema, col_nivel = st.columns(2)
+    with col_tema:
+        tema = st.selectbox("Tema:", ["Todos", *catalogo.temas], key="instructor_tema")
+    with col_nivel:
+        nivel = st.selectbox("Nivel:", ["Todos", *catalogo.niveles], key="instructor_nivel")
+    resumen, precision, distractores, tiempos = reporte_instructor(
+        None if tema == "Todos" else tema, None if nivel == "Todos" else nivel
+    )
+    if not resumen['respuestas']:
+        st.info("Todavía no hay exámenes terminados con este filtro.")
+        return
+
+    col_examenes, col_respuestas, col_precision, col_segundos = st.columns(4)
+    col_examenes.metric("Exámenes", resumen['examenes'])
+    col_respuestas.metric("Respuestas", resumen['respuestas'])
+    col_precision.metric("Precisión", f"{resumen['precision']:.0%}")
+    col_segundos.metric("Segundos por pregunta", resumen['segundos_promedio'] if resumen['segundos_promedio'] is not None else "—")
+
+    st.subheader("Precisión por sub-tema y nivel")
+    st.dataframe(precision, hide_index=True)
+    st.subheader("Distractores más elegidos")
+    st.dataframe(distractores, hide_index=True)
+    st.subheader("Preguntas en que más se tarda")
+    st.dataframe(tiempos, hide_index=True)
 
 # --- Función Principal de Streamlit ---
 
 def main():
     # --- Cargar estilos CSS externos ---
-    try:
-        with open("style.css") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    except FileNotFoundError:
+    css = leer_css()
+    if css:
+        st.markdown(css, unsafe_allow_html=True)
+    else:
         st.error("Error: El archivo 'style.css' no se encontró. Asegúrate de que esté en la misma carpeta que 'app.py'.")
 
     st.title("   ARQUITECTURA DE REDES    ")
     st.markdown("---")
     st.markdown("¡Bienvenido! Estoy aquí para ayudarte a **dominar** la Arquitectura de Redes. Selecciona una opción para comenzar tu aprendizaje o desafiarte con un examen. ✨")
 
-    temas_principales = ["Redes LAN", "Protocolos de Red", "Modelos OSI/TCP-IP", "Seguridad de Red", "Dispositivos de Red", "Direccionamiento IP", "Enrutamiento", "Conmutación", "Subredes", "Capa Física"]
-
-    posibles_sub_temas_para_examen = [
-        "Capa Física del Modelo OSI", "Capa de Enlace de Datos del Modelo OSI",
-        "Capa de Red del Modelo OSI", "Capa de Transporte del Modelo OSI",
-        "Capa de Sesión del Modelo OSI", "Capa de Presentación del Modelo OSI",
-        "Capa de Aplicación del Modelo OSI", "Comparación OSI vs TCP/IP",
-        "Protocolo IP (Internet Protocol)", "Protocolo TCP (Transmission Control Protocol)",
-        "Protocolo UDP (User Datagram Protocol)", "Direccionamiento IPv4 y Clases",
-        "Direccionamiento IPv4 Privado", "Direccionamiento IPv6", "Máscaras de subred y cálculo", "VLSM",
-        "Concepto de Gateway", "Funcionamiento de un Switch", "Funcionamiento de un Router",
-        "Concepto de Hub", "Firewall de Filtrado de Paquetes", "Firewall de Estado",
-        "VPNs (Virtual Private Networks) funcionamiento", "Tipos de VPN",
-        "Protocolos de enrutamiento estático", "Protocolos de enrutamiento dinámico (RIP)",
-        "Protocolos de enrutamiento dinámico (OSPF)", "Protocolos de enrutamiento dinámico (EIGRP)",
-        "DNS (Domain Name System) funcionamiento", "DHCP (Dynamic Host Configuration Protocol) funcionamiento",
-        "ARP (Address Resolution Protocol) funcionamiento", "ICMP (Internet Control Message Protocol)",
-        "Protocolos de Capa de Aplicación (HTTP, HTTPS, FTP, SMTP, POP3, IMAP)",
-        "Topología de Estrella", "Topología de Anillo", "Topología de Bus", "Topología de Malla",
-        "Concepto de Dominio de Colisión", "Concepto de Dominio de Broadcast",
-        "CSMA/CD", "CSMA/CA", "Ethernet y sus estándares (802.3)", "Wi-Fi (802.11)",
-        "Seguridad WEP/WPA/WPA2/WPA3", "SSID", "Concepto de MAC Address",
-        "Conmutación de Paquetes", "Conmutación de Circuitos", "Redes SDN (Software-Defined Networking)",
-        "NAT (Network Address Translation)", "Port Forwarding", "VLANs (Virtual LANs)"
-    ]
+    # Catálogo de temas compilado una vez por proceso; se recarga solo si el archivo cambia
+    catalogo = catalogo_actual()
+
+    # Un examen en curso se puede retomar en cualquier réplica con ?examen=<id> en la URL
+    exam_id_url = st.query_params.get("examen")
+    if exam_id_url and st.session_state.get('exam_id') != exam_id_url:
+        retomar_examen(exam_id_url, catalogo)
 
     col_level, col_topic = st.columns(2)
     with col_level:
-        nivel_estudiante = st.selectbox("Selecciona tu nivel actual:", ["Básico", "Intermedio", "Avanzado"], key="nivel_select")
+        nivel_estudiante = st.selectbox("Selecciona tu nivel actual:", catalogo.niveles, key="nivel_select")
     with col_topic:
-        tema_seleccionado = st.selectbox("Selecciona un tema general:", temas_principales, key="tema_select")
+        tema_seleccionado = st.selectbox("Selecciona un tema general:", catalogo.temas, key="tema_select")
 
     st.markdown("---")
 
@@ -291,6 +216,13 @@ def main():
     if 'user_name' not in st.session_state: # Asegurarse de que 'user_name' siempre exista
         st.session_state['user_name'] = ""
 
+    # La vista del instructor solo aparece si ANALITICA_CLAVE está definida
+    if os.environ.get("ANALITICA_CLAVE"):
+        with st.sidebar:
+            st.text_input("Clave del instructor", type="password", key="clave_instructor")
+            if es_instructor() and st.button("Analítica de exámenes :bar_chart:", key="btn_analitica", use_container_width=True):
+                st.session_state['current_activity'] = 'instructor'
+
     # Crear las columnas para los botones de "cuadros grandes"
     col1, col2 = st.columns(2)
     col3, col4 = st.columns(2)
@@ -299,33 +231,37 @@ def main():
         if st.button("Explicar un concepto", key="btn_explicar_concepto", use_container_width=True):
             st.session_state['current_activity'] = 'explicar'
             # Resetear estado del examen si se cambia de actividad
-            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam']:
+            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_finished_at', 'exam_generador', 'exam_id', 'exam_preguntas_guardadas', 'exam_adaptativo']:
                 if key in st.session_state:
                     del st.session_state[key]
+            st.query_params.pop("examen", None) # El examen anterior ya no se retoma desde la URL
             st.session_state['user_name'] = "" # Limpiar el nombre al cambiar de actividad
     with col2:
         if st.button("Proponer un ejercicio", key="btn_proponer_ejercicio", use_container_width=True):
             st.session_state['current_activity'] = 'proponer'
             # Resetear estado del examen si se cambia de actividad
-            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam']:
+            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_finished_at', 'exam_generador', 'exam_id', 'exam_preguntas_guardadas', 'exam_adaptativo']:
                 if key in st.session_state:
                     del st.session_state[key]
+            st.query_params.pop("examen", None)
             st.session_state['user_name'] = "" # Limpiar el nombre al cambiar de actividad
     with col3:
         if st.button("Evaluar mi respuesta al ejercicio", key="btn_evaluar_respuesta", use_container_width=True):
             st.session_state['current_activity'] = 'evaluar'
             # Resetear estado del examen si se cambia de actividad
-            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam']:
+            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_finished_at', 'exam_generador', 'exam_id', 'exam_preguntas_guardadas', 'exam_adaptativo']:
                 if key in st.session_state:
                     del st.session_state[key]
+            st.query_params.pop("examen", None)
             st.session_state['user_name'] = "" # Limpiar el nombre al cambiar de actividad
     with col4:
         if st.button("Tomar examen", key="btn_tomar_examen", use_container_width=True):
             st.session_state['current_activity'] = 'examen'
             # Siempre se reinicia el estado del examen al hacer clic en "Tomar examen"
-            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam']:
+            for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_finished_at', 'exam_generador', 'exam_id', 'exam_preguntas_guardadas', 'exam_adaptativo']:
                 if key in st.session_state:
                     del st.session_state[key]
+            st.query_params.pop("examen", None)
             st.session_state['exam_started'] = False
             st.session_state['exam_active_session'] = False
             st.session_state['name_entered_for_exam'] = False # NUEVO: Flag para controlar si ya se preguntó el nombre
@@ -337,65 +273,21 @@ def main():
     if st.session_state['current_activity'] == 'explicar':
         st.header(f"Explicación de {tema_seleccionado}")
         st.markdown("Aquí puedes obtener explicaciones detalladas sobre cualquier concepto.")
-        if st.button("Obtener Explicación :mag:", key="get_explanation_button"):
-            with st.spinner("Generando explicación..."):
-                explicacion = explicar_concepto(tema_seleccionado)
-                st.info(explicacion)
+        col_obtener, col_regenerar = st.columns(2)
+        with col_obtener:
+            obtener_explicacion = st.button("Obtener Explicación :mag:", key="get_explanation_button")
+        with col_regenerar:
+            regenerar_explicacion = st.button("Regenerar Explicación :arrows_counterclockwise:", key="regenerate_explanation_button")
+        if obtener_explicacion or regenerar_explicacion:
+            mostrar_en_streaming(explicar_concepto(tema_seleccionado, regenerar=regenerar_explicacion, stream=True), estilo="info")
+            estadisticas_cache = cache_explicaciones().estadisticas()
+            st.caption(f"Caché de explicaciones: {estadisticas_cache['hits']} aciertos / {estadisticas_cache['misses']} fallos")
 
             st.markdown("### 📚 Recursos Adicionales para Profundizar")
             st.markdown("Aquí te dejo enlaces a papers, documentos y videos clave para este tema:")
 
-            recursos_por_tema = {
-                "Redes LAN": [
-                    {"tipo": "Referencia", "titulo": "¿Qué es una LAN?", "url": "https://www-cisco-com.translate.goog/c/en/us/products/switches/what-is-a-lan-local-area-network.html?_x_tr_sl=en&_x_tr_tl=es&_x_tr_hl=es&_x_tr_pto=tc"},
-                    {"tipo": "Referencia", "titulo": "Red LAN", "url": "https://www.godaddy.com/resources/latam/tecnologia/que-es-una-red-lan"},
-                    {"tipo": "video", "titulo": "Fundamentos de Redes LAN (YouTube)", "url": "https://www.youtube.com/watch?v=VD5k_0q_fus"}
-                ],
-                "Protocolos de Red": [
-                    {"tipo": "Referencia", "titulo": "Definición", "url": "https://www.cloudflare.com/es-es/learning/network-layer/what-is-a-protocol/"},
-                    {"tipo": "Referencia", "titulo": "(IBM)", "url": "https://www.ibm.com/docs/es/aix/7.2.0?topic=protocols-internet-network-level"},
-                    {"tipo": "video", "titulo": "Qué son los protocolos de red", "url": "https://www.youtube.com/watch?v=hJqu97N_zhA&pp=ygURUHJvdG9jb2xvcyBkZSBSZWQ%3D"}
-                ],
-                "Modelos OSI/TCP-IP": [
-                    {"tipo": "Referencia", "titulo": "ISO/IEC 7498 (OSI Model)", "url": "https://www.iso.org/standard/14299.html"},
-                    {"tipo": "documento", "titulo": "Comparación OSI y TCP/IP (Microsoft)", "url": "https://learn.microsoft.com/es-es/troubleshoot/windows-server/networking/tcpip-layer-model-vs-osi-layer-model"},
-                    {"tipo": "video", "titulo": "Modelo OSI Explicado (YouTube)", "url": "https://www.youtube.com/watch?v=MqpIJLmMny8&pp=ygUSTW9kZWxvcyBPU0kvVENQLUlQ"}
-                ],
-                "Seguridad de Red": [
-                    {"tipo": "Referencia", "titulo": "NIST SP 800-12 (Introduction to Computer Security)", "url": "https://csrc.nist.gov/publications/detail/sp/800-12/rev-1/archive/1995-10-01"},
-                    {"tipo": "documento", "titulo": "Conceptos Básicos de Ciberseguridad (CISCO)", "url": "https://www.cisco.com/c/es_mx/training-events/getting-started-with-networking/cybersecurity-fundamentals.html"},
-                    {"tipo": "video", "titulo": "Fundamentos de Ciberseguridad (YouTube)", "url": "https://www.youtube.com/watch?v=Vl3rKqM9wI0"}
-                ],
-                "Dispositivos de Red": [
-                    {"tipo": "Referencia", "titulo": "Conceptos de Switching (CCNA - Cisco)", "url": "https://www.cisco.com/c/es_mx/training-events/getting-started-with-networking/switching-fundamentals.html"},
-                    {"tipo": "video", "titulo": "Tipos de Dispositivos de Red (YouTube)", "url": "https://www.youtube.com/watch?v=oCzPbiN5wao&pp=ygUTRGlzcG9zaXRpdm9zIGRlIFJlZA%3D%3D"}
-                ],
-                "Direccionamiento IP": [
-                    {"tipo": "Referencia", "titulo": "RFC 791 (Internet Protocol)", "url": "https://datatracker.ietf.org/doc/html/rfc791"},
-                    {"tipo": "documento", "titulo": "Direccionamiento IP (UNAM)", "url": "http://www.dgsca.unam.mx/publicaciones/curso/ip/ip-2.html"},
-                    {"tipo": "video", "titulo": "Qué es una Dirección IP y cómo funciona (YouTube)", "url": "https://www.youtube.com/watch?v=801xu7tGEfA&pp=ygUUIkRpcmVjY2lvbmFtaWVudG8gSVA%3D"}
-                ],
-                "Enrutamiento": [
-                    {"tipo": "Referencia", "titulo": "RFC 1058 (RIP Version 1)", "url": "https://datatracker.ietf.org/doc/html/rfc1058"},
-                    {"tipo": "documento", "titulo": "Introducción al Enrutamiento (Cisco)", "url": "https://www.cisco.com/c/es_mx/training-events/getting-started-with-networking/routing-fundamentals.html"},
-                    {"tipo": "video", "titulo": "Enrutamiento Estático y Dinámico (YouTube)", "url": "https://www.youtube.com/watch?v=nuHUTToftoQ&pp=ygUMRW5ydXRhbWllbnRv"}
-                ],
-                "Conmutación": [
-                    {"tipo": "Referencia", "titulo": "Conceptos de Switching (CCNA - Cisco)", "url": "https://www.cisco.com/c/es_mx/training-events/getting-started-with-networking/switching-fundamentals.html"},
-                    {"tipo": "video", "titulo": "Switches: ¿Qué son y cómo funcionan? (YouTube)", "url": "https://www.youtube.com/watch?v=u8-hJv3f-9k"}
-                ],
-                "Subredes": [
-                    {"tipo": "Referencia", "titulo": "Subnetting (Wikipedia)", "url": "https://es.wikipedia.org/wiki/Subred"},
-                    {"tipo": "video", "titulo": "Tutorial de Subnetting paso a paso (YouTube)", "url": "https://www.youtube.com/watch?v=eE7yG0XzFqc"}
-                ],
-                "Capa Física": [
-                    {"tipo": "Referencia", "titulo": "Capa Física del Modelo OSI (Wikipedia)", "url": "https://es.wikipedia.org/wiki/Capa_f%C3%ADsica"},
-                    {"tipo": "video", "titulo": "La capa física del modelo OSI (YouTube)", "url": "https://www.youtube.com/watch?v=wfmExYHthbA&pp=ygUMQ2FwYSBGw61zaWNh0gcJCccJAYcqIYzv"}
-                ],
-            }
-
-            if tema_seleccionado in recursos_por_tema:
-                for recurso in recursos_por_tema[tema_seleccionado]:
+            if catalogo.recursos_de(tema_seleccionado):
+                for recurso in catalogo.recursos_de(tema_seleccionado):
                     if recurso["tipo"] == "paper":
                         st.markdown(f"- 📄 **Paper:** [{recurso['titulo']}]({recurso['url']})")
                     elif recurso["tipo"] == "documento":
@@ -409,10 +301,16 @@ def main():
         st.header(f"Ejercicio de {tema_seleccionado} (Nivel {nivel_estudiante})")
         st.markdown("¡Pon a prueba tus conocimientos con un problema nuevo!")
         if st.button("Generar Ejercicio :brain:", key="generate_exercise_button_prop"):
-            with st.spinner("Generando ejercicio..."):
-                ejercicio = generar_ejercicio(tema_seleccionado, nivel_estudiante)
+            ejercicio_calculable = ejercicio_local(tema_seleccionado, nivel_estudiante)
+            if ejercicio_calculable is not None:
+                # Ejercicio numérico generado localmente: se califica de forma exacta, sin el modelo
+                st.success(ejercicio_calculable.enunciado)
+                ejercicio = ejercicio_calculable.enunciado
+            else:
+                # El texto completo queda disponible cuando termina el stream
+                ejercicio = mostrar_en_streaming(generar_ejercicio(tema_seleccionado, nivel_estudiante, stream=True), estilo="success")
             st.session_state['current_exercise'] = ejercicio
-            st.success(ejercicio)
+            st.session_state['current_exercise_calculable'] = ejercicio_calculable
             st.info("Ahora puedes ir a 'Evaluar mi Respuesta' para obtener retroalimentación.")
 
     elif st.session_state['current_activity'] == 'evaluar':
@@ -423,10 +321,12 @@ def main():
             st.markdown(st.session_state['current_exercise'])
             respuesta_estudiante = st.text_area("Escribe aquí tu respuesta:", key="student_response_area")
             if st.button("Evaluar :chart_with_upwards_trend:", key="evaluate_button_eval"):
-                if respuesta_estudiante:
-                    with st.spinner("Evaluando y generando feedback..."):
-                        feedback = evaluar_respuesta_y_dar_feedback(st.session_state['current_exercise'], respuesta_estudiante)
-                    st.markdown(feedback)
+                ejercicio_calculable = st.session_state.get('current_exercise_calculable')
+                if respuesta_estudiante and ejercicio_calculable is not None:
+                    _, _, retroalimentacion = ejercicio_calculable.calificar(respuesta_estudiante)
+                    st.markdown(retroalimentacion)
+                elif respuesta_estudiante:
+                    mostrar_en_streaming(evaluar_respuesta_y_dar_feedback(st.session_state['current_exercise'], respuesta_estudiante, stream=True))
                 else:
                     st.warning("Por favor, escribe tu respuesta para evaluar.")
         else:
@@ -475,6 +375,10 @@ def main():
                 else:
                     st.warning("Por favor, ingresa tu nombre para continuar.")
         elif not st.session_state['exam_started']:
+            examen_adaptativo = st.checkbox(
+                "Examen adaptativo: las preguntas se ajustan a tus respuestas y el examen termina en cuanto tu nivel queda estimado",
+                key="exam_adaptativo_check",
+            )
             if st.button("Comenzar Examen Ahora :rocket:", key="start_exam_button"):
                 # No necesitamos validar el nombre aquí de nuevo, ya lo hicimos arriba.
                 st.session_state['exam_started'] = True
@@ -485,39 +389,68 @@ def main():
                 st.session_state['exam_finished'] = False
                 st.session_state['exam_active_session'] = True
                 st.session_state['current_progress'] = 0.0
-                st.session_state['total_questions'] = 10
-
-                with st.spinner("Generando las 10 preguntas del examen..."):
-                    generated_themes = set()
-                    while len(st.session_state['questions']) < st.session_state['total_questions']:
-                        available_themes = [t for t in posibles_sub_temas_para_examen if t not in generated_themes]
-                        if not available_themes:
-                            st.warning("Se han utilizado todos los sub-temas posibles. Reutilizando temas para completar el examen.")
-                            available_themes = list(posibles_sub_temas_para_examen)
-                            generated_themes.clear()
-
-                        current_sub_tema = random.choice(available_themes)
-                        try:
-                            question_data_raw = generar_pregunta_multiple_choice(current_sub_tema, nivel_estudiante)
-                            parsed_question = parse_multiple_choice_question(question_data_raw)
-
-                            if parsed_question:
-                                st.session_state['questions'].append(parsed_question)
-                                generated_themes.add(current_sub_tema)
-                            else:
-                                st.warning(f"⚠️ No se pudo parsear una pregunta. Reintentando... Posible formato inesperado de Gemini para: '{current_sub_tema}'.")
-
-                            # --- Añadir un pequeño retraso aquí ---
-                            time.sleep(1.5) # Espera 1.5 segundos entre cada llamada a la API
-                            # Puedes ajustar este valor. Si el error persiste, auméntalo.
-
-                        except Exception as e:
-                            st.error(f"Error al generar pregunta para '{current_sub_tema}': {e}. Es posible que hayas excedido la cuota de la API. Por favor, inténtalo de nuevo en unos minutos o revisa tus cuotas en Google Cloud Console.")
-                            # Detener el proceso de generación de preguntas si hay un error de API
-                            st.session_state['exam_started'] = False
-                            st.session_state['exam_active_session'] = False
-                            st.session_state['exam_finished'] = False
-                            break # Salir del bucle while
+                st.session_state['exam_adaptativo'] = examen_adaptativo
+                # El examen adaptativo termina antes si la estimación del nivel ya es precisa
+                st.session_state['total_questions'] = MAX_PREGUNTAS if examen_adaptativo else 10
+
+                with st.spinner("Preparando la primera pregunta del examen..."):
+                    try:
+                        # Sub-temas del tema elegido que corresponden al nivel, con su peso
+                        pesos_examen = catalogo.sub_temas_para(tema_seleccionado, nivel_estudiante) or \
+                            dict.fromkeys(catalogo.sub_temas_de(tema_seleccionado), 1)
+                        banco = obtener_banco_preguntas()
+                        # El id del examen también identifica el historial del estudiante (ver duplicados.py)
+                        exam_id = nuevo_id_examen()
+                        if examen_adaptativo:
+                            # Cada pregunta se elige según las respuestas anteriores: del banco, local o del modelo
+                            generador = GeneradorExamenAdaptativo(
+                                list(pesos_examen),
+                                catalogo.niveles,
+                                nivel_estudiante,
+                                generar_preguntas_lote,
+                                parse_lote_preguntas,
+                                pesos=pesos_examen,
+                                banco=banco,
+                                filtro=FiltroDuplicados(historial=partial(historial_examen, exam_id, st.session_state['user_name'], almacen_global())).es_nueva,
+                                generador_local=pregunta_local,
+                            )
+                        else:
+                            # Primero se toman preguntas ya generadas del banco (milisegundos)
+                            extraidas = banco.extraer(list(pesos_examen), nivel_estudiante, st.session_state['total_questions'])
+                            # Las que falten se generan en segundo plano mientras el estudiante responde:
+                            # el examen empieza en cuanto existe la primera pregunta
+                            generador = GeneradorExamenProgresivo(
+                                list(pesos_examen),
+                                nivel_estudiante,
+                                st.session_state['total_questions'],
+                                generar_preguntas_lote,
+                                parse_lote_preguntas,
+                                preguntas_iniciales=[pregunta for _, pregunta in extraidas],
+                                temas_excluidos={sub_tema for sub_tema, _ in extraidas},
+                                # Se rechazan preguntas casi idénticas a otras del examen o del historial del estudiante
+                                filtro=FiltroDuplicados(historial=partial(historial_examen, exam_id, st.session_state['user_name'], almacen_global())).es_nueva,
+                                pesos=pesos_examen,
+                                # Subredes, VLSM, clases y direcciones privadas se calculan sin llamar al modelo
+                                generador_local=pregunta_local,
+                            )
+                        st.session_state['exam_generador'] = generador
+                        st.session_state['questions'] = generador.preguntas
+                        generador.esperar(0, timeout=120)
+                        # El examen se guarda fuera del proceso para poder retomarlo con su id
+                        st.session_state['exam_id'] = exam_id
+                        almacen_global().crear(st.session_state['exam_id'], st.session_state['user_name'],
+                                               nivel_estudiante, tema_seleccionado, st.session_state['total_questions'],
+                                               adaptativo=examen_adaptativo)
+                        guardar_preguntas_nuevas()
+                        st.query_params["examen"] = st.session_state['exam_id']
+                    except Exception as e:
+                        st.error(f"Error al generar las preguntas del examen: {e}. Es posible que hayas excedido la cuota de la API. Por favor, inténtalo de nuevo en unos minutos o revisa tus cuotas en Google Cloud Console.")
+                        # Detener el examen si hay un error de API
+                        if 'exam_generador' in st.session_state:
+                            st.session_state['exam_generador'].detener()
+                        st.session_state['exam_started'] = False
+                        st.session_state['exam_active_session'] = False
+                        st.session_state['exam_finished'] = False
 
                 if len(st.session_state['questions']) == st.session_state['total_questions']:
                      st.session_state['current_progress'] = (st.session_state['current_question_index'] / st.session_state['total_questions']) * 100
@@ -525,28 +458,69 @@ def main():
         # Lógica para mostrar preguntas y manejar la navegación durante el examen
         if st.session_state.get('exam_active_session', False) and not st.session_state['exam_finished']:
             if st.session_state['current_question_index'] < st.session_state['total_questions']:
-                # Barra de progreso al estilo Duolingo
-                progress_percentage = (st.session_state['current_question_index'] / st.session_state['total_questions']) * 100
-                st.progress(progress_percentage / 100, text=f"Progreso: {int(progress_percentage)}%")
-                st.write(f"Pregunta {st.session_state['current_question_index'] + 1} de {st.session_state['total_questions']}")
+                if st.session_state.get('exam_adaptativo') and st.session_state.get('exam_generador') is not None:
+                    # El largo es variable: el avance es la precisión alcanzada por la estimación
+                    # (información acumulada respecto de la necesaria para ERROR_OBJETIVO)
+                    error = st.session_state['exam_generador'].estimador.error
+                    precision = min(1.0, max(0.0, (error ** -2 - 1) / (ERROR_OBJETIVO ** -2 - 1)))
+                    st.progress(precision, text=f"Precisión de la estimación de tu nivel: {int(precision * 100)}%")
+                    st.write(f"Pregunta {st.session_state['current_question_index'] + 1} (como máximo {st.session_state['total_questions']})")
+                else:
+                    # Barra de progreso al estilo Duolingo
+                    progress_percentage = (st.session_state['current_question_index'] / st.session_state['total_questions']) * 100
+                    st.progress(progress_percentage / 100, text=f"Progreso: {int(progress_percentage)}%")
+                    st.write(f"Pregunta {st.session_state['current_question_index'] + 1} de {st.session_state['total_questions']}")
+                if st.session_state.get('exam_id'):
+                    st.caption(f"Id del examen: `{st.session_state['exam_id']}`. Si se corta la conexión, vuelve a esta misma URL para continuar.")
+
+                # Las preguntas siguientes se generan en segundo plano; solo se espera si el
+                # estudiante va más rápido que la generación
+                generador = st.session_state.get('exam_generador')
+                if generador is not None:
+                    try:
+                        if st.session_state['current_question_index'] >= len(st.session_state['questions']):
+                            with st.spinner("Generando la siguiente pregunta..."):
+                                generador.esperar(st.session_state['current_question_index'], timeout=120)
+                        else:
+                            generador.avanzar_a(st.session_state['current_question_index'])
+                    except Exception as e:
+                        st.error(f"Error al generar la siguiente pregunta: {e}. Es posible que hayas excedido la cuota de la API.")
+                        generador.detener()
+                        if st.session_state['user_answers']:
+                            # Se cierra el examen con las preguntas ya respondidas
+                            st.session_state['total_questions'] = len(st.session_state['user_answers'])
+                            st.session_state['exam_finished'] = True
+                        else:
+                            st.session_state['exam_started'] = False
+                        st.session_state['exam_active_session'] = False
+                        st.rerun()
 
                 current_question = st.session_state['questions'][st.session_state['current_question_index']]
 
                 try:
-                    match = re.search(r'sobre "([^"]+)"', current_question['question'])
+                    match = re.search(r'sobre "([^"]+)"', current_question.question)
                     if match:
                         display_topic = match.group(1)
                     else:
                         display_topic = tema_seleccionado
                 except Exception:
                     display_topic = tema_seleccionado
+                if current_question.sub_tema:
+                    display_topic = current_question.sub_tema
 
                 st.markdown(f"**Tema cubierto:** *{display_topic}*")
-                st.write(current_question['question'])
+                if current_question.nivel:
+                    st.caption(f"Nivel de la pregunta: {current_question.nivel}")
+                st.write(current_question.question)
+
+                # Momento en que se mostró la pregunta, para medir cuánto tarda el estudiante en responderla
+                marca_pregunta = (st.session_state.get('exam_id'), st.session_state['current_question_index'])
+                if st.session_state.get('pregunta_mostrada', (None, 0))[0] != marca_pregunta:
+                    st.session_state['pregunta_mostrada'] = (marca_pregunta, time.time())
 
                 selected_option_label = st.radio(
                     "Elige una opción:",
-                    current_question['options'],
+                    current_question.options,
                     key=f"q_radio_{st.session_state['current_question_index']}"
                 )
 
@@ -554,17 +528,20 @@ def main():
                     if selected_option_label:
                         user_answer_char = selected_option_label[0] # Solo la letra (A, B, C, D)
 
-                        # Almacenar la respuesta del usuario para revisión posterior, incluyendo el texto completo
-                        st.session_state['user_answers'].append({
-                            'question_index': st.session_state['current_question_index'],
-                            'user_choice_char': user_answer_char,
-                            'user_choice_full_text': selected_option_label, # Guardamos el texto completo aquí
-                            'correct_char': current_question['correct_answer_char'],
-                            'question_text': current_question['question'],
-                            'explanation': current_question['explanation']
-                        })
-
-                        if user_answer_char == current_question['correct_answer_char']:
+                        # Almacenar la respuesta del usuario para revisión posterior; los textos se leen de la pregunta
+                        st.session_state['user_answers'].append(Answer(
+                            question_index=st.session_state['current_question_index'],
+                            user_choice_char=user_answer_char,
+                            segundos=round(time.time() - st.session_state['pregunta_mostrada'][1], 1),
+                        ))
+                        if st.session_state.get('exam_adaptativo'):
+                            generador = st.session_state['exam_generador']
+                            generador.registrar(st.session_state['user_answers'][-1])
+                            if generador.terminado:
+                                # El nivel ya quedó estimado con la precisión buscada: el examen termina aquí
+                                st.session_state['total_questions'] = len(st.session_state['user_answers'])
+
+                        if user_answer_char == current_question.correct_answer_char:
                             st.session_state['score'] += 1
                             # Feedback visual de éxito
                             st.success("🎉 ¡Correcto! ¡Sigue así! 🎉")
@@ -572,10 +549,10 @@ def main():
                             # time.sleep(1)
                         else:
                             # Feedback visual de error
-                            st.error(f"❌ Incorrecto. La respuesta correcta era **{current_question['correct_answer_char']}**.")
-                            st.markdown(f"**Explicación:** {current_question['explanation']}")
+                            st.error(f"❌ Incorrecto. La respuesta correcta era **{current_question.correct_answer_char}**.")
+                            st.markdown(f"**Explicación:** {current_question.explanation}")
 
-                            q_lower = current_question['question'].lower()
+                            q_lower = current_question.question.lower()
                             if "capa física" in q_lower or "codificación" in q_lower:
                                 st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/c/c5/Modem_diagram.svg/400px-Modem_diagram.svg.png",
                                          caption="Ejemplo de Codificación en Capa Física")
@@ -588,6 +565,17 @@ def main():
                         st.session_state['current_question_index'] += 1
                         st.session_state['current_progress'] = (st.session_state['current_question_index'] / st.session_state['total_questions']) * 100
 
+                        # Escritura incremental: las preguntas nuevas, esta respuesta y el avance
+                        guardar_preguntas_nuevas()
+                        almacen_global().registrar_respuesta(
+                            st.session_state['exam_id'],
+                            len(st.session_state['user_answers']) - 1,
+                            st.session_state['user_answers'][-1],
+                            st.session_state['score'],
+                            st.session_state['current_question_index'],
+                            st.session_state['total_questions'],
+                        )
+
                         # Si se terminó el examen
                         if st.session_state['current_question_index'] >= st.session_state['total_questions']:
                             st.session_state['exam_finished'] = True
@@ -609,60 +597,93 @@ def main():
 
             st.markdown(f"**Puntos obtenidos en este examen:** {st.session_state['score'] * 10} XP (por ejemplo)")
 
+            resumen = resumen_adaptativo(catalogo)
+            if resumen:
+                minimo, maximo = resumen['dominio_intervalo']
+                st.markdown(f"**Examen adaptativo:** tu nivel quedó estimado con {resumen['preguntas']} preguntas.")
+                st.markdown(f"**Nivel estimado:** {resumen['nivel_estimado']} · **Dominio del nivel {resumen['nivel_examen']}:** "
+                            f"{resumen['dominio']:.0%} (entre {minimo:.0%} y {maximo:.0%} con 95 % de confianza)")
+                st.dataframe(resumen['sub_temas'], hide_index=True)
+
+            # La fecha del examen se fija al terminarlo, para que el PDF (y su huella) no cambie en cada rerun
+            if 'exam_finished_at' not in st.session_state:
+                st.session_state['exam_finished_at'] = hora_peru()
+                if st.session_state.get('exam_id'):
+                    almacen_global().finalizar(st.session_state['exam_id'], st.session_state['exam_finished_at'],
+                                               st.session_state['total_questions'])
+                    almacen_analitica().registrar_examen({
+                        clave: st.session_state.get(clave)
+                        for clave in ('exam_id', 'user_name', 'exam_level', 'exam_topic', 'score', 'total_questions',
+                                      'questions', 'user_answers')
+                    })
+
             # Usar user_answers y questions para el PDF
             pdf_user_name = st.session_state['user_name'] if st.session_state['user_name'] else "Estudiante"
-            pdf_buffer = generate_exam_pdf(
+            pdf_args = (
                 st.session_state['score'],
                 st.session_state['total_questions'],
                 st.session_state['user_answers'],
                 st.session_state['questions'],
+            )
+            pdf_kwargs = dict(
                 user_name=pdf_user_name,
                 level=st.session_state.get('exam_level', 'N/A'), # Pasa el nivel
-                topic=st.session_state.get('exam_topic', 'N/A')   # Pasa el tema
+                topic=st.session_state.get('exam_topic', 'N/A'),  # Pasa el tema
+                fecha=st.session_state['exam_finished_at'],
+                resumen_adaptativo=resumen,
             )
             st.download_button(
                 label="Descargar Resultados del Examen como PDF 📄",
-                data=pdf_buffer,
+                # El PDF se construye solo cuando se pide la descarga, y una sola vez por examen
+                data=lambda: generate_exam_pdf_cached(*pdf_args, **pdf_kwargs),
                 file_name=f"Resultados_Examen_Redes_{pdf_user_name.replace(' ', '_')}_{time.strftime('%Y%m%d_%H%M%S')}.pdf",
                 mime="application/pdf",
                 key="download_pdf_button"
             )
 
             for i, user_ans in enumerate(st.session_state['user_answers']):
-                question_info = st.session_state['questions'][user_ans['question_index']]
+                question_info = user_ans.pregunta(st.session_state['questions'])
                 st.markdown(f"---")
-                st.markdown(f"**Pregunta {i + 1}:** {question_info['question']}") # Aquí mantengo "Pregunta X:" para el display en web
+                st.markdown(f"**Pregunta {i + 1}:** {question_info.question}") # Aquí mantengo "Pregunta X:" para el display en web
 
                 st.markdown("**Opciones:**")
-                for option_text in question_info['options']:
+                for option_text in question_info.options:
                     st.markdown(f"- {option_text}")
 
-                st.markdown(f"Tu respuesta: **{user_ans['user_choice_full_text']}**")
+                st.markdown(f"Tu respuesta: **{question_info.opcion(user_ans.user_choice_char)}**")
 
-                # Obtener el texto completo de la respuesta correcta para mostrarlo en Streamlit
-                correct_option_full_text_display = ""
-                for option in question_info['options']:
-                    if option.startswith(user_ans['correct_char'] + ')'):
-                        correct_option_full_text_display = option
-                        break
-                st.markdown(f"Respuesta correcta: **{correct_option_full_text_display}**")
+                # Texto completo de la respuesta correcta para mostrarlo en Streamlit
+                st.markdown(f"Respuesta correcta: **{question_info.correct_option}**")
 
 
-                if user_ans['user_choice_char'] == user_ans['correct_char']:
+                if user_ans.es_correcta(st.session_state['questions']):
                     st.success("✅ ¡Correcto!")
                 else:
                     st.error("❌ Incorrecto.")
-                    st.markdown(f"**Explicación:** {question_info['explanation']}")
+                    st.markdown(f"**Explicación:** {question_info.explanation}")
 
             st.markdown("---")
 
             if st.button("Reiniciar Examen :repeat:", key="reset_exam_button_final"):
-                for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_level', 'exam_topic']:
+                for key in ['exam_started', 'current_question_index', 'score', 'questions', 'user_answers', 'exam_finished', 'exam_active_session', 'current_progress', 'total_questions', 'name_entered_for_exam', 'exam_level', 'exam_topic', 'exam_finished_at', 'exam_generador', 'exam_id', 'exam_preguntas_guardadas', 'exam_adaptativo']:
                     if key in st.session_state:
                         del st.session_state[key]
+                st.query_params.pop("examen", None)
                 st.session_state['user_name'] = "" # Limpiar el nombre al reiniciar examen
                 st.rerun()
 
+    elif st.session_state['current_activity'] == 'instructor' and es_instructor():
+        st.header("Analítica de Exámenes :bar_chart:")
+        st.markdown("Qué sub-temas fallan los estudiantes, qué distractores eligen y en qué preguntas tardan más.")
+        mostrar_vista_instructor(catalogo)
+
 # --- Punto de Entrada de la Aplicación ---
 if __name__ == "__main__":
-    main()
+    iniciar_servidor_metricas()  # Solo si METRICAS_PUERTO está definido
+    try:
+        # Cada interacción vuelve a ejecutar el script completo; se mide cuánto tarda
+        with medir("streamlit_rerun_segundos"):
+            main()
+    finally:
+        if os.environ.get("METRICAS_ARCHIVO"):
+            escribir_prometheus(os.environ["METRICAS_ARCHIVO"], intervalo=float(os.environ.get("METRICAS_INTERVALO", "15")))
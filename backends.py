@@ -0,0 +1,441 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from metricas import incrementar
+
+# --- Backends de modelo intercambiables ---
+# Todas las funciones del tutor hablan con el modelo a través de esta interfaz:
+#   generate(prompt, **opciones)         -> respuesta con .text y .usage_metadata
+#   generate_stream(prompt, **opciones)  -> iterador de fragmentos con .text
+#   generate_async(prompt, **opciones)   -> corrutina que retorna una respuesta
+# Hay una implementación para Gemini y otra local y determinista para pruebas de
+# carga y benchmarks sin conexión ni API key.
+#
+# Además de las opciones de generate_content, todos los backends aceptan:
+#   instruccion_sistema: instrucción fija del tutor, enviada como system instruction
+#   contexto:            prefijo largo y estable (formato de salida, ejercicio en curso...)
+#                        que va antes del prompt; si alcanza CONTEXTO_CACHE_MIN_TOKENS se
+#                        guarda en la caché de contexto del modelo y las llamadas siguientes
+#                        lo reutilizan por CONTEXTO_CACHE_TTL segundos sin volver a enviarlo.
+#                        La caché de contexto exige una versión fija del modelo (por ejemplo
+#                        "gemini-1.5-flash-001") y rechaza los alias "-latest": solo se usa si
+#                        GEMINI_MODEL_CACHE indica esa versión; si no, el contexto va en línea.
+#
+# Se elige con MODEL_BACKEND=gemini (por defecto) o MODEL_BACKEND=fake.
+
+MODELO_GEMINI_POR_DEFECTO = 'models/gemini-1.5-flash-latest'
+
+logger = logging.getLogger("tutor.backends")
+
+# La API solo acepta cachear contenidos a partir de cierto tamaño (32768 tokens en Gemini 1.5);
+# por debajo, el contexto se envía junto con el prompt. CONTEXTO_CACHE=0 desactiva la caché.
+# Los contextos actuales del tutor (formato de salida, ejercicio en curso) rondan los 100-250
+# tokens, así que con el umbral de la API la caché de contexto no se activa en la práctica:
+# queda lista para contextos grandes (material del curso, por ejemplo) y para otros modelos.
+MIN_TOKENS_CONTEXTO = int(os.environ.get("CONTEXTO_CACHE_MIN_TOKENS", "32768"))
+TTL_CONTEXTO = float(os.environ.get("CONTEXTO_CACHE_TTL", "600"))
+CACHE_CONTEXTO_ACTIVA = os.environ.get("CONTEXTO_CACHE", "1") != "0"
+MODELO_CACHE = os.environ.get("GEMINI_MODEL_CACHE", "")
+
+
+class ModelBackend(ABC):
+    """Interfaz común de los backends de modelo."""
+
+    model_name = ""
+
+    @abstractmethod
+    def generate(self, prompt, **opciones):
+        """Retorna la respuesta completa, con .text y .usage_metadata."""
+
+    @abstractmethod
+    def generate_stream(self, prompt, **opciones):
+        """Retorna un iterador de fragmentos de la respuesta."""
+
+    async def generate_async(self, prompt, **opciones):
+        # Por defecto, la llamada síncrona se ejecuta en un hilo para no bloquear el event loop
+        return await asyncio.to_thread(self.generate, prompt, **opciones)
+
+
+def _huella_contexto(instruccion_sistema, contexto):
+    return hashlib.sha256(f"{instruccion_sistema or ''}\x00{contexto}".encode("utf-8")).hexdigest()
+
+
+class RegistroContextos:
+    """
+    Registro LRU de los contextos cacheados en el modelo, con su vencimiento.
+    Las entradas se dan por vencidas un poco antes del TTL real para no usar una caché que
+    la API ya eliminó.
+    """
+
+    def __init__(self, ttl=TTL_CONTEXTO, max_entradas=64):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] <= time.monotonic():
+                self._entradas.pop(clave, None)
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl * 0.9)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+def _conviene_cachear(contexto, min_tokens):
+    return CACHE_CONTEXTO_ACTIVA and bool(contexto) and _contar_tokens(contexto) >= min_tokens
+
+
+class GeminiBackend(ModelBackend):
+    """
+    Backend real sobre google.generativeai.
+    Mantiene un GenerativeModel por instrucción de sistema y, para los contextos grandes,
+    uno ligado a su CachedContent (ver `contexto` al inicio del módulo).
+    """
+
+    def __init__(self, model_name=MODELO_GEMINI_POR_DEFECTO, api_key=None, min_tokens_contexto=MIN_TOKENS_CONTEXTO):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.environ.get("GEMINI_API_KEY"))
+        self._genai = genai
+        self._model = genai.GenerativeModel(model_name)
+        self.model_name = self._model.model_name
+        self.modelo_cache = MODELO_CACHE
+        self.min_tokens_contexto = min_tokens_contexto
+        self._modelos = {None: self._model}
+        self._contextos = RegistroContextos()
+        self._lock = threading.Lock()
+
+    def _modelo_con_instruccion(self, instruccion_sistema):
+        with self._lock:
+            modelo = self._modelos.get(instruccion_sistema)
+            if modelo is None:
+                modelo = self._genai.GenerativeModel(self.model_name, system_instruction=instruccion_sistema)
+                self._modelos[instruccion_sistema] = modelo
+            return modelo
+
+    def _modelo_con_contexto(self, instruccion_sistema, contexto):
+        """Modelo ligado al CachedContent de (instrucción, contexto), creándolo si hace falta; None si falla."""
+        clave = _huella_contexto(instruccion_sistema, contexto)
+        modelo = self._contextos.obtener(clave)
+        if modelo is not None:
+            incrementar("contexto_cache_total", resultado="acierto")
+            return modelo
+        from google.generativeai import caching
+
+        try:
+            cacheado = caching.CachedContent.create(
+                model=self.modelo_cache,
+                system_instruction=instruccion_sistema,
+                contents=[contexto],
+                ttl=datetime.timedelta(seconds=self._contextos.ttl),
+            )
+            modelo = self._genai.GenerativeModel.from_cached_content(cached_content=cacheado)
+        except Exception as e:
+            # Modelo sin soporte de caché, contexto demasiado corto para la API...: se envía en línea
+            incrementar("contexto_cache_total", resultado="error")
+            logger.warning("No se pudo cachear el contexto (%s): %s", type(e).__name__, e)
+            return None
+        incrementar("contexto_cache_total", resultado="creado")
+        self._contextos.guardar(clave, modelo)
+        return modelo
+
+    def _preparar(self, prompt, opciones):
+        """Retorna (modelo, contenido, opciones de generate_content) para la llamada."""
+        instruccion_sistema = opciones.pop("instruccion_sistema", None)
+        contexto = opciones.pop("contexto", None)
+        if self.modelo_cache and _conviene_cachear(contexto, self.min_tokens_contexto):
+            modelo = self._modelo_con_contexto(instruccion_sistema, contexto)
+            if modelo is not None:
+                return modelo, prompt, opciones
+        if contexto:
+            prompt = f"{contexto}\n\n{prompt}"
+        return self._modelo_con_instruccion(instruccion_sistema), prompt, opciones
+
+    def generate(self, prompt, **opciones):
+        modelo, contenido, opciones = self._preparar(prompt, opciones)
+        return modelo.generate_content(contenido, **opciones)
+
+    def generate_stream(self, prompt, **opciones):
+        modelo, contenido, opciones = self._preparar(prompt, opciones)
+        return iter(modelo.generate_content(contenido, stream=True, **opciones))
+
+    async def generate_async(self, prompt, **opciones):
+        if self.modelo_cache and _conviene_cachear(opciones.get("contexto"), self.min_tokens_contexto):
+            # Crear el CachedContent es una llamada HTTP síncrona: se hace fuera del event loop
+            modelo, contenido, opciones = await asyncio.to_thread(self._preparar, prompt, opciones)
+        else:
+            modelo, contenido, opciones = self._preparar(prompt, opciones)
+        return await modelo.generate_content_async(contenido, **opciones)
+
+
+# --- Backend local simulado ---
+
+@dataclass
+class UsoTokensSimulado:
+    """Imita `usage_metadata` de las respuestas de Gemini."""
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    total_token_count: int = 0
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class RespuestaSimulada:
+    text: str
+    usage_metadata: UsoTokensSimulado = field(default_factory=UsoTokensSimulado)
+
+
+@dataclass
+class FragmentoSinTexto:
+    """Imita el fragmento final de un stream de Gemini: sin partes, con `usage_metadata`."""
+    usage_metadata: UsoTokensSimulado = field(default_factory=UsoTokensSimulado)
+    parts: tuple = ()
+
+    @property
+    def text(self):
+        raise ValueError("The `response.text` quick accessor only works when the response contains a valid `Part`.")
+
+
+class ErrorModeloSimulado(RuntimeError):
+    """Error inyectado por FakeBackend. `code` imita el estado HTTP de la API (429 o 503)."""
+
+    def __init__(self, mensaje, code):
+        super().__init__(mensaje)
+        self.code = code
+
+
+def _contar_tokens(texto):
+    # Aproximación suficiente para simular el consumo: ~4 caracteres por token
+    return max(1, len(texto) // 4)
+
+
+class FakeBackend(ModelBackend):
+    """
+    Backend local y determinista para pruebas de carga, benchmarks y CI sin red.
+
+    - `latencia` y `jitter`: segundos de espera simulada por llamada (media y desviación).
+    - `tasa_error`: probabilidad de lanzar ErrorModeloSimulado.
+    - `tasa_malformada`: probabilidad de devolver una pregunta con formato inválido.
+    - `semilla`: fija la secuencia de latencias, errores y salidas malformadas.
+
+    El contenido depende solo del prompt, así que el mismo prompt produce siempre el mismo texto.
+    """
+
+    model_name = "fake/tutor-redes"
+
+    def __init__(self, latencia=0.0, jitter=0.0, tasa_error=0.0, tasa_malformada=0.0, semilla=0,
+                 min_tokens_contexto=MIN_TOKENS_CONTEXTO):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_error = tasa_error
+        self.tasa_malformada = tasa_malformada
+        self.min_tokens_contexto = min_tokens_contexto
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._contextos = RegistroContextos()
+        self.llamadas = 0
+
+    # -- decisiones aleatorias (reproducibles con la semilla) --
+    def _sortear(self):
+        with self._lock:
+            self.llamadas += 1
+            espera = max(0.0, self._rng.gauss(self.latencia, self.jitter)) if self.jitter else self.latencia
+            error = self._rng.random() < self.tasa_error
+            malformada = self._rng.random() < self.tasa_malformada
+            codigo = self._rng.choice((429, 503))
+        return espera, error, malformada, codigo
+
+    def _preparar(self, prompt, opciones):
+        """
+        Aplica el mismo contrato que GeminiBackend para `instruccion_sistema` y `contexto`.
+        Retorna (entrada completa que "ve" el modelo, tokens de la entrada servidos desde la caché).
+        """
+        instruccion_sistema = opciones.pop("instruccion_sistema", None)
+        contexto = opciones.pop("contexto", None)
+        entrada = "\n\n".join(parte for parte in (instruccion_sistema, contexto, prompt) if parte)
+        if not _conviene_cachear(contexto, self.min_tokens_contexto):
+            return entrada, 0
+        clave = _huella_contexto(instruccion_sistema, contexto)
+        if self._contextos.obtener(clave) is None:
+            self._contextos.guardar(clave, True)
+            incrementar("contexto_cache_total", resultado="creado")
+        else:
+            incrementar("contexto_cache_total", resultado="acierto")
+        return entrada, _contar_tokens(f"{instruccion_sistema or ''}{contexto}")
+
+    # -- contenido determinista --
+    @staticmethod
+    def _semilla_prompt(prompt):
+        return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+
+    _PLANTILLAS = (
+        "¿Qué ocurre con {a} cuando se analiza {tema} en una red con {b}?",
+        "En el contexto de {tema}, ¿cuál es la función principal de {a} frente a {b}?",
+        "Un administrador revisa {a} y {b}. ¿Qué afirmación sobre {tema} es correcta?",
+        "¿Por qué {tema} influye en el comportamiento de {a} durante {b}?",
+        "Si falla {a}, ¿qué efecto tiene sobre {tema} y sobre {b}?",
+    )
+    _TERMINOS = (
+        "la tabla ARP", "el TTL", "la MTU", "el checksum", "la ventana deslizante", "el gateway",
+        "la máscara", "el broadcast", "la tabla CAM", "el handshake", "la latencia", "el jitter",
+        "el enlace troncal", "la VLAN nativa", "el puerto 443", "la métrica OSPF", "el NAT",
+        "el servidor DHCP", "la caché DNS", "el spanning tree", "la colisión", "el ancho de banda",
+    )
+
+    def _enunciado(self, tema, rng):
+        a, b = rng.sample(self._TERMINOS, 2)
+        return rng.choice(self._PLANTILLAS).format(tema=tema, a=a, b=b)
+
+    def _pregunta(self, tema, nivel, rng, malformada):
+        correcta = rng.randrange(4)
+        opciones = [f"Afirmación {i + 1} sobre {tema}" for i in range(4)]
+        lineas = [f"Pregunta: {self._enunciado(tema, rng)} (nivel {nivel})"]
+        lineas += [f"{chr(65 + i)}) {texto}" for i, texto in enumerate(opciones)]
+        lineas.append(f"Respuesta Correcta: {chr(65 + correcta)}")
+        lineas.append(f"Explicación: La afirmación {correcta + 1} describe correctamente {tema}.")
+        if malformada:
+            # Se elimina una línea esencial, como haría una salida defectuosa del modelo
+            del lineas[rng.choice((1, 5, 6))]
+        return "\n".join(lineas)
+
+    def _lote_json(self, prompt, rng, malformada):
+        temas = re.findall(r"^\s*\d+\.\s+(.+?)\s*$", prompt, re.M)
+        items = []
+        for tema in temas:
+            items.append({
+                "sub_tema": tema,
+                "pregunta": self._enunciado(tema, rng),
+                "opciones": [f"Afirmación {i + 1} sobre {tema}" for i in range(4)],
+                "indice_correcto": rng.randrange(4),
+                "explicacion": f"Es la única afirmación correcta sobre {tema}.",
+            })
+        if malformada and items:
+            items[rng.randrange(len(items))]["opciones"] = ["incompleta"]
+        return json.dumps(items, ensure_ascii=False)
+
+    def _texto(self, prompt, opciones, malformada):
+        rng = random.Random(self._semilla_prompt(prompt))
+        config = opciones.get("generation_config")
+        if isinstance(config, dict):
+            mime = config.get("response_mime_type")
+        else:
+            mime = getattr(config, "response_mime_type", None)
+        if mime == "application/json":
+            return self._lote_json(prompt, rng, malformada)
+        if "Respuesta Correcta:" in prompt:
+            tema = re.search(r'sobre \*\*"(.+?)"\*\*', prompt)
+            nivel = re.search(r'nivel \*\*"(.+?)"\*\*', prompt)
+            return self._pregunta(tema.group(1) if tema else "redes", nivel.group(1) if nivel else "Básico", rng, malformada)
+        parrafos = [f"{i + 1}. Paso {i + 1} de la explicación simulada ({rng.randrange(10**6)})." for i in range(8)]
+        return "**Respuesta simulada**\n\n" + "\n".join(parrafos)
+
+    def _respuesta(self, prompt, texto, cacheados=0):
+        # Como en Gemini, prompt_token_count incluye los tokens servidos desde la caché
+        entrada, salida = _contar_tokens(prompt), _contar_tokens(texto)
+        return RespuestaSimulada(texto, UsoTokensSimulado(entrada, salida, entrada + salida, cacheados))
+
+    def generate(self, prompt, **opciones):
+        prompt, cacheados = self._preparar(prompt, opciones)
+        espera, error, malformada, codigo = self._sortear()
+        time.sleep(espera)
+        if error:
+            raise ErrorModeloSimulado(f"Error simulado del modelo ({codigo})", codigo)
+        return self._respuesta(prompt, self._texto(prompt, opciones, malformada), cacheados)
+
+    def generate_stream(self, prompt, **opciones):
+        prompt, cacheados = self._preparar(prompt, opciones)
+        espera, error, malformada, codigo = self._sortear()
+        if error:
+            time.sleep(espera)
+            raise ErrorModeloSimulado(f"Error simulado del modelo ({codigo})", codigo)
+        texto = self._texto(prompt, opciones, malformada)
+        palabras = texto.split(" ")
+        # La latencia se reparte entre el primer fragmento y el resto del stream
+        time.sleep(espera * 0.2)
+        for i in range(0, len(palabras), 8):
+            if i:
+                time.sleep(espera * 0.8 * 8 / len(palabras))
+            yield RespuestaSimulada(" ".join(palabras[i:i + 8]) + (" " if i + 8 < len(palabras) else ""))
+        # Como en Gemini, el stream termina con un fragmento sin partes que solo trae el uso de
+        # tokens de toda la respuesta; leer su `.text` lanza ValueError
+        yield FragmentoSinTexto(self._respuesta(prompt, texto, cacheados).usage_metadata)
+
+    async def generate_async(self, prompt, **opciones):
+        prompt, cacheados = self._preparar(prompt, opciones)
+        espera, error, malformada, codigo = self._sortear()
+        await asyncio.sleep(espera)
+        if error:
+            raise ErrorModeloSimulado(f"Error simulado del modelo ({codigo})", codigo)
+        return self._respuesta(prompt, self._texto(prompt, opciones, malformada), cacheados)
+
+
+def crear_backend(nombre=None):
+    """
+    Crea el backend indicado ("gemini" o "fake"); por defecto usa MODEL_BACKEND.
+    El backend simulado se ajusta con FAKE_LATENCIA, FAKE_JITTER, FAKE_TASA_ERROR,
+    FAKE_TASA_MALFORMADA y FAKE_SEMILLA.
+    """
+    nombre = (nombre or os.environ.get("MODEL_BACKEND", "gemini")).lower()
+    if nombre == "fake":
+        return FakeBackend(
+            latencia=float(os.environ.get("FAKE_LATENCIA", "0.5")),
+            jitter=float(os.environ.get("FAKE_JITTER", "0.1")),
+            tasa_error=float(os.environ.get("FAKE_TASA_ERROR", "0")),
+            tasa_malformada=float(os.environ.get("FAKE_TASA_MALFORMADA", "0")),
+            semilla=int(os.environ.get("FAKE_SEMILLA", "0")),
+        )
+    if nombre == "gemini":
+        return GeminiBackend(os.environ.get("GEMINI_MODEL", MODELO_GEMINI_POR_DEFECTO))
+    raise ValueError(f"Backend de modelo desconocido: {nombre!r}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend_global():
+    """
+    Retorna el backend compartido por el proceso, creándolo la primera vez.
+    Salvo que RESILIENCIA=0, se envuelve con reintentos, hedging y circuit breaker
+    (ver resiliencia.py); las copias por hedging solo se lanzan si sobra cuota.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = crear_backend()
+            if os.environ.get("RESILIENCIA", "1") != "0":
+                from generacion import limitador_global
+                from resiliencia import ResilientBackend
+
+                _backend = ResilientBackend(
+                    _backend,
+                    permitir_hedge=lambda: limitador_global().try_acquire(reserva=1),
+                )
+        return _backend
+
+
+def usar_backend(backend):
+    """Reemplaza el backend compartido (por ejemplo, por un FakeBackend en benchmarks)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from modelos import Question
+
+# --- Banco persistente de preguntas pre-generadas ---
+# Las preguntas se guardan en SQLite agrupadas por (sub-tema, nivel). Un hilo de fondo
+# mantiene cada grupo por encima de un mínimo, de modo que "Comenzar Examen" solo
+# necesita extraer preguntas del banco y recurre a la generación en vivo cuando un
+# grupo está vacío.
+
+RUTA_BANCO_POR_DEFECTO = os.environ.get("BANCO_PREGUNTAS_DB", "banco_preguntas.sqlite3")
+
+
+class BancoPreguntas:
+    """Banco de preguntas de opción múltiple ya parseadas, guardado en SQLite."""
+
+    def __init__(self, ruta=RUTA_BANCO_POR_DEFECTO):
+        self.ruta = ruta
+        with self._conectar() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS preguntas (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       sub_tema TEXT NOT NULL,
+                       nivel TEXT NOT NULL,
+                       datos TEXT NOT NULL,
+                       creada REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_preguntas_grupo ON preguntas (nivel, sub_tema)")
+
+    def _conectar(self):
+        # Una conexión por operación: sqlite3 no permite compartir conexiones entre hilos.
+        # closing(): `with conn` solo confirma la transacción, no cierra la conexión
+        return closing(sqlite3.connect(self.ruta, timeout=30))
+
+    def agregar(self, sub_tema, nivel, pregunta):
+        """Guarda una pregunta parseada en el grupo (sub_tema, nivel)."""
+        with self._conectar() as conn, conn:
+            conn.execute(
+                "INSERT INTO preguntas (sub_tema, nivel, datos, creada) VALUES (?, ?, ?, ?)",
+                (sub_tema, nivel, json.dumps(pregunta.a_dict(), ensure_ascii=False), time.time()),
+            )
+
+    def contar(self, sub_tema, nivel):
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT COUNT(*) FROM preguntas WHERE sub_tema = ? AND nivel = ?", (sub_tema, nivel)
+            ).fetchone()
+        return fila[0]
+
+    def conteos(self):
+        """Retorna {(sub_tema, nivel): cantidad} para todos los grupos con preguntas."""
+        with self._conectar() as conn:
+            filas = conn.execute("SELECT sub_tema, nivel, COUNT(*) FROM preguntas GROUP BY sub_tema, nivel").fetchall()
+        return {(sub_tema, nivel): cantidad for sub_tema, nivel, cantidad in filas}
+
+    def extraer(self, sub_temas, nivel, cantidad):
+        """
+        Extrae (y elimina del banco) hasta `cantidad` preguntas del nivel dado, como máximo
+        una por sub-tema, elegidas al azar. Al eliminarlas, ninguna pregunta se sirve dos veces.
+        Retorna una lista de tuplas (sub_tema, pregunta).
+        """
+        if cantidad <= 0 or not sub_temas:
+            return []
+        marcadores = ",".join("?" for _ in sub_temas)
+        with self._conectar() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                filas = conn.execute(
+                    f"""SELECT id, sub_tema, datos FROM preguntas
+                        WHERE nivel = ? AND sub_tema IN ({marcadores})
+                        ORDER BY RANDOM()""",
+                    (nivel, *sub_temas),
+                ).fetchall()
+                elegidas = {}
+                for id_pregunta, sub_tema, datos in filas:
+                    if sub_tema not in elegidas:
+                        elegidas[sub_tema] = (id_pregunta, datos)
+                        if len(elegidas) == cantidad:
+                            break
+                conn.executemany("DELETE FROM preguntas WHERE id = ?", [(i,) for i, _ in elegidas.values()])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        resultado = [(sub_tema, Question.desde_dict(dict(json.loads(datos), sub_tema=sub_tema)))
+                     for sub_tema, (_, datos) in elegidas.items()]
+        random.shuffle(resultado)
+        return resultado
+
+
+class RellenadorBanco(threading.Thread):
+    """
+    Hilo de fondo que mantiene cada grupo (sub_tema, nivel) del banco con al menos
+    `minimo` preguntas, rellenándolo hasta `objetivo`.
+    Solo consume cuota de la API cuando el limitador tiene `reserva` tokens libres,
+    para no competir con los exámenes en vivo.
+    `grupos` son los pares (sub_tema, nivel) a mantener, sin los de peso 0 en el catálogo
+    (nunca salen en un examen de ese nivel). Puede ser una función que retorna la lista
+    vigente (por ejemplo, la del catálogo recargable); se vuelve a consultar en cada pasada.
+    """
+
+    def __init__(self, banco, grupos, generar_fn, parse_fn, limiter,
+                 minimo=2, objetivo=4, reserva=3, intervalo=30.0):
+        super().__init__(name="rellenador-banco-preguntas", daemon=True)
+        self.banco = banco
+        self.grupos = grupos if callable(grupos) else list(grupos)
+        self.generar_fn = generar_fn
+        self.parse_fn = parse_fn
+        self.limiter = limiter
+        self.minimo = minimo
+        self.objetivo = objetivo
+        self.reserva = reserva
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def detener(self):
+        self._detener.set()
+
+    def grupos_bajo_minimo(self):
+        """Retorna [(sub_tema, nivel, faltantes)] de los grupos por debajo del mínimo."""
+        conteos = self.banco.conteos()
+        faltantes = []
+        grupos = self.grupos() if callable(self.grupos) else self.grupos
+        for sub_tema, nivel in grupos:
+            actual = conteos.get((sub_tema, nivel), 0)
+            if actual < self.minimo:
+                faltantes.append((sub_tema, nivel, self.objetivo - actual))
+        # Primero los grupos más vacíos
+        faltantes.sort(key=lambda g: -g[2])
+        return faltantes
+
+    def rellenar_una_vez(self):
+        """Hace una pasada de relleno. Retorna la cantidad de preguntas agregadas."""
+        agregadas = 0
+        for sub_tema, nivel, faltan in self.grupos_bajo_minimo():
+            for _ in range(faltan):
+                while not self.limiter.try_acquire(reserva=self.reserva):
+                    if self._detener.wait(1.0):
+                        return agregadas
+                try:
+                    pregunta = self.parse_fn(self.generar_fn(sub_tema, nivel))
+                except Exception:
+                    # Error de la API (por ejemplo, cuota): se reintenta en la próxima pasada
+                    return agregadas
+                if pregunta:
+                    self.banco.agregar(sub_tema, nivel, pregunta)
+                    agregadas += 1
+        return agregadas
+
+    def run(self):
+        while not self._detener.is_set():
+            self.rellenar_una_vez()
+            self._detener.wait(self.intervalo)
@@ -0,0 +1,74 @@
+import argparse
+import math
+import os
+import random
+import sys
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import adaptativo
+from adaptativo import EstimadorHabilidad, prob_correcta
+from catalogo import catalogo_actual
+
+# --- Examen fijo de 10 preguntas vs examen adaptativo, con estudiantes simulados ---
+# Uso:
+#   python benchmarks/bench_adaptativo.py [--estudiantes 200] [--error-objetivo 0.6]
+#
+# Cada estudiante simulado elige un nivel y tiene una habilidad real θ ~ N(b[nivel], 1),
+# distinta en cada sub-tema (θ + N(0, DISPERSION_SUB_TEMA)); responde según el modelo de
+# adaptativo.py. Se compara, por nivel elegido:
+#   - fijo: 10 preguntas del nivel elegido, sub-temas al azar (como el examen actual)
+#   - adaptativo: EstimadorHabilidad.candidatos() y parada con `terminado()`
+# Columnas: preguntas generadas (= llamadas al modelo sin banco), error de la estimación
+# (desvío de la posterior) y error real (RMSE entre la habilidad estimada y la real).
+
+PREGUNTAS_EXAMEN_FIJO = 10
+
+
+def simular(nivel, estimador, sub_temas, pesos, rng, adaptativo_, error_objetivo):
+    theta = rng.gauss(estimador.b[nivel], 1)
+    por_sub_tema = {s: theta + rng.gauss(0, adaptativo.DISPERSION_SUB_TEMA) for s in sub_temas}
+    if adaptativo_:
+        while not estimador.terminado(error_objetivo=error_objetivo):
+            sub_tema, nivel_pregunta = estimador.candidatos(sub_temas, pesos)[0]
+            correcta = rng.random() < prob_correcta(por_sub_tema[sub_tema], estimador.b[nivel_pregunta])
+            estimador.registrar(sub_tema, nivel_pregunta, correcta)
+    else:
+        for sub_tema in rng.sample(sub_temas, min(PREGUNTAS_EXAMEN_FIJO, len(sub_temas))) * 2:
+            if len(estimador.respuestas) == PREGUNTAS_EXAMEN_FIJO:
+                break
+            estimador.registrar(sub_tema, nivel, rng.random() < prob_correcta(por_sub_tema[sub_tema], estimador.b[nivel]))
+    posterior = estimador.posterior()
+    return len(estimador.respuestas), posterior.desvio, (posterior.media - theta) ** 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara el examen fijo con el adaptativo sobre estudiantes simulados.")
+    parser.add_argument("--estudiantes", type=int, default=200, help="Estudiantes simulados por nivel")
+    parser.add_argument("--error-objetivo", type=float, default=adaptativo.ERROR_OBJETIVO)
+    args = parser.parse_args(argv)
+
+    catalogo = catalogo_actual()
+    tema = catalogo.temas[0]
+    print(f"{'nivel':<12} {'modo':<11} {'preguntas':>10} {'error est.':>11} {'RMSE':>7}")
+    for nivel in catalogo.niveles:
+        pesos = catalogo.sub_temas_para(tema, nivel) or dict.fromkeys(catalogo.sub_temas_de(tema), 1)
+        sub_temas = list(pesos)
+        for modo in ("fijo", "adaptativo"):
+            rng = random.Random(0)
+            random.seed(0)  # desempates de EstimadorHabilidad.candidatos()
+            resultados = [
+                simular(nivel, EstimadorHabilidad(catalogo.niveles, nivel), sub_temas, pesos, rng,
+                        modo == "adaptativo", args.error_objetivo)
+                for _ in range(args.estudiantes)
+            ]
+            preguntas = sum(r[0] for r in resultados) / len(resultados)
+            error = sum(r[1] for r in resultados) / len(resultados)
+            rmse = math.sqrt(sum(r[2] for r in resultados) / len(resultados))
+            print(f"{nivel:<12} {modo:<11} {preguntas:>10.1f} {error:>11.2f} {rmse:>7.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
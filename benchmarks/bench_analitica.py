@@ -0,0 +1,105 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analitica import AlmacenAnalitica
+from catalogo import catalogo_actual
+from modelos import Answer, Question
+
+# --- Tiempo de las consultas de la vista del instructor ---
+# Uso:
+#   python benchmarks/bench_analitica.py [--respuestas 100000] [--preguntas-por-sub-tema 30]
+#
+# Llena un almacén temporal con exámenes sintéticos de 10 preguntas sobre los temas del
+# catálogo (en lotes, como un backfill) y mide cada consulta de analitica.py, sin filtro y
+# filtrando por tema y nivel. Objetivo: muy por debajo de 1 s con 100k respuestas.
+
+PREGUNTAS_POR_EXAMEN = 10
+EXAMENES_POR_LOTE = 500
+
+
+def examenes_sinteticos(cantidad, preguntas_por_sub_tema, rng):
+    catalogo = catalogo_actual()
+    bancos = {}
+    for tema in catalogo.temas:
+        for sub_tema in catalogo.sub_temas_de(tema):
+            bancos.setdefault(tema, []).extend(
+                Question(
+                    question=f"Pregunta {i} sobre \"{sub_tema}\"",
+                    options=tuple(f"{letra}) Opción {j} de {sub_tema} {i}" for j, letra in enumerate("ABCD")),
+                    correct_answer_char=rng.choice("ABCD"),
+                    explanation="",
+                    sub_tema=sub_tema,
+                )
+                for i in range(preguntas_por_sub_tema)
+            )
+    for numero in range(cantidad):
+        tema = rng.choice(catalogo.temas)
+        preguntas = rng.sample(bancos[tema], min(PREGUNTAS_POR_EXAMEN, len(bancos[tema])))
+        respuestas = [
+            Answer(i, p.correct_answer_char if rng.random() < 0.6 else rng.choice("ABCD"), round(rng.uniform(5, 90), 1))
+            for i, p in enumerate(preguntas)
+        ]
+        yield {
+            'exam_id': f"bench-{numero}", 'user_name': f"estudiante {numero % 300}",
+            'exam_level': rng.choice(catalogo.niveles), 'exam_topic': tema,
+            'score': sum(r.es_correcta(preguntas) for r in respuestas), 'total_questions': len(preguntas),
+            'questions': preguntas, 'user_answers': respuestas,
+        }
+
+
+def cronometrar(funcion, repeticiones=5):
+    """Mejor tiempo de `repeticiones` ejecuciones, en milisegundos."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide las consultas de la analítica de exámenes.")
+    parser.add_argument("--respuestas", type=int, default=100_000)
+    parser.add_argument("--preguntas-por-sub-tema", type=int, default=30)
+    args = parser.parse_args(argv)
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        almacen = AlmacenAnalitica(os.path.join(carpeta, "analitica.sqlite3"))
+        inicio = time.perf_counter()
+        lote = []
+        insertadas = 0
+        for estado in examenes_sinteticos(args.respuestas // PREGUNTAS_POR_EXAMEN, args.preguntas_por_sub_tema, rng):
+            lote.append(estado)
+            if len(lote) == EXAMENES_POR_LOTE:
+                insertadas += almacen.registrar_examenes(lote)
+                lote = []
+        insertadas += almacen.registrar_examenes(lote)
+        carga = time.perf_counter() - inicio
+        print(f"{insertadas} respuestas cargadas en {carga:.1f} s "
+              f"({os.path.getsize(almacen.ruta) / insertadas:.0f} bytes por respuesta)")
+
+        catalogo = catalogo_actual()
+        tema, nivel = catalogo.temas[0], catalogo.niveles[0]
+        consultas = {
+            "resumen": lambda **f: almacen.resumen(**f),
+            "precision_por_sub_tema": lambda **f: almacen.precision_por_sub_tema(**f),
+            "distractores_frecuentes": lambda **f: almacen.distractores_frecuentes(**f),
+            "tiempo_por_pregunta": lambda **f: almacen.tiempo_por_pregunta(**f),
+        }
+        print(f"{'consulta':<26} {'todo (ms)':>10} {'tema (ms)':>10} {'tema+nivel (ms)':>16}")
+        for nombre, consulta in consultas.items():
+            print(f"{nombre:<26} {cronometrar(consulta):>10.1f} {cronometrar(lambda: consulta(tema=tema)):>10.1f} "
+                  f"{cronometrar(lambda: consulta(tema=tema, nivel=nivel)):>16.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
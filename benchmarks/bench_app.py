@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backends
+from backends import FakeBackend
+from generacion import GeneradorExamenProgresivo, TokenBucket
+from modelos import Answer, Question
+from reporte_pdf import generate_exam_pdf
+from tutor import parse_multiple_choice_question, generar_preguntas_lote, parse_lote_preguntas
+
+# --- Microbenchmarks de las funciones más usadas de la app ---
+# Uso:
+#   python benchmarks/bench_app.py --salida resultados.json
+#   python benchmarks/bench_app.py --salida nuevo.json --comparar resultados.json --umbral 0.2
+#
+# Cada caso se mide varias veces y se reporta la mediana (y p95) en milisegundos por llamada.
+# Con --comparar el script termina con código 1 si algún caso es más lento que la
+# referencia en más del umbral indicado (0.2 = 20 %).
+
+PREGUNTA_BIEN_FORMADA = """Pregunta: ¿Qué capa del modelo OSI se encarga del enrutamiento?
+A) Capa de Enlace de Datos
+B) Capa de Red
+C) Capa de Transporte
+D) Capa Física
+Respuesta Correcta: B
+Explicación: La capa de red decide la ruta de los paquetes entre redes."""
+
+PREGUNTA_MULTILINEA = """Pregunta: ¿Qué capa del modelo OSI se encarga del enrutamiento?
+A) Capa de Enlace de Datos
+B) Capa de Red
+C) Capa de Transporte
+D) Capa Física
+Respuesta Correcta: B
+Explicación: La capa de red decide la ruta de los paquetes entre redes.
+Para ello usa direcciones lógicas (IP) y tablas de enrutamiento,
+a diferencia de la capa de enlace, que usa direcciones MAC."""
+
+PREGUNTA_MALFORMADA = """**Pregunta:** ¿Qué capa del modelo OSI se encarga del enrutamiento?
+A. Capa de Enlace de Datos
+B. Capa de Red
+C. Capa de Transporte
+Respuesta: la capa de red"""
+
+SUB_TEMAS = [f"Sub-tema de prueba {i}" for i in range(52)]
+
+
+def _examen_de_prueba(cantidad):
+    """Arma preguntas (Question) y respuestas (Answer) como las del session_state para medir el PDF."""
+    preguntas = []
+    respuestas = []
+    for i in range(cantidad):
+        preguntas.append(Question(
+            question=f"¿Pregunta de prueba número {i + 1} sobre el modelo OSI y sus capas?",
+            options=tuple(f"{letra}) Opción {letra} de la pregunta {i + 1}" for letra in "ABCD"),
+            correct_answer_char="B",
+            explanation="La opción B es la correcta porque describe la función de la capa. " * 2,
+        ))
+        respuestas.append(Answer(question_index=i, user_choice_char="B" if i % 2 else "C"))
+    return preguntas, respuestas
+
+
+def medir(funcion, repeticiones=15, tiempo_minimo=0.005):
+    """
+    Mide `funcion` y retorna estadísticas en milisegundos por llamada.
+    Las funciones muy rápidas se ejecutan en bucle hasta superar `tiempo_minimo` por muestra.
+    """
+    funcion()  # calentamiento
+    vueltas = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(vueltas):
+            funcion()
+        if time.perf_counter() - inicio >= tiempo_minimo:
+            break
+        vueltas *= 2
+
+    muestras = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(vueltas):
+            funcion()
+        muestras.append((time.perf_counter() - inicio) / vueltas * 1000)
+    muestras.sort()
+    return {
+        "mediana_ms": statistics.median(muestras),
+        "media_ms": statistics.fmean(muestras),
+        "p95_ms": muestras[min(len(muestras) - 1, int(len(muestras) * 0.95))],
+        "min_ms": muestras[0],
+        "repeticiones": repeticiones,
+        "vueltas": vueltas,
+    }
+
+
+def _examen_progresivo(total, limitador):
+    """Genera un examen completo con GeneradorExamenProgresivo, como si el estudiante respondiera al instante."""
+    generador = GeneradorExamenProgresivo(SUB_TEMAS, "Básico", total, generar_preguntas_lote, parse_lote_preguntas,
+                                          limiter=limitador)
+    for indice in range(total):
+        generador.esperar(indice)
+    generador.detener()
+
+
+def casos():
+    """Retorna {nombre: (funcion, repeticiones)} con todos los casos del benchmark."""
+    resultado = {
+        "parse/bien_formada": (lambda: parse_multiple_choice_question(PREGUNTA_BIEN_FORMADA), 25),
+        "parse/multilinea": (lambda: parse_multiple_choice_question(PREGUNTA_MULTILINEA), 25),
+        "parse/malformada": (lambda: parse_multiple_choice_question(PREGUNTA_MALFORMADA), 25),
+    }
+    for cantidad in (10, 50, 200):
+        preguntas, respuestas = _examen_de_prueba(cantidad)
+        resultado[f"pdf/{cantidad}_preguntas"] = (
+            lambda p=preguntas, r=respuestas, n=cantidad: generate_exam_pdf(n // 2, n, r, p, fecha="2024-01-01 00:00:00"),
+            5 if cantidad >= 200 else 10,
+        )
+
+    # El bucle de generación del examen se mide con un modelo simulado sin latencia,
+    # de modo que solo cuenta el costo propio de la app (hilos, parseo, validación)
+    limitador = TokenBucket(rate=1e9, capacity=1e9)
+    resultado["examen/progresivo_10"] = (lambda: _examen_progresivo(10, limitador), 15)
+    return resultado
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparar(actual, referencia, umbral):
+    """Retorna la lista de casos cuya mediana empeoró más que `umbral` respecto de la referencia."""
+    regresiones = []
+    for nombre, datos in actual["resultados"].items():
+        base = referencia.get("resultados", {}).get(nombre)
+        if not base:
+            continue
+        cambio = datos["mediana_ms"] / base["mediana_ms"] - 1
+        if cambio > umbral:
+            regresiones.append((nombre, base["mediana_ms"], datos["mediana_ms"], cambio))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks de la app de Arquitectura de Redes.")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="Archivo JSON de referencia para detectar regresiones")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Empeoramiento máximo tolerado (0.2 = 20%%)")
+    parser.add_argument("--filtro", default="", help="Solo ejecuta los casos cuyo nombre contiene este texto")
+    args = parser.parse_args(argv)
+
+    backends.usar_backend(FakeBackend(latencia=0.0, semilla=0))
+
+    resultados = {}
+    for nombre, (funcion, repeticiones) in casos().items():
+        if args.filtro not in nombre:
+            continue
+        resultados[nombre] = medir(funcion, repeticiones=repeticiones)
+        print(f"{nombre:<28} mediana {resultados[nombre]['mediana_ms']:10.3f} ms   p95 {resultados[nombre]['p95_ms']:10.3f} ms")
+
+    salida = {
+        "meta": {
+            "commit": _commit_actual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            referencia = json.load(f)
+        regresiones = comparar(salida, referencia, args.umbral)
+        for nombre, base, actual, cambio in regresiones:
+            print(f"REGRESIÓN {nombre}: {base:.3f} ms -> {actual:.3f} ms (+{cambio:.0%})", file=sys.stderr)
+        if regresiones:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Caché de explicaciones solo en memoria: cada ronda usa un tema distinto y debe llegar al modelo
+os.environ.setdefault("CACHE_EXPLICACIONES_DB", "")
+
+import backends
+import coalescencia
+from backends import FakeBackend
+from metricas import registro
+from tutor import explicar_concepto, generar_ejercicio, generar_ejercicio_async
+
+# --- Inicio de laboratorio: toda la clase pide lo mismo a la vez, con y sin coalescencia ---
+# Uso:
+#   python benchmarks/bench_coalescencia.py [--estudiantes 40] [--ventana 0.3] [--latencia 1.0]
+#
+# Cada estudiante hace clic dentro de una ventana de `--ventana` segundos y pide, sobre el
+# mismo tema, lo mismo que el resto de la clase:
+#   - ejercicio:          generar_ejercicio (llamada síncrona, como en la página)
+#   - explicacion_stream: explicar_concepto con stream=True (la explicación de la página)
+#   - ejercicio_async:    generar_ejercicio_async (endpoint /ejercicio de api.py)
+# Columnas: llamadas al modelo, llamadas coalescidas (modelo_coalescidas_total), tiempo de
+# respuesta por estudiante y si todos recibieron el mismo texto completo.
+
+ESCENARIOS = ("ejercicio", "explicacion_stream", "ejercicio_async")
+
+
+def _pedir(escenario, tema):
+    if escenario == "ejercicio":
+        return generar_ejercicio(tema, "Intermedio")
+    return "".join(explicar_concepto(tema, stream=True))
+
+
+def clase_sincrona(escenario, tema, estudiantes, ventana, rng):
+    retrasos = sorted(rng.uniform(0, ventana) for _ in range(estudiantes))
+    textos, tiempos = [None] * estudiantes, [0.0] * estudiantes
+    inicio = time.perf_counter()
+
+    def estudiante(i):
+        time.sleep(max(0.0, inicio + retrasos[i] - time.perf_counter()))
+        llegada = time.perf_counter()
+        textos[i] = _pedir(escenario, tema)
+        tiempos[i] = time.perf_counter() - llegada
+
+    hilos = [threading.Thread(target=estudiante, args=(i,)) for i in range(estudiantes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return textos, tiempos
+
+
+async def clase_asincrona(tema, estudiantes, ventana, rng):
+    async def estudiante(retraso):
+        await asyncio.sleep(retraso)
+        llegada = time.perf_counter()
+        texto = await generar_ejercicio_async(tema, "Intermedio")
+        return texto, time.perf_counter() - llegada
+
+    resultados = await asyncio.gather(*(estudiante(rng.uniform(0, ventana)) for _ in range(estudiantes)))
+    return [r[0] for r in resultados], [r[1] for r in resultados]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide cuántas llamadas al modelo ahorra la coalescencia al inicio de un laboratorio.")
+    parser.add_argument("--estudiantes", type=int, default=40)
+    parser.add_argument("--ventana", type=float, default=0.3, help="Segundos en los que llegan todos los clics")
+    parser.add_argument("--latencia", type=float, default=1.0, help="Latencia simulada del modelo, en segundos")
+    args = parser.parse_args(argv)
+
+    backends.usar_backend(FakeBackend(latencia=args.latencia, jitter=args.latencia * 0.2, semilla=0))
+    print(f"{'escenario':<20} {'coalescencia':<13} {'llamadas':>9} {'coalescidas':>12} "
+          f"{'p50 (s)':>8} {'máx (s)':>8} {'mismo texto':>12}")
+    for escenario in ESCENARIOS:
+        funcion = "explicar_concepto" if escenario == "explicacion_stream" else "generar_ejercicio"
+        for activa in (False, True):
+            coalescencia.ACTIVA = activa
+            registro.reiniciar()
+            rng = random.Random(0)
+            # Un tema distinto por ronda para que la caché de explicaciones no responda por el modelo
+            tema = f"VLSM ({escenario}, {activa})"
+            if escenario == "ejercicio_async":
+                textos, tiempos = asyncio.run(clase_asincrona(tema, args.estudiantes, args.ventana, rng))
+            else:
+                textos, tiempos = clase_sincrona(escenario, tema, args.estudiantes, args.ventana, rng)
+            llamadas = registro.contador("modelo_llamadas_total", funcion=funcion, resultado="ok")
+            modo = {"ejercicio": "sync", "explicacion_stream": "stream", "ejercicio_async": "async"}[escenario]
+            coalescidas = registro.contador("modelo_coalescidas_total", funcion=funcion, modo=modo)
+            mismo = "sí" if len(set(textos)) == 1 and all(textos) else "no"
+            print(f"{escenario:<20} {'sí' if activa else 'no':<13} {llamadas:>9} {coalescidas:>12} "
+                  f"{statistics.median(tiempos):>8.2f} {max(tiempos):>8.2f} {mismo:>12}")
+    coalescencia.ACTIVA = True
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backends import FakeBackend
+from parseo_preguntas import MOTIVOS, analizar_pregunta
+from tutor import FORMATO_PREGUNTA_MC, _prompt_pregunta_multiple_choice, parse_multiple_choice_question
+
+# --- Parser de preguntas: tasa de regeneración antes/después y propiedades sobre un corpus ---
+# Uso:
+#   python benchmarks/bench_parseo.py [--casos 300] [--fuzz 5000] [--semilla 0]
+#
+# Cada caso parte de una pregunta conocida (enunciado, opciones, índice correcto, explicación)
+# escrita en el formato de FORMATO_PREGUNTA_MC y le aplica una mutación:
+#   - recuperables: variaciones que el modelo produce en la práctica; la propiedad es que
+#     analizar_pregunta devuelve exactamente los campos originales
+#   - irrecuperables: falta o sobra información; la propiedad es que falla con el motivo esperado
+# Además, textos aleatorios y salidas truncadas (fuzz) no deben lanzar excepciones, y lo que se
+# acepte debe ser una pregunta válida. Se compara la tasa de regeneración (salidas descartadas,
+# cada una es otra llamada al modelo) del parser anterior con la del actual; en las irrecuperables,
+# un 0 % "antes" significa que el parser anterior aceptaba una pregunta rota.
+# Sale con código 1 si alguna propiedad no se cumple.
+
+ENUNCIADOS = (
+    "¿Qué máscara de subred corresponde a un prefijo /24?",
+    "¿Cuál es la función principal del protocolo ARP en una red Ethernet?",
+    "Un host tiene la dirección 192.168.10.77/26.\n¿Cuál es su dirección de red?",
+    "¿Qué capa del modelo OSI se encarga del enrutamiento entre redes?",
+    "¿Qué puerto usa por defecto el protocolo HTTPS?",
+    "En una red con STP, ¿qué puente se elige como raíz?",
+    "¿Cuántos hosts utilizables tiene una subred /28?",
+    "¿Qué tipo de registro DNS asocia un nombre con una dirección IPv6?",
+)
+
+OPCIONES = (
+    "255.255.255.0", "255.255.0.0", "255.255.255.128", "255.0.0.0", "Resolver direcciones IP a MAC",
+    "Asignar direcciones IP dinámicamente", "Traducir nombres de dominio", "Capa de red", "Capa de enlace de datos",
+    "Capa de transporte", "Capa de sesión", "443", "8080", "22", "El de menor identificador de puente",
+    "El de mayor dirección MAC", "14", "16", "30", "Registro AAAA", "Registro MX", "Registro CNAME",
+    "192.168.10.64", "192.168.10.0", "192.168.10.128",
+)
+
+EXPLICACIONES = (
+    "Un prefijo /24 deja 24 bits para la red, es decir, 255.255.255.0.",
+    "ARP obtiene la dirección MAC asociada a una IP dentro del mismo segmento.",
+    "El enrutamiento entre redes es responsabilidad de la capa 3 (red).",
+    "Con 4 bits de host hay 16 direcciones, menos la de red y la de broadcast quedan 14.",
+)
+
+
+def pregunta_aleatoria(rng):
+    opciones = rng.sample(OPCIONES, 4)
+    return {
+        "enunciado": rng.choice(ENUNCIADOS),
+        "opciones": opciones,
+        "indice": rng.randrange(4),
+        "explicacion": rng.choice(EXPLICACIONES),
+    }
+
+
+def formatear(p, etiqueta_pregunta="Pregunta: ", letra="{}) ", respuesta=None, etiqueta_respuesta="Respuesta Correcta: ",
+              etiqueta_explicacion="Explicación: ", explicacion=None):
+    letra_correcta = chr(65 + p["indice"])
+    lineas = [etiqueta_pregunta + p["enunciado"]]
+    lineas += [letra.format(chr(65 + i)) + o for i, o in enumerate(p["opciones"])]
+    lineas.append(etiqueta_respuesta + (letra_correcta if respuesta is None else respuesta))
+    lineas.append(etiqueta_explicacion + (p["explicacion"] if explicacion is None else explicacion))
+    return "\n".join(lineas)
+
+
+# --- Mutaciones recuperables: (texto, campos esperados) ---
+
+def _sin_linea(texto, prefijo):
+    return "\n".join(l for l in texto.splitlines() if not l.startswith(prefijo))
+
+
+RECUPERABLES = {
+    "canonica": lambda p, rng: formatear(p),
+    "negritas": lambda p, rng: formatear(p, "**Pregunta:** ", "**{})** ", etiqueta_respuesta="**Respuesta Correcta:** ",
+                                         etiqueta_explicacion="**Explicación:** "),
+    "encabezado_markdown": lambda p, rng: formatear(p, "### Pregunta 1:\n", "- {}) "),
+    "opciones_con_punto": lambda p, rng: formatear(p, letra="{}. "),
+    "opciones_minuscula": lambda p, rng: re.sub(r"^([A-D])\)", lambda m: m.group(1).lower() + ")", formatear(p), flags=re.M),
+    "opciones_parentesis": lambda p, rng: formatear(p, letra="({}) "),
+    "respuesta_minuscula": lambda p, rng: formatear(p, respuesta=chr(97 + p["indice"])),
+    "respuesta_con_texto": lambda p, rng: formatear(p, respuesta=f"{chr(65 + p['indice'])}) {p['opciones'][p['indice']]}"),
+    "respuesta_solo_texto": lambda p, rng: formatear(p, respuesta=p["opciones"][p["indice"]]),
+    "respuesta_en_frase": lambda p, rng: formatear(p, respuesta=f"La correcta es la opción {chr(65 + p['indice'])}"),
+    "etiqueta_respuesta": lambda p, rng: formatear(p, etiqueta_respuesta="Respuesta: "),
+    "texto_alrededor": lambda p, rng: "¡Claro! Aquí tienes una pregunta nueva:\n\n```\n" + formatear(p) + "\n```",
+    "separadores": lambda p, rng: formatear(p).replace("\nRespuesta", "\n---\nRespuesta"),
+    "lineas_en_blanco": lambda p, rng: formatear(p).replace("\n", "\n\n"),
+    "explicacion_multilinea": lambda p, rng: formatear(p, explicacion=p["explicacion"].replace(", ", ",\n", 1)),
+    "sin_etiqueta_pregunta": lambda p, rng: "Aquí está la pregunta.\n\n" + formatear(p, etiqueta_pregunta=""),
+    "pregunta_numerada": lambda p, rng: formatear(p, etiqueta_pregunta="1. "),
+    "respuesta_repetida_en_explicacion": lambda p, rng: (
+        formatear(p) + f"\nRespuesta: {p['opciones'][(p['indice'] + 1) % 4]} es un distractor."),
+    "opcion_marcada": lambda p, rng: _sin_linea(formatear(p), "Respuesta Correcta").replace(
+        f"\n{chr(65 + p['indice'])}) {p['opciones'][p['indice']]}\n",
+        f"\n{chr(65 + p['indice'])}) {p['opciones'][p['indice']]} ✅\n", 1),
+    "sin_explicacion": lambda p, rng: _sin_linea(formatear(p), "Explicación"),
+    "json": lambda p, rng: json.dumps({"pregunta": p["enunciado"], "opciones": p["opciones"],
+                                       "indice_correcto": p["indice"], "explicacion": p["explicacion"]}, ensure_ascii=False),
+}
+
+# --- Mutaciones irrecuperables: (texto, motivo esperado) ---
+
+IRRECUPERABLES = {
+    "vacia": (lambda p, rng: "   \n", "vacio"),
+    "sin_enunciado": (lambda p, rng: formatear(p, etiqueta_pregunta="Pregunta:").replace(p["enunciado"], "", 1),
+                      "sin_pregunta"),
+    "falta_opcion": (lambda p, rng: "\n".join(l for l in formatear(p).splitlines() if not l.startswith("D)")),
+                     "faltan_opciones"),
+    "opcion_de_mas": (lambda p, rng: formatear(p).replace("\nRespuesta", "\nE) Ninguna de las anteriores\nRespuesta"),
+                      "opciones_de_mas"),
+    "opciones_repetidas": (lambda p, rng: formatear(p).replace(
+        f"B) {p['opciones'][1]}", f"B) {p['opciones'][0]}"), "opciones_repetidas"),
+    "sin_respuesta": (lambda p, rng: _sin_linea(formatear(p), "Respuesta Correcta"), "sin_respuesta_correcta"),
+    "respuesta_contradictoria": (lambda p, rng: formatear(
+        p, respuesta=f"{chr(65 + p['indice'])}) {p['opciones'][(p['indice'] + 1) % 4]}"), "respuesta_ambigua"),
+    # "es a" no es la letra A: la respuesta en prosa sin letra ni texto de opción no se adivina
+    "respuesta_en_prosa": (lambda p, rng: formatear(
+        p, respuesta="La que es a su vez responsable del enrutamiento IP"), "sin_respuesta_correcta"),
+}
+
+
+def esperado(p, mutacion):
+    explicacion = p["explicacion"]
+    if mutacion == "sin_explicacion":
+        explicacion = f"La respuesta correcta es: {p['opciones'][p['indice']]}."
+    elif mutacion == "respuesta_repetida_en_explicacion":
+        explicacion += f" Respuesta: {p['opciones'][(p['indice'] + 1) % 4]} es un distractor."
+    return (" ".join(p["enunciado"].split()), tuple(p["opciones"]), p["indice"], explicacion)
+
+
+def obtenido(r):
+    return (" ".join(r.enunciado.split()), r.opciones, r.indice_correcto, r.explicacion)
+
+
+def pregunta_valida(q):
+    """Propiedad mínima de cualquier Question aceptada."""
+    textos = [o[3:] for o in q.options]
+    return (q.question and len(q.options) == 4 and all(textos) and len(set(textos)) == 4
+            and q.correct_answer_char in "ABCD" and q.explanation)
+
+
+# --- Parser anterior (copia de parse_multiple_choice_question antes del autómata) ---
+
+def parse_anterior(raw_data):
+    question_text, options_raw, correct_answer_char, explanation = "", [], "", ""
+    line_type = None
+    for line in raw_data.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("Pregunta:"):
+            question_text = line.replace("Pregunta:", "").strip()
+            line_type = "question"
+        elif re.match(r"^[A-D]\)", line):
+            options_raw.append(line)
+            line_type = "option"
+        elif line.startswith("Respuesta Correcta:"):
+            m = re.search(r"Respuesta Correcta:\s*([A-D])", line)
+            if m:
+                correct_answer_char = m.group(1).strip()
+            line_type = "correct_answer"
+        elif line.startswith("Explicación:"):
+            explanation = line.replace("Explicación:", "").strip()
+            line_type = "explanation"
+        elif line_type == "explanation":
+            explanation += " " + line
+    if not (question_text and len(options_raw) == 4 and correct_answer_char and explanation):
+        return None
+    if not any(o[0] == correct_answer_char for o in options_raw):
+        return None
+    return question_text
+
+
+# --- Fuzz ---
+
+FRAGMENTOS = ("Pregunta:", "**Pregunta:**", "A)", "B)", "C)", "D)", "E)", "a.", "(b)", "Respuesta Correcta:",
+              "Respuesta:", "Explicación:", "✅", "(correcta)", "```", "---", "{", "}", "\"opciones\": [", "]",
+              "la opción C", "es la B", "/24", "255.255.255.0", "ñandú", "\t", "  ", "#", ">", "-", "*", "__", ":")
+
+
+def texto_aleatorio(rng):
+    lineas = []
+    for _ in range(rng.randrange(0, 12)):
+        lineas.append(" ".join(rng.choice(FRAGMENTOS) for _ in range(rng.randrange(0, 5))))
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide la tasa de regeneración del parser de preguntas y verifica sus propiedades.")
+    parser.add_argument("--casos", type=int, default=300, help="Preguntas por mutación")
+    parser.add_argument("--fuzz", type=int, default=5000, help="Textos aleatorios y salidas truncadas")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.semilla)
+    violaciones = []
+
+    print(f"{'mutación':<44} {'regenera antes':>15} {'regenera ahora':>15}")
+    for mutacion, mutar in RECUPERABLES.items():
+        antes = ahora = 0
+        for _ in range(args.casos):
+            p = pregunta_aleatoria(rng)
+            texto = mutar(p, rng)
+            antes += parse_anterior(texto) is None
+            r = analizar_pregunta(texto)
+            ahora += not r.ok
+            if not r.ok or obtenido(r) != esperado(p, mutacion):
+                violaciones.append((mutacion, texto, r))
+            q = parse_multiple_choice_question(texto)
+            if q is None or not pregunta_valida(q) or \
+                    q.options[ord(q.correct_answer_char) - 65][3:] != p["opciones"][p["indice"]]:
+                violaciones.append((mutacion + " (tutor)", texto, q))
+        print(f"{mutacion:<44} {antes / args.casos:>15.0%} {ahora / args.casos:>15.0%}")
+
+    for mutacion, (mutar, motivo) in IRRECUPERABLES.items():
+        antes = 0
+        for _ in range(args.casos):
+            p = pregunta_aleatoria(rng)
+            texto = mutar(p, rng)
+            antes += parse_anterior(texto) is None
+            r = analizar_pregunta(texto)
+            if r.ok or r.motivo != motivo:
+                violaciones.append((mutacion, texto, r))
+        print(f"{mutacion + ' (' + motivo + ')':<44} {antes / args.casos:>15.0%} {'100%':>15}")
+
+    # Salidas de FakeBackend con un 20 % de líneas esenciales eliminadas, como en los benchmarks de carga
+    backend = FakeBackend(tasa_malformada=0.2, semilla=args.semilla)
+    textos = [backend.generate(_prompt_pregunta_multiple_choice(f"Tema {i}", "Intermedio"), contexto=FORMATO_PREGUNTA_MC).text
+              for i in range(args.casos * 5)]
+    antes = sum(parse_anterior(t) is None for t in textos) / len(textos)
+    ahora = sum(not analizar_pregunta(t).ok for t in textos) / len(textos)
+    print(f"{'FakeBackend (20 % malformadas)':<44} {antes:>15.1%} {ahora:>15.1%}")
+
+    fuzz = [texto_aleatorio(rng) for _ in range(args.fuzz)]
+    for _ in range(args.fuzz):
+        texto = formatear(pregunta_aleatoria(rng))
+        fuzz.append(texto[:rng.randrange(len(texto))])
+    for texto in fuzz:
+        try:
+            r = analizar_pregunta(texto)
+            q = parse_multiple_choice_question(texto)
+        except Exception as e:
+            violaciones.append(("fuzz", texto, repr(e)))
+            continue
+        if (r.ok and len(r.opciones) != 4) or (not r.ok and r.motivo not in MOTIVOS) or (q is not None and not pregunta_valida(q)):
+            violaciones.append(("fuzz", texto, r))
+
+    corpus = [formatear(pregunta_aleatoria(rng)) for _ in range(2000)]
+    for nombre, parse in (("anterior", parse_anterior), ("actual", analizar_pregunta)):
+        inicio = time.perf_counter()
+        for texto in corpus:
+            parse(texto)
+        print(f"parser {nombre:<9} {(time.perf_counter() - inicio) / len(corpus) * 1e6:>8.1f} µs/pregunta")
+
+    print(f"\n{len(fuzz)} textos de fuzz, {len(violaciones)} violaciones de propiedades")
+    for mutacion, texto, resultado in violaciones[:5]:
+        print(f"\n[{mutacion}] {resultado!r}\n{texto}")
+    return 1 if violaciones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
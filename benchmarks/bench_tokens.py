@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+
+# Permite ejecutar el script desde cualquier carpeta: los módulos de la app están un nivel arriba
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backends
+from backends import FakeBackend
+from metricas import registro
+from tutor import (
+    generar_ejercicio, evaluar_respuesta_y_dar_feedback, generar_pregunta_multiple_choice,
+    generar_preguntas_lote,
+)
+
+# --- Tokens de entrada por llamada, con y sin caché de contexto ---
+# Uso:
+#   python benchmarks/bench_tokens.py [--llamadas 20] [--intentos 4] [--min-tokens N]
+#
+# Ejecuta una carga típica (ejercicios, varios intentos de evaluación sobre el mismo ejercicio,
+# preguntas sueltas y lotes) contra FakeBackend, que reporta `usage_metadata` con el mismo
+# contrato que Gemini, y compara los tokens de entrada por función:
+#   - sin caché: el contexto (formato de salida, ejercicio en curso) se envía en cada llamada
+#   - con caché: el contexto se sirve desde la caché del modelo; "facturables" descuenta el
+#     75 % de los tokens cacheados, como la tarifa de Gemini para contenido en caché
+# --min-tokens simula el tamaño mínimo que la API acepta cachear; por defecto, el de producción
+# (backends.MIN_TOKENS_CONTEXTO). Con ese umbral los contextos actuales no se cachean y no hay
+# ahorro: la columna "sin umbral" muestra el ahorro posible si se cacheara cualquier contexto.
+
+DESCUENTO_CACHE = 0.75
+
+FUNCIONES = ("generar_ejercicio", "evaluar_respuesta_y_dar_feedback", "generar_pregunta_multiple_choice",
+             "generar_preguntas_lote")
+
+EJERCICIO = ("Una empresa tiene la red 172.20.0.0/22 y necesita cuatro subredes para 300, 120, 60 y 10 hosts. "
+             "Diseña el plan de direccionamiento con VLSM indicando red, máscara, rango de hosts y broadcast "
+             "de cada subred, y justifica el orden en que asignas los bloques.")
+
+
+def carga(llamadas, intentos):
+    for i in range(llamadas):
+        generar_ejercicio(f"Tema {i}", "Intermedio")
+        generar_pregunta_multiple_choice(f"Sub-tema {i}", "Intermedio")
+        generar_preguntas_lote([f"Sub-tema {i}.{j}" for j in range(5)], "Intermedio")
+        # Un estudiante corrige su respuesta varias veces sobre el mismo ejercicio
+        for intento in range(intentos):
+            evaluar_respuesta_y_dar_feedback(f"{EJERCICIO} (variante {i})", f"Intento {intento + 1}: asigno primero la subred de 300 hosts...")
+
+
+def medir(min_tokens, llamadas, intentos):
+    """Retorna {funcion: (llamadas, tokens_entrada, tokens_cache)} para la carga."""
+    registro.reiniciar()
+    backends.usar_backend(FakeBackend(latencia=0.0, semilla=0, min_tokens_contexto=min_tokens))
+    carga(llamadas, intentos)
+    return {
+        funcion: (
+            registro.contador("modelo_llamadas_total", funcion=funcion, resultado="ok"),
+            registro.contador("modelo_tokens_total", funcion=funcion, tipo="entrada"),
+            registro.contador("modelo_tokens_total", funcion=funcion, tipo="entrada_cache"),
+        )
+        for funcion in FUNCIONES
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara los tokens de entrada por llamada con y sin caché de contexto.")
+    parser.add_argument("--llamadas", type=int, default=20, help="Repeticiones de la carga")
+    parser.add_argument("--intentos", type=int, default=4, help="Evaluaciones por ejercicio")
+    parser.add_argument("--min-tokens", type=int, default=backends.MIN_TOKENS_CONTEXTO,
+                        help="Tamaño mínimo de contexto cacheable, en tokens (por defecto, el de producción)")
+    args = parser.parse_args(argv)
+
+    sin_cache = medir(float("inf"), args.llamadas, args.intentos)
+    con_cache = medir(args.min_tokens, args.llamadas, args.intentos)
+    sin_umbral = medir(0, args.llamadas, args.intentos)
+
+    def facturables(medicion):
+        _, entrada, cacheados = medicion
+        return entrada - DESCUENTO_CACHE * cacheados
+
+    print(f"umbral de caché: {args.min_tokens} tokens")
+    print(f"{'función':<36} {'entrada/llamada':>16} {'cacheados':>10} {'facturables':>12} {'ahorro':>8} {'sin umbral':>11}")
+    for funcion in FUNCIONES:
+        llamadas, entrada, _ = sin_cache[funcion]
+        cacheados = con_cache[funcion][2]
+        ahorro = 1 - facturables(con_cache[funcion]) / entrada if entrada else 0.0
+        ahorro_sin_umbral = 1 - facturables(sin_umbral[funcion]) / entrada if entrada else 0.0
+        print(f"{funcion:<36} {entrada / llamadas:>16.1f} {cacheados / llamadas:>10.1f} "
+              f"{facturables(con_cache[funcion]) / llamadas:>12.1f} {ahorro:>7.0%} {ahorro_sin_umbral:>10.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# --- Presupuesto de tiempo de importación de la app ---
+# Uso:
+#   python benchmarks/presupuesto_imports.py [--presupuesto-ms 150] [--repeticiones 5]
+#
+# Importa los módulos de la app en un intérprete nuevo con `python -X importtime` y
+# suma el tiempo acumulado de cada uno. Termina con código 1 si la mediana supera el
+# presupuesto o si al importar se cargó alguna dependencia pesada que solo debe
+# importarse al usarse (ReportLab, el SDK de Gemini, el servidor HTTP de métricas).
+# Streamlit queda fuera de la medición: app.py no se puede importar sin ejecutarlo.
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODULOS_APP = (
+    "adaptativo", "analitica", "backends", "banco_preguntas", "cache_respuestas", "catalogo", "coalescencia",
+    "duplicados", "generacion", "metricas", "modelos", "parseo_preguntas", "reporte_pdf", "resiliencia",
+    "subredes", "tutor",
+)
+
+PROHIBIDOS = ("reportlab", "google.generativeai", "pytz", "http.server")
+
+_LINEA_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir_una_vez(modulos=MODULOS_APP):
+    """
+    Importa `modulos` en un proceso nuevo.
+    Retorna (milisegundos, {modulo: milisegundos}, prohibidos_cargados).
+    """
+    codigo = (
+        f"import sys\nimport {', '.join(modulos)}\n"
+        f"print(','.join(m for m in {PROHIBIDOS!r} if m in sys.modules))"
+    )
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                             capture_output=True, text=True, cwd=RAIZ, check=True)
+    por_modulo = {}
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA_IMPORTTIME.match(linea)
+        # Solo cuentan las importaciones de primer nivel: el acumulado ya incluye sus dependencias
+        if coincidencia and coincidencia.group(3) == " " and coincidencia.group(4) in modulos:
+            por_modulo[coincidencia.group(4)] = int(coincidencia.group(2)) / 1000
+    prohibidos = [m for m in proceso.stdout.strip().split(",") if m]
+    return sum(por_modulo.values()), por_modulo, prohibidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica el presupuesto de tiempo de importación de la app.")
+    parser.add_argument("--presupuesto-ms", type=float, default=150.0, help="Mediana máxima tolerada en milisegundos")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    totales = []
+    prohibidos = set()
+    ultimo = {}
+    for _ in range(args.repeticiones):
+        total, ultimo, cargados = medir_una_vez()
+        totales.append(total)
+        prohibidos.update(cargados)
+
+    for modulo, ms in sorted(ultimo.items(), key=lambda par: -par[1]):
+        print(f"{modulo:<20} {ms:8.1f} ms")
+    mediana = statistics.median(totales)
+    print(f"{'total (mediana)':<20} {mediana:8.1f} ms   presupuesto {args.presupuesto_ms:.0f} ms")
+
+    fallo = False
+    if prohibidos:
+        print(f"ERROR: la importación cargó {', '.join(sorted(prohibidos))}", file=sys.stderr)
+        fallo = True
+    if mediana > args.presupuesto_ms:
+        print(f"ERROR: la importación tarda {mediana:.1f} ms (> {args.presupuesto_ms:.0f} ms)", file=sys.stderr)
+        fallo = True
+    return 1 if fallo else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+# --- Caché de respuestas del modelo compartida por todas las sesiones ---
+# Guarda en memoria (LRU con expiración por TTL) las respuestas de prompts que se
+# repiten, como las explicaciones de los temas principales. Opcionalmente las
+# persiste en SQLite para que sobrevivan a un reinicio de Streamlit.
+
+
+def clave_cache(modelo, prompt, *partes):
+    """Construye la clave (modelo, hash del prompt, partes adicionales) como un único string."""
+    hash_prompt = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return "|".join([modelo, hash_prompt, *map(str, partes)])
+
+
+class CacheRespuestas:
+    """
+    Caché LRU con TTL, segura entre hilos, con persistencia opcional en disco.
+    `max_entradas` limita solo la memoria; en disco las entradas expiran por TTL.
+    """
+
+    def __init__(self, max_entradas=256, ttl=24 * 3600, ruta=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.ruta = ruta
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()  # clave -> (creado, valor)
+        self._lock = threading.Lock()
+        if ruta:
+            with self._conectar() as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, creado REAL NOT NULL)"
+                )
+
+    def _conectar(self):
+        # closing(): `with conn` solo confirma la transacción, no cierra la conexión
+        return closing(sqlite3.connect(self.ruta, timeout=30))
+
+    def _vigente(self, creado):
+        return self.ttl is None or time.time() - creado < self.ttl
+
+    def _leer_disco(self, clave):
+        with self._conectar() as conn:
+            fila = conn.execute("SELECT valor, creado FROM cache WHERE clave = ?", (clave,)).fetchone()
+        if fila and self._vigente(fila[1]):
+            return fila[1], fila[0]
+        return None
+
+    def _guardar_memoria(self, clave, creado, valor):
+        self._datos[clave] = (creado, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+
+    def obtener(self, clave):
+        """Retorna el valor guardado o None si no existe o expiró. Actualiza los contadores."""
+        # El lock solo protege la LRU en memoria y los contadores: SQLite se consulta fuera
+        # de él, para que un disco lento no serialice todas las búsquedas del proceso
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada and not self._vigente(entrada[0]):
+                del self._datos[clave]
+                entrada = None
+            if entrada:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return entrada[1]
+            if not self.ruta:
+                self.misses += 1
+                return None
+        entrada = self._leer_disco(clave)
+        with self._lock:
+            if entrada:
+                # Si una escritura concurrente dejó un valor más nuevo en memoria, gana ese
+                entrada = self._datos.get(clave) or entrada
+                self._guardar_memoria(clave, *entrada)
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+            return None
+
+    def guardar(self, clave, valor):
+        creado = time.time()
+        with self._lock:
+            self._guardar_memoria(clave, creado, valor)
+        if self.ruta:
+            with self._conectar() as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO cache (clave, valor, creado) VALUES (?, ?, ?)",
+                             (clave, valor, creado))
+                if self.ttl is not None:
+                    conn.execute("DELETE FROM cache WHERE creado < ?", (creado - self.ttl,))
+
+    def obtener_o_calcular(self, clave, calcular, regenerar=False):
+        """
+        Retorna el valor de la caché o lo calcula con `calcular()` y lo guarda.
+        Con `regenerar=True` se ignora el valor guardado y se reemplaza por uno nuevo.
+        """
+        if not regenerar:
+            valor = self.obtener(clave)
+            if valor is not None:
+                return valor
+        valor = calcular()
+        self.guardar(clave, valor)
+        return valor
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+        if self.ruta:
+            with self._conectar() as conn, conn:
+                conn.execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "tasa_aciertos": self.hits / total if total else 0.0,
+                "entradas_memoria": len(self._datos),
+            }
+
+
+_cache_explicaciones = None
+_cache_lock = threading.Lock()
+
+
+def cache_explicaciones():
+    """
+    Retorna la caché de explicaciones compartida por el proceso.
+    Se ajusta con CACHE_EXPLICACIONES_DB (ruta SQLite, vacío para solo memoria),
+    CACHE_EXPLICACIONES_TTL (segundos) y CACHE_EXPLICACIONES_MAX (entradas en memoria).
+    """
+    global _cache_explicaciones
+    with _cache_lock:
+        if _cache_explicaciones is None:
+            _cache_explicaciones = CacheRespuestas(
+                max_entradas=int(os.environ.get("CACHE_EXPLICACIONES_MAX", "256")),
+                ttl=float(os.environ.get("CACHE_EXPLICACIONES_TTL", str(7 * 24 * 3600))),
+                ruta=os.environ.get("CACHE_EXPLICACIONES_DB", "cache_respuestas.sqlite3") or None,
+            )
+        return _cache_explicaciones
@@ -0,0 +1,178 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from generacion import limitador_global
+from resiliencia import CircuitoAbiertoError, es_reintentable, espera_backoff, segundos_retry_after
+from trabajos import enviar_acotado
+from tutor import evaluar_respuesta_y_dar_feedback
+
+# --- Calificación masiva y reanudable de respuestas a ejercicios ---
+# Uso:
+#   python calificar_tareas.py respuestas.jsonl retroalimentacion.jsonl [--hilos 4] [--reintentos 6] [--errores errores.json]
+#
+# La entrada es JSONL o CSV (según la extensión, o --formato) con las columnas "ejercicio" y
+# "respuesta", y opcionalmente "id" y "user_name". Cada respuesta calificada se agrega como
+# una línea a la salida en cuanto termina (en orden de llegada, no de entrada), con las
+# columnas de la entrada más "id" y "retroalimentacion".
+# La salida es también el checkpoint: al volver a ejecutar el comando se saltan los "id" que
+# ya están en ella, así que una caída o un error de cuota no obliga a empezar de nuevo.
+# Las filas sin "id" se identifican por su número de línea, de modo que para reanudar la
+# entrada no debe reordenarse.
+# La entrada se lee en streaming y solo hay unas pocas respuestas en vuelo a la vez; todas las
+# llamadas pasan por el limitador de cuota compartido (GEMINI_RPM / GEMINI_BURST).
+
+
+def _filas_jsonl(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            if linea.strip():
+                try:
+                    yield numero, json.loads(linea)
+                except ValueError as e:
+                    yield numero, e
+
+
+def _filas_csv(ruta):
+    with open(ruta, encoding="utf-8", newline="") as f:
+        # La fila 1 es el encabezado
+        for numero, fila in enumerate(csv.DictReader(f), start=2):
+            yield numero, fila
+
+
+def leer_entradas(ruta, formato=None):
+    """Generador de (id, fila) con las filas de la entrada; `fila` es un dict o el error de lectura."""
+    formato = formato or ("csv" if ruta.lower().endswith(".csv") else "jsonl")
+    filas = _filas_csv(ruta) if formato == "csv" else _filas_jsonl(ruta)
+    for numero, fila in filas:
+        clave = fila.get("id") if isinstance(fila, dict) else None
+        yield (str(clave) if clave not in (None, "") else f"linea-{numero}"), fila
+
+
+def ids_completados(ruta_salida):
+    """
+    Retorna los "id" ya calificados en `ruta_salida`. Si la última línea quedó a medias
+    (el proceso murió mientras la escribía) se recorta para poder seguir agregando.
+    """
+    completados = set()
+    if not os.path.exists(ruta_salida):
+        return completados
+    with open(ruta_salida, "rb+") as f:
+        fin_valido = 0
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break
+            try:
+                completados.add(json.loads(linea)["id"])
+            except (ValueError, KeyError, TypeError):
+                pass
+            fin_valido += len(linea)
+        f.truncate(fin_valido)
+    return completados
+
+
+def calificar_fila(fila, max_reintentos=6, limiter=None):
+    """
+    Califica una fila. Los errores de cuota o de sobrecarga que sobreviven a los reintentos
+    del backend se esperan aquí con backoff (o el retry-after de la API) antes de reintentar.
+    """
+    if isinstance(fila, Exception):
+        raise ValueError(f"Línea inválida: {fila}")
+    if not all(isinstance(fila.get(c), str) and fila[c].strip() for c in ("ejercicio", "respuesta")):
+        raise ValueError("Faltan 'ejercicio' o 'respuesta'")
+    limiter = limiter or limitador_global()
+    for intento in range(max_reintentos + 1):
+        limiter.acquire()
+        try:
+            return evaluar_respuesta_y_dar_feedback(fila["ejercicio"], fila["respuesta"])
+        except Exception as e:
+            if intento == max_reintentos or not (isinstance(e, CircuitoAbiertoError) or es_reintentable(e)):
+                raise
+            espera = segundos_retry_after(e)
+            time.sleep(espera if espera is not None else espera_backoff(intento, base=2.0, maximo=60.0))
+
+
+def calificar_tareas(ruta_entrada, ruta_salida, hilos=4, max_reintentos=6, formato=None, en_progreso=None):
+    """
+    Califica las respuestas de `ruta_entrada` que todavía no están en `ruta_salida`.
+    `en_progreso(hechos, total, saltados, inicio)` se llama cada vez que termina una respuesta.
+    Retorna la lista de fallos como diccionarios {"id": ..., "error": "..."}; las respuestas
+    fallidas no se escriben en la salida y se vuelven a intentar en la próxima ejecución.
+    """
+    completados = ids_completados(ruta_salida)
+    total = sum(1 for _ in leer_entradas(ruta_entrada, formato))
+    saltados = 0
+    hechos = 0
+    fallos = []
+    inicio = time.monotonic()
+    # Se limita la cantidad de respuestas en vuelo para no leer toda la entrada en memoria
+    max_en_vuelo = hilos * 2
+
+    def trabajos():
+        nonlocal saltados
+        for clave, fila in leer_entradas(ruta_entrada, formato):
+            if clave in completados:
+                saltados += 1
+                continue
+            yield (clave, fila if isinstance(fila, dict) else {}), (fila, max_reintentos)
+
+    with open(ruta_salida, "a", encoding="utf-8") as salida, ThreadPoolExecutor(max_workers=hilos) as pool:
+        for (clave, fila), futuro in enviar_acotado(pool, calificar_fila, trabajos(), max_en_vuelo):
+            try:
+                retroalimentacion = futuro.result()
+                salida.write(json.dumps(dict(fila, id=clave, retroalimentacion=retroalimentacion), ensure_ascii=False) + "\n")
+                salida.flush()
+            except Exception as e:
+                fallos.append({"id": clave, "error": f"{type(e).__name__}: {e}"})
+            hechos += 1
+            if en_progreso:
+                en_progreso(hechos, total, saltados, inicio)
+
+    return fallos
+
+
+def _duracion(segundos):
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}h{minutos:02d}m" if horas else f"{minutos}m{segundos:02d}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Califica con el tutor un archivo de respuestas a ejercicios, reanudando si se interrumpe.")
+    parser.add_argument("entrada", help="Archivo JSONL o CSV con columnas 'ejercicio' y 'respuesta' (y opcionalmente 'id', 'user_name')")
+    parser.add_argument("salida", help="Archivo JSONL donde se agrega la retroalimentación (y checkpoint para reanudar)")
+    parser.add_argument("--hilos", type=int, default=4, help="Respuestas calificadas en paralelo")
+    parser.add_argument("--reintentos", type=int, default=6, help="Reintentos por respuesta ante errores de cuota o sobrecarga")
+    parser.add_argument("--formato", choices=("jsonl", "csv"), default=None, help="Por defecto se deduce de la extensión")
+    parser.add_argument("--errores", default=None, help="Ruta opcional donde guardar la lista de fallos en JSON")
+    args = parser.parse_args(argv)
+
+    def en_progreso(hechos, total, saltados, inicio):
+        transcurrido = time.monotonic() - inicio
+        ritmo = hechos / transcurrido if transcurrido > 0 else 0.0
+        restantes = total - saltados - hechos
+        eta = _duracion(restantes / ritmo) if ritmo > 0 else "?"
+        print(f"\r[{saltados + hechos}/{total}] {ritmo * 60:.1f} respuestas/min, ETA {eta}   ",
+              end="", file=sys.stderr, flush=True)
+
+    inicio = time.monotonic()
+    fallos = calificar_tareas(args.entrada, args.salida, hilos=args.hilos, max_reintentos=args.reintentos,
+                              formato=args.formato, en_progreso=en_progreso)
+    print(file=sys.stderr)
+    print(f"Listo en {_duracion(time.monotonic() - inicio)}. Fallos: {len(fallos)}", file=sys.stderr)
+    for fallo in fallos:
+        print(f"  {fallo['id']}: {fallo['error']}", file=sys.stderr)
+    if fallos:
+        print("Vuelve a ejecutar el mismo comando para reintentar solo las respuestas fallidas.", file=sys.stderr)
+    if args.errores:
+        with open(args.errores, "w", encoding="utf-8") as f:
+            json.dump(fallos, f, ensure_ascii=False, indent=2)
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
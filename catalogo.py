@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from metricas import incrementar
+
+# --- Catálogo de contenidos: temas, sub-temas, recursos y pesos por nivel ---
+# El currículo vive en un archivo JSON (CATALOGO_ARCHIVO, por defecto catalogo.json) con:
+#   "version":          identificador libre de la versión del contenido
+#   "niveles":          lista de niveles del estudiante
+#   "temas":            [{"nombre", "sub_temas": [...], "recursos": [{"tipo", "titulo", "url"}]}]
+#   "pesos_por_nivel":  {sub_tema: {nivel: peso}}; los sub-temas sin entrada pesan 1 en todos
+#                       los niveles y un peso 0 excluye el sub-tema de los exámenes de ese nivel
+# El archivo se compila una vez en estructuras inmutables e indexadas, de modo que cada
+# rerun de Streamlit solo hace búsquedas en diccionarios. catalogo_actual() detecta los
+# cambios del archivo y lo vuelve a compilar sin reiniciar el proceso.
+
+RUTA_CATALOGO_POR_DEFECTO = os.environ.get(
+    "CATALOGO_ARCHIVO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogo.json")
+)
+# Segundos mínimos entre dos revisiones del archivo (un os.stat por intervalo, no por rerun)
+INTERVALO_REVISION = float(os.environ.get("CATALOGO_REVISION", "2"))
+
+logger = logging.getLogger("tutor.catalogo")
+
+_VACIO = MappingProxyType({})
+
+
+class CatalogoInvalidoError(ValueError):
+    """El archivo del catálogo no tiene el formato esperado."""
+
+
+class Catalogo:
+    """
+    Catálogo compilado. Todas las colecciones son tuplas o MappingProxyType.
+    - `temas`: nombres de los temas principales, en el orden del archivo.
+    - `niveles`: niveles del estudiante.
+    - `todos_los_sub_temas`: sub-temas de todos los temas, sin repetir.
+    - `huella`: sha256 del contenido del archivo, para distinguir recargas.
+    """
+
+    __slots__ = ("version", "huella", "niveles", "temas", "todos_los_sub_temas",
+                 "_sub_temas", "_recursos", "_pesos", "_sub_temas_por_nivel")
+
+    def __init__(self, version, huella, niveles, temas, sub_temas, recursos, pesos):
+        self.version = version
+        self.huella = huella
+        self.niveles = niveles
+        self.temas = temas
+        self._sub_temas = sub_temas
+        self._recursos = recursos
+        self._pesos = pesos
+        self.todos_los_sub_temas = tuple(dict.fromkeys(t for lista in sub_temas.values() for t in lista))
+        # Índice (tema, nivel) -> {sub_tema: peso} solo con los sub-temas de peso positivo
+        self._sub_temas_por_nivel = MappingProxyType({
+            (tema, nivel): MappingProxyType({t: self.peso(t, nivel) for t in sub_temas[tema] if self.peso(t, nivel) > 0})
+            for tema in temas for nivel in niveles
+        })
+
+    def sub_temas_de(self, tema):
+        return self._sub_temas.get(tema, ())
+
+    def recursos_de(self, tema):
+        return self._recursos.get(tema, ())
+
+    def pesos_de(self, sub_tema):
+        """Retorna {nivel: peso} del sub-tema."""
+        return self._pesos.get(sub_tema, _VACIO)
+
+    def peso(self, sub_tema, nivel):
+        return self._pesos.get(sub_tema, _VACIO).get(nivel, 1)
+
+    def sub_temas_para(self, tema, nivel):
+        """Retorna {sub_tema: peso} de los sub-temas del tema que entran en un examen del nivel dado."""
+        return self._sub_temas_por_nivel.get((tema, nivel), _VACIO)
+
+    def grupos_con_peso(self):
+        """Retorna los pares (sub_tema, nivel) con peso positivo: los únicos que pueden salir en un examen."""
+        return tuple((t, nivel) for nivel in self.niveles for t in self.todos_los_sub_temas if self.peso(t, nivel) > 0)
+
+
+def _lista_de_textos(valor, descripcion):
+    if not (isinstance(valor, list) and valor and all(isinstance(v, str) and v.strip() for v in valor)):
+        raise CatalogoInvalidoError(f"{descripcion} debe ser una lista no vacía de textos")
+    return tuple(v.strip() for v in valor)
+
+
+def compilar_catalogo(datos, huella=""):
+    """Valida el contenido ya decodificado del archivo y lo compila en un Catalogo."""
+    if not isinstance(datos, dict):
+        raise CatalogoInvalidoError("El catálogo debe ser un objeto JSON")
+    niveles = _lista_de_textos(datos.get("niveles"), "'niveles'")
+    if not isinstance(datos.get("temas"), list) or not datos["temas"]:
+        raise CatalogoInvalidoError("'temas' debe ser una lista no vacía")
+
+    temas = []
+    sub_temas = {}
+    recursos = {}
+    for entrada in datos["temas"]:
+        nombre = entrada.get("nombre") if isinstance(entrada, dict) else None
+        if not (isinstance(nombre, str) and nombre.strip()):
+            raise CatalogoInvalidoError("Cada tema necesita un 'nombre'")
+        nombre = nombre.strip()
+        if nombre in sub_temas:
+            raise CatalogoInvalidoError(f"Tema repetido: {nombre!r}")
+        temas.append(nombre)
+        sub_temas[nombre] = tuple(dict.fromkeys(_lista_de_textos(entrada.get("sub_temas"), f"'sub_temas' de {nombre!r}")))
+        lista_recursos = []
+        for recurso in entrada.get("recursos", []):
+            if not (isinstance(recurso, dict) and all(isinstance(recurso.get(c), str) for c in ("tipo", "titulo", "url"))):
+                raise CatalogoInvalidoError(f"Recurso inválido en {nombre!r}: {recurso!r}")
+            lista_recursos.append(MappingProxyType({c: recurso[c] for c in ("tipo", "titulo", "url")}))
+        recursos[nombre] = tuple(lista_recursos)
+
+    pesos = {}
+    for sub_tema, por_nivel in (datos.get("pesos_por_nivel") or {}).items():
+        if not isinstance(por_nivel, dict):
+            raise CatalogoInvalidoError(f"Los pesos de {sub_tema!r} deben ser un objeto {{nivel: peso}}")
+        for nivel, peso in por_nivel.items():
+            if nivel not in niveles:
+                raise CatalogoInvalidoError(f"Nivel desconocido {nivel!r} en los pesos de {sub_tema!r}")
+            if not isinstance(peso, (int, float)) or isinstance(peso, bool) or peso < 0:
+                raise CatalogoInvalidoError(f"Peso inválido para {sub_tema!r} en {nivel!r}: {peso!r}")
+        pesos[sub_tema] = MappingProxyType(dict(por_nivel))
+
+    return Catalogo(
+        version=str(datos.get("version", "")),
+        huella=huella,
+        niveles=niveles,
+        temas=tuple(temas),
+        sub_temas=MappingProxyType(sub_temas),
+        recursos=MappingProxyType(recursos),
+        pesos=MappingProxyType(pesos),
+    )
+
+
+def cargar_catalogo(ruta=RUTA_CATALOGO_POR_DEFECTO):
+    """Lee y compila el archivo del catálogo."""
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    try:
+        datos = json.loads(contenido.decode("utf-8"))
+    except ValueError as e:
+        raise CatalogoInvalidoError(f"El catálogo no es JSON válido: {e}") from e
+    return compilar_catalogo(datos, huella=hashlib.sha256(contenido).hexdigest())
+
+
+# --- Catálogo compartido por el proceso, con recarga en caliente ---
+_catalogo = None
+_firma_archivo = None
+_ultima_revision = 0.0
+_catalogo_lock = threading.Lock()
+
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def catalogo_actual(ruta=RUTA_CATALOGO_POR_DEFECTO):
+    """
+    Retorna el catálogo vigente. Como mucho cada INTERVALO_REVISION segundos se revisa
+    si el archivo cambió y, si es así, se vuelve a compilar. Si la nueva versión es
+    inválida se registra el error y se sigue usando la anterior.
+    """
+    global _catalogo, _firma_archivo, _ultima_revision
+    ahora = time.monotonic()
+    if _catalogo is not None and ahora - _ultima_revision < INTERVALO_REVISION:
+        return _catalogo
+    with _catalogo_lock:
+        if _catalogo is not None and ahora - _ultima_revision < INTERVALO_REVISION:
+            return _catalogo
+        _ultima_revision = ahora
+        firma = None
+        try:
+            firma = _firma(ruta)
+            if _catalogo is not None and firma == _firma_archivo:
+                return _catalogo
+            nuevo = cargar_catalogo(ruta)
+        except (OSError, CatalogoInvalidoError) as e:
+            if _catalogo is None:
+                raise
+            # Se recuerda la firma del archivo inválido para no reportarlo en cada revisión
+            _firma_archivo = firma
+            incrementar("catalogo_recargas_total", resultado="error")
+            logger.warning("No se pudo recargar el catálogo %s: %s", ruta, e)
+            return _catalogo
+        if _catalogo is not None:
+            incrementar("catalogo_recargas_total", resultado="ok")
+            logger.info("Catálogo recargado: versión %s (%s sub-temas)", nuevo.version, len(nuevo.todos_los_sub_temas))
+        _catalogo, _firma_archivo = nuevo, firma
+        return _catalogo
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import threading
+
+from metricas import incrementar
+
+# --- Coalescencia de llamadas idénticas en curso ("single flight") ---
+# Al comenzar un laboratorio, toda la clase elige el mismo tema y pide a la vez la misma
+# explicación o el mismo ejercicio: decenas de prompts idénticos que gastan cuota y disparan
+# errores 429. Mientras hay una llamada en curso con cierta clave (modelo, prompt y opciones),
+# las llamadas concurrentes con la misma clave esperan su resultado en lugar de llamar al
+# modelo; si falla, todas reciben el mismo error. No es una caché: cuando la llamada termina
+# la clave se libera, y la siguiente vuelve a llamar al modelo.
+#
+# Las funciones que deben dar una respuesta distinta en cada llamada aunque el prompt se repita
+# (las preguntas de examen se piden en paralelo para el mismo sub-tema) se excluyen con
+# COALESCENCIA_EXCLUIR, una lista de nombres separados por comas; COALESCENCIA=0 desactiva la
+# coalescencia por completo. Las llamadas que esperan se cuentan en modelo_coalescidas_total.
+
+ACTIVA = os.environ.get("COALESCENCIA", "1") != "0"
+EXCLUIDAS = frozenset(
+    nombre.strip()
+    for nombre in os.environ.get("COALESCENCIA_EXCLUIR", "generar_pregunta_multiple_choice,generar_preguntas_lote").split(",")
+    if nombre.strip()
+)
+
+
+def coalescible(funcion):
+    """Indica si las llamadas de `funcion` pueden compartir una llamada idéntica en curso."""
+    return ACTIVA and funcion not in EXCLUIDAS
+
+
+class _Vuelo:
+    """Llamada en curso: su resultado o su error, y el evento que esperan las demás."""
+
+    __slots__ = ("listo", "resultado", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class _VueloStream:
+    """Stream en curso: los fragmentos recibidos hasta ahora, que cada lector recorre desde el inicio."""
+
+    def __init__(self):
+        self.fragmentos = []
+        self.terminado = False
+        self.error = None
+        self.condicion = threading.Condition()
+
+    def agregar(self, fragmento):
+        with self.condicion:
+            self.fragmentos.append(fragmento)
+            self.condicion.notify_all()
+
+    def terminar(self, error=None):
+        with self.condicion:
+            self.terminado = True
+            self.error = error
+            self.condicion.notify_all()
+
+    def leer(self):
+        leidos = 0
+        while True:
+            with self.condicion:
+                while leidos == len(self.fragmentos) and not self.terminado:
+                    self.condicion.wait()
+                nuevos = self.fragmentos[leidos:]
+                terminado, error = self.terminado, self.error
+            leidos += len(nuevos)
+            yield from nuevos
+            if terminado and leidos == len(self.fragmentos):
+                if error is not None:
+                    raise error
+                return
+
+
+class Coalescedor:
+    """
+    Agrupa las llamadas concurrentes con la misma clave en una sola.
+    - `hacer(clave, calcular)`: llamada síncrona; la primera ejecuta `calcular()`.
+    - `hacer_stream(clave, iniciar)`: `iniciar()` retorna un iterador de fragmentos, que se
+      consume en un hilo propio; cada llamada recibe todos los fragmentos desde el primero,
+      aunque llegue con el stream empezado o quien lo inició deje de leerlo.
+    - `hacer_async(clave, calcular)`: `calcular()` retorna una corrutina; se agrupan las
+      llamadas del mismo event loop.
+    `funcion` es la etiqueta de la métrica modelo_coalescidas_total.
+    """
+
+    def __init__(self):
+        self._vuelos = {}
+        self._lock = threading.Lock()
+
+    def _unirse(self, clave, crear, funcion, modo):
+        """Retorna (vuelo, es_nuevo): el vuelo en curso con `clave`, o uno nuevo creado con `crear()`."""
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is None:
+                vuelo = self._vuelos[clave] = crear()
+                return vuelo, True
+        incrementar("modelo_coalescidas_total", funcion=funcion, modo=modo)
+        return vuelo, False
+
+    def _liberar(self, clave, vuelo):
+        with self._lock:
+            if self._vuelos.get(clave) is vuelo:
+                del self._vuelos[clave]
+
+    def en_curso(self):
+        with self._lock:
+            return len(self._vuelos)
+
+    def hacer(self, clave, calcular, funcion=""):
+        vuelo, nuevo = self._unirse(("sync", clave), _Vuelo, funcion, "sync")
+        if not nuevo:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+        try:
+            vuelo.resultado = calcular()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            self._liberar(("sync", clave), vuelo)
+            vuelo.listo.set()
+        return vuelo.resultado
+
+    def _bombear(self, clave, vuelo, iniciar):
+        try:
+            for fragmento in iniciar():
+                vuelo.agregar(fragmento)
+        except BaseException as e:
+            self._liberar(clave, vuelo)
+            vuelo.terminar(e)
+        else:
+            self._liberar(clave, vuelo)
+            vuelo.terminar()
+
+    def hacer_stream(self, clave, iniciar, funcion=""):
+        clave = ("stream", clave)
+        vuelo, nuevo = self._unirse(clave, _VueloStream, funcion, "stream")
+        if nuevo:
+            threading.Thread(target=self._bombear, args=(clave, vuelo, iniciar), daemon=True,
+                             name="coalescencia-stream").start()
+        return vuelo.leer()
+
+    async def hacer_async(self, clave, calcular, funcion=""):
+        # Una tarea solo se puede esperar desde su propio event loop
+        clave = ("async", id(asyncio.get_running_loop()), clave)
+        tarea, nueva = self._unirse(clave, lambda: asyncio.ensure_future(calcular()), funcion, "async")
+        if nueva:
+            def terminar(t):
+                self._liberar(clave, t)
+                if not t.cancelled():
+                    t.exception()  # si todas las llamadas se cancelaron, nadie más lee el error
+
+            tarea.add_done_callback(terminar)
+        # shield: si se cancela una de las llamadas (el cliente se desconecta), la compartida sigue
+        return await asyncio.shield(tarea)
+
+
+coalescedor = Coalescedor()
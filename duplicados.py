@@ -0,0 +1,186 @@
+import itertools
+import re
+import threading
+from array import array
+import unicodedata
+import zlib
+
+# --- Índice de casi-duplicados para preguntas generadas (MinHash + LSH) ---
+# Cada pregunta se normaliza, se parte en "shingles" de palabras y se resume en una firma
+# MinHash. Las firmas se dividen en bandas y cada banda se guarda en una tabla hash (LSH):
+# dos preguntas solo se comparan si coinciden en alguna banda, así que la búsqueda no
+# recorre todo el historial aunque tenga cientos de miles de preguntas.
+
+_PRIMO = (1 << 61) - 1
+_MASCARA = (1 << 32) - 1
+
+
+def _normalizar(texto):
+    """Minúsculas, sin tildes ni signos de puntuación."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"\w+", texto)
+
+
+def shingles(texto, k=3):
+    """Conjunto de hashes de los k-gramas de palabras del texto."""
+    palabras = _normalizar(texto)
+    if len(palabras) < k:
+        palabras = palabras + [""] * (k - len(palabras))
+    return {zlib.crc32(" ".join(palabras[i:i + k]).encode("utf-8")) for i in range(len(palabras) - k + 1)}
+
+
+class IndiceDuplicados:
+    """
+    Índice MinHash/LSH de textos.
+
+    - La firma tiene `bandas` * `filas` valores: más bandas detectan similitudes más bajas.
+    - `umbral`: similitud de Jaccard estimada a partir de la cual dos textos son duplicados.
+    Con los valores por defecto (20 bandas de 4 filas) la probabilidad de que dos textos
+    con similitud 0.6 coincidan en alguna banda es de ~0.93, y con 0.7 es de ~0.99.
+    Las firmas se guardan como array('I') (320 bytes cada una) para que el historial
+    ocupe poca memoria.
+    """
+
+    def __init__(self, bandas=20, filas=4, umbral=0.5, k=3, semilla=1):
+        self.bandas = bandas
+        self.filas = filas
+        self.umbral = umbral
+        self.k = k
+        num = bandas * filas
+        # Funciones hash universales h(x) = (a*x + b) mod p, generadas de forma determinista
+        estado = semilla
+        self._coeficientes = []
+        for _ in range(num):
+            estado = (estado * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (estado >> 3) % (_PRIMO - 1) + 1
+            estado = (estado * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (estado >> 3) % _PRIMO
+            self._coeficientes.append((a, b))
+        self._tablas = [{} for _ in range(bandas)]
+        self._firmas = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._firmas)
+
+    def firma(self, texto):
+        conjunto = shingles(texto, self.k)
+        return array("I", (min(((a * x + b) % _PRIMO) & _MASCARA for x in conjunto) for a, b in self._coeficientes))
+
+    def _bandas_de(self, firma):
+        datos = firma.tobytes()
+        ancho = self.filas * firma.itemsize
+        return [hash(datos[i * ancho:(i + 1) * ancho]) for i in range(self.bandas)]
+
+    @staticmethod
+    def similitud(firma_a, firma_b):
+        """Estimación de la similitud de Jaccard a partir de dos firmas MinHash."""
+        return sum(x == y for x, y in zip(firma_a, firma_b)) / len(firma_a)
+
+    def buscar(self, texto, firma=None):
+        """Retorna (clave, similitud) del texto indexado más parecido que supere el umbral, o None."""
+        firma = firma or self.firma(texto)
+        candidatos = set()
+        with self._lock:
+            for tabla, banda in zip(self._tablas, self._bandas_de(firma)):
+                candidatos.update(tabla.get(banda, ()))
+            firmas = [(clave, self._firmas[clave]) for clave in candidatos]
+        mejor = None
+        for clave, otra in firmas:
+            similitud = self.similitud(firma, otra)
+            if similitud >= self.umbral and (mejor is None or similitud > mejor[1]):
+                mejor = (clave, similitud)
+        return mejor
+
+    def agregar(self, clave, texto, firma=None):
+        firma = firma or self.firma(texto)
+        with self._lock:
+            if clave in self._firmas:
+                return
+            self._firmas[clave] = firma
+            for tabla, banda in zip(self._tablas, self._bandas_de(firma)):
+                tabla.setdefault(banda, []).append(clave)
+
+    def agregar_si_nueva(self, clave, texto):
+        """
+        Agrega el texto si no es un casi-duplicado de otro ya indexado.
+        Retorna None si se agregó, o (clave, similitud) del duplicado encontrado.
+        """
+        firma = self.firma(texto)
+        duplicado = self.buscar(texto, firma)
+        if duplicado is None:
+            self.agregar(clave, texto, firma)
+        return duplicado
+
+
+# --- Historial del estudiante por examen, reconstruido desde el almacén de sesiones ---
+# El almacén de sesiones (sesiones.py) es la única fuente del historial: cada réplica arma el
+# índice de un examen la primera vez que lo necesita (al crearlo o al retomarlo) y lo guarda
+# por id de examen, que no cambia aunque el examen se retome en otro proceso.
+MAX_EXAMENES = 10000
+MAX_HISTORIAL = 1000
+_historiales = {}
+_historiales_lock = threading.Lock()
+_claves = itertools.count()
+
+
+def historial_examen(exam_id, user_name, almacen, limite=MAX_HISTORIAL):
+    """
+    Retorna el índice de las preguntas que el estudiante ya vio, para el examen `exam_id`:
+    las `limite` más recientes de sus exámenes en `almacen`, incluidas las ya guardadas del
+    propio examen si se está retomando.
+    """
+    with _historiales_lock:
+        indice = _historiales.pop(exam_id, None)
+        if indice is not None:
+            # Se reinserta al final para que los exámenes menos recientes se descarten primero
+            _historiales[exam_id] = indice
+            return indice
+    # La lectura y las firmas (~0.6 ms por pregunta) se hacen fuera del lock
+    nuevo = IndiceDuplicados()
+    for enunciado in almacen.enunciados_de_estudiante(user_name, limite):
+        nuevo.agregar(next(_claves), enunciado)
+    with _historiales_lock:
+        indice = _historiales.setdefault(exam_id, nuevo)
+        while len(_historiales) > MAX_EXAMENES:
+            _historiales.pop(next(iter(_historiales)))
+        return indice
+
+
+class FiltroDuplicados:
+    """
+    Rechaza preguntas casi duplicadas dentro del examen actual y del historial del estudiante.
+    Está pensado para aplicarse justo después de parsear cada pregunta: las preguntas
+    aceptadas se agregan a ambos índices.
+    `historial` puede ser una función que retorna el índice (por ejemplo, historial_examen con
+    sus argumentos): se llama la primera vez que se filtra una pregunta, así el historial se
+    arma en el hilo que genera las preguntas y no al crear el filtro.
+    """
+
+    def __init__(self, historial=None):
+        self.examen = IndiceDuplicados()
+        self._historial = historial
+        self.rechazadas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def historial(self):
+        if callable(self._historial):
+            self._historial = self._historial()
+        return self._historial
+
+    def es_nueva(self, pregunta):
+        """Registra la pregunta si es nueva y retorna True; si es un casi-duplicado retorna False."""
+        texto = pregunta.question
+        firma = self.examen.firma(texto)
+        with self._lock:
+            historial = self.historial
+            if self.examen.buscar(texto, firma) or (historial is not None and historial.buscar(texto, firma)):
+                self.rechazadas += 1
+                return False
+            clave = next(_claves)
+            self.examen.agregar(clave, texto, firma)
+            if historial is not None:
+                historial.agregar(clave, texto, firma)
+        return True
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from modelos import Answer, Question
+from reporte_pdf import generate_exam_pdf
+from trabajos import enviar_acotado
+
+# --- Exportación masiva de reportes PDF para toda una sección ---
+# Uso:
+#   python exportar_reportes.py resultados.jsonl reportes.zip [--procesos N] [--errores errores.json]
+#
+# Cada línea del JSONL es un examen terminado con las claves "score", "user_answers" y
+# "questions" (Answer y Question de modelos.py como diccionarios), y opcionalmente "total_questions",
+# "user_name", "level", "topic" y "fecha".
+# Los PDFs se generan en paralelo en varios procesos y se escriben en el ZIP a medida
+# que terminan, sin mantener todos los documentos en memoria.
+
+
+def _nombre_archivo(numero, user_name):
+    nombre = re.sub(r"[^\w\-]+", "_", user_name or "Estudiante").strip("_") or "Estudiante"
+    return f"{numero:04d}_{nombre}.pdf"
+
+
+def renderizar_linea(numero, linea):
+    """Genera el PDF de una línea del JSONL. Retorna (nombre_archivo, bytes_pdf)."""
+    examen = json.loads(linea)
+    user_name = examen.get("user_name") or "Estudiante"
+    buffer = generate_exam_pdf(
+        examen["score"],
+        examen.get("total_questions", len(examen["questions"])),
+        [Answer.desde_dict(respuesta) for respuesta in examen["user_answers"]],
+        [Question.desde_dict(pregunta) for pregunta in examen["questions"]],
+        user_name=user_name,
+        level=examen.get("level", "N/A"),
+        topic=examen.get("topic", "N/A"),
+        fecha=examen.get("fecha"),
+    )
+    return _nombre_archivo(numero, user_name), buffer.getvalue()
+
+
+def _lineas_no_vacias(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            if linea.strip():
+                yield numero, linea
+
+
+def exportar_reportes(ruta_entrada, ruta_zip, procesos=None, en_progreso=None):
+    """
+    Genera un PDF por cada examen de `ruta_entrada` y los guarda en `ruta_zip`.
+    `en_progreso(hechos, total)` se llama cada vez que termina un reporte.
+    Retorna la lista de fallos como diccionarios {"linea": n, "error": "..."}.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    total = sum(1 for _ in _lineas_no_vacias(ruta_entrada))
+    # Se limita la cantidad de trabajos en vuelo para no acumular PDFs en memoria
+    max_en_vuelo = procesos * 2
+    fallos = []
+    hechos = 0
+
+    with zipfile.ZipFile(ruta_zip, "w", compression=zipfile.ZIP_DEFLATED) as zf, \
+            ProcessPoolExecutor(max_workers=procesos) as pool:
+        trabajos = ((numero, (numero, linea)) for numero, linea in _lineas_no_vacias(ruta_entrada))
+        for numero, futuro in enviar_acotado(pool, renderizar_linea, trabajos, max_en_vuelo):
+            try:
+                nombre, pdf_bytes = futuro.result()
+                zf.writestr(nombre, pdf_bytes)
+            except Exception as e:
+                fallos.append({"linea": numero, "error": f"{type(e).__name__}: {e}"})
+            hechos += 1
+            if en_progreso:
+                en_progreso(hechos, total)
+
+    return fallos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta en un ZIP los reportes PDF de todos los exámenes de un archivo JSONL.")
+    parser.add_argument("entrada", help="Archivo JSONL con un examen terminado por línea")
+    parser.add_argument("salida", help="Ruta del archivo ZIP a generar")
+    parser.add_argument("--procesos", type=int, default=None, help="Cantidad de procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--errores", default=None, help="Ruta opcional donde guardar la lista de fallos en JSON")
+    args = parser.parse_args(argv)
+
+    inicio = time.monotonic()
+
+    def en_progreso(hechos, total):
+        print(f"\r[{hechos}/{total}] reportes generados", end="", file=sys.stderr, flush=True)
+
+    fallos = exportar_reportes(args.entrada, args.salida, procesos=args.procesos, en_progreso=en_progreso)
+    print(file=sys.stderr)
+    print(f"Listo en {time.monotonic() - inicio:.1f} s. Fallos: {len(fallos)}", file=sys.stderr)
+    for fallo in fallos:
+        print(f"  línea {fallo['linea']}: {fallo['error']}", file=sys.stderr)
+    if args.errores:
+        with open(args.errores, "w", encoding="utf-8") as f:
+            json.dump(fallos, f, ensure_ascii=False, indent=2)
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
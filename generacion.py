@@ -0,0 +1,319 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from resiliencia import CircuitoAbiertoError
+
+# --- Motor de generación de preguntas para el examen ---
+# En lugar de generar las preguntas una por una (con una pausa fija entre llamadas),
+# se piden en lote y por adelantado (GeneradorExamenProgresivo), y un limitador "token
+# bucket" compartido por todo el proceso se encarga de respetar la cuota de la API.
+
+
+class TokenBucket:
+    """
+    Limitador de tasa tipo "token bucket", seguro entre hilos.
+    `rate` es la cantidad de tokens que se recuperan por segundo y `capacity`
+    la ráfaga máxima permitida.
+    """
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate y capacity deben ser mayores que cero")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1, reserva=0):
+        """
+        Consume `tokens` si están disponibles. Retorna True/False sin bloquear.
+        Con `reserva` > 0 solo los consume si, además, quedan `reserva` tokens libres
+        (útil para tráfico de fondo que no debe competir con los usuarios).
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens + reserva:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Bloquea hasta que haya `tokens` disponibles y los consume."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                espera = (tokens - self._tokens) / self.rate
+            time.sleep(espera)
+
+    async def acquire_async(self, tokens=1):
+        """Como acquire, pero espera con asyncio.sleep para no bloquear el event loop."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                espera = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(espera)
+
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+def limitador_global():
+    """
+    Retorna el limitador compartido por todas las sesiones del proceso.
+    Se ajusta con GEMINI_RPM (solicitudes por minuto) y GEMINI_BURST (ráfaga máxima).
+    """
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            rpm = float(os.environ.get("GEMINI_RPM", "15"))
+            burst = float(os.environ.get("GEMINI_BURST", "10"))
+            _limitador = TokenBucket(rate=rpm / 60.0, capacity=burst)
+        return _limitador
+
+
+def muestra_ponderada(elementos, cantidad, pesos):
+    """
+    Elige `cantidad` elementos distintos con probabilidad proporcional a `pesos[elemento]`
+    (1 si no tiene peso). Usa el método de Efraimidis-Spirakis: cada elemento recibe la
+    clave u ** (1 / peso) con u al azar, y se toman las mayores.
+    """
+    claves = []
+    for elemento in elementos:
+        peso = pesos.get(elemento, 1)
+        if peso > 0:
+            claves.append((random.random() ** (1.0 / peso), elemento))
+    claves.sort(reverse=True)
+    return [elemento for _, elemento in claves[:cantidad]]
+
+
+def _temas_para_examen(sub_temas, total, pesos=None):
+    """Elige `total` sub-temas, distintos mientras alcancen, según `pesos` si se indican."""
+    sub_temas = list(sub_temas)
+    if pesos:
+        temas = muestra_ponderada(sub_temas, total, pesos)
+    else:
+        temas = random.sample(sub_temas, min(total, len(sub_temas)))
+    # Si hay menos sub-temas que preguntas, se repiten sub-temas para completar
+    while len(temas) < total:
+        temas.append(random.choice(temas or sub_temas))
+    return temas
+
+
+def _separar_locales(temas, nivel, generador_local):
+    """
+    Genera con `generador_local(sub_tema, nivel)` las preguntas de los sub-temas calculables.
+    Retorna (validas_locales, temas_para_el_modelo).
+    """
+    if generador_local is None:
+        return [], list(temas)
+    locales = []
+    para_el_modelo = []
+    for tema in temas:
+        pregunta = generador_local(tema, nivel)
+        if pregunta is None:
+            para_el_modelo.append(tema)
+        else:
+            locales.append((tema, pregunta))
+    return locales, para_el_modelo
+
+
+async def generar_preguntas_examen_lote_async(sub_temas, nivel, total, generar_lote_fn, parse_lote_fn,
+                                              limiter=None, max_rondas=3, pesos=None, filtro=None,
+                                              generador_local=None):
+    """
+    Genera `total` preguntas sobre sub-temas distintos pidiéndolas en lote, para la API.
+
+    - `generar_lote_fn(temas, nivel)` es una corrutina (por ejemplo, tutor.generar_preguntas_lote_async)
+      que retorna el texto JSON del modelo para todos los `temas`; la cuota se espera sin bloquear.
+    - `parse_lote_fn(texto, temas)` retorna (validas, temas_fallidos), donde `validas`
+      es una lista de tuplas (sub_tema, pregunta).
+
+    En cada ronda solo se vuelven a pedir los sub-temas cuya pregunta fue inválida.
+    `pesos`, `filtro` y `generador_local` funcionan como en GeneradorExamenProgresivo.
+    """
+    if limiter is None:
+        limiter = limitador_global()
+    temas = _temas_para_examen(sub_temas, total, pesos)
+
+    locales, pendientes = _separar_locales(temas, nivel, generador_local)
+    preguntas = [pregunta for _, pregunta in locales]
+    for _ in range(max_rondas):
+        if not pendientes:
+            break
+        await limiter.acquire_async()
+        validas, fallidos = parse_lote_fn(await generar_lote_fn(pendientes, nivel), pendientes)
+        for sub_tema, pregunta in validas:
+            # El filtro de duplicados calcula firmas y consulta el historial: fuera del event loop
+            if filtro is None or await asyncio.to_thread(filtro, pregunta):
+                preguntas.append(pregunta)
+            else:
+                fallidos.append(sub_tema)
+        pendientes = fallidos
+        if not pendientes:
+            break
+    else:
+        raise RuntimeError(
+            f"No se pudieron generar {len(pendientes)} de {total} preguntas válidas tras {max_rondas} intentos."
+        )
+    return preguntas
+
+
+class GeneradorExamenProgresivo:
+    """
+    Genera las preguntas de un examen en un hilo de fondo, a medida que se necesitan.
+
+    El examen puede empezar en cuanto existe la primera pregunta: el hilo pide primero
+    una sola pregunta (una ida y vuelta al modelo) y luego mantiene `anticipacion`
+    preguntas listas por delante de la que el estudiante está respondiendo, pidiéndolas
+    en lote con `generar_lote_fn` / `parse_lote_fn` (ver generar_preguntas_examen_lote_async).
+
+    `preguntas_iniciales` permite arrancar con preguntas ya disponibles (por ejemplo,
+    extraídas del banco) y `temas_excluidos` evita repetir sus sub-temas.
+    `preguntas_previas` son preguntas que el estudiante ya vio (al retomar un examen):
+    ocupan las primeras posiciones y no pasan por el filtro.
+    Si nadie pide preguntas durante `inactividad_maxima` segundos, el hilo termina.
+    `filtro(pregunta)`, si se indica, se aplica a cada pregunta recién parseada (y a las
+    iniciales); las rechazadas se vuelven a pedir.
+    `pesos` ({sub_tema: peso}, opcional) hace más probables los sub-temas de mayor peso.
+    `generador_local(sub_tema, nivel)`, si se indica, genera sin llamar al modelo las preguntas
+    de los sub-temas que sabe calcular (ver subredes.py) y retorna None para los demás;
+    esas preguntas no pasan por el filtro porque sus parámetros se sortean en cada una.
+    """
+
+    def __init__(self, sub_temas, nivel, total, generar_lote_fn, parse_lote_fn,
+                 anticipacion=3, limiter=None, preguntas_iniciales=(), temas_excluidos=(),
+                 max_fallos=3, inactividad_maxima=1800, filtro=None, pesos=None, preguntas_previas=(),
+                 generador_local=None):
+        self.sub_temas = list(sub_temas)
+        self.pesos = pesos
+        self.nivel = nivel
+        self.total = total
+        self.generar_lote_fn = generar_lote_fn
+        self.parse_lote_fn = parse_lote_fn
+        self.anticipacion = anticipacion
+        self.limiter = limiter or limitador_global()
+        self.max_fallos = max_fallos
+        self.inactividad_maxima = inactividad_maxima
+        self.filtro = filtro
+        self.generador_local = generador_local
+        self.preguntas = list(preguntas_previas)
+        self.preguntas += [p for p in preguntas_iniciales if filtro is None or filtro(p)]
+        del self.preguntas[total:]
+        self.error = None
+        self._temas_usados = set(temas_excluidos)
+        self._indice_actual = 0
+        self._detener = False
+        self._condicion = threading.Condition()
+        self._hilo = threading.Thread(target=self._trabajar, name="prefetch-examen", daemon=True)
+        self._hilo.start()
+
+    @property
+    def completo(self):
+        return len(self.preguntas) >= self.total
+
+    def avanzar_a(self, indice):
+        """Informa qué pregunta está respondiendo el estudiante, para adelantar la generación."""
+        with self._condicion:
+            self._indice_actual = max(self._indice_actual, indice)
+            self._condicion.notify_all()
+
+    def esperar(self, indice, timeout=None):
+        """
+        Bloquea hasta que la pregunta `indice` exista y la retorna.
+        Lanza la excepción del hilo de fondo si la generación falló, o TimeoutError.
+        """
+        self.avanzar_a(indice)
+        with self._condicion:
+            listo = self._condicion.wait_for(
+                lambda: len(self.preguntas) > indice or self.error is not None or self._detener,
+                timeout=timeout,
+            )
+            if len(self.preguntas) > indice:
+                return self.preguntas[indice]
+            if self.error is not None:
+                raise self.error
+            if not listo:
+                raise TimeoutError(f"La pregunta {indice + 1} no estuvo lista a tiempo.")
+            raise RuntimeError("La generación del examen fue detenida.")
+
+    def detener(self):
+        with self._condicion:
+            self._detener = True
+            self._condicion.notify_all()
+
+    def _elegir_temas(self, cantidad):
+        disponibles = [t for t in self.sub_temas if t not in self._temas_usados]
+        if len(disponibles) < cantidad:
+            self._temas_usados.clear()
+            disponibles = list(self.sub_temas)
+        if self.pesos:
+            return muestra_ponderada(disponibles, min(cantidad, len(disponibles)), self.pesos)
+        return random.sample(disponibles, min(cantidad, len(disponibles)))
+
+    def _cantidad_a_pedir(self):
+        faltan = self.total - len(self.preguntas)
+        if not self.preguntas:
+            # La primera pregunta se pide sola: es la que define el tiempo de inicio del examen
+            return min(1, faltan)
+        objetivo = self._indice_actual + 1 + self.anticipacion
+        return max(0, min(faltan, objetivo - len(self.preguntas)))
+
+    def _trabajar(self):
+        fallos_seguidos = 0
+        ultimo_error = None
+        while True:
+            with self._condicion:
+                # Si el estudiante abandona el examen, el hilo termina tras `inactividad_maxima` segundos
+                hay_trabajo = self._condicion.wait_for(
+                    lambda: self._detener or self._cantidad_a_pedir() > 0,
+                    timeout=self.inactividad_maxima,
+                )
+                if self._detener or not hay_trabajo:
+                    return
+                temas = self._elegir_temas(self._cantidad_a_pedir())
+            locales, temas = _separar_locales(temas, self.nivel, self.generador_local)
+            validas = []
+            try:
+                if temas:
+                    self.limiter.acquire()
+                    validas, _ = self.parse_lote_fn(self.generar_lote_fn(temas, self.nivel), temas)
+            except CircuitoAbiertoError as e:
+                # La API está caída: no tiene sentido seguir intentando
+                with self._condicion:
+                    self.error = e
+                    self._condicion.notify_all()
+                return
+            except Exception as e:
+                # Un error aislado (ya reintentado por el backend) cuenta como un intento fallido
+                validas = []
+                ultimo_error = e
+            with self._condicion:
+                validas = locales + [(t, p) for t, p in validas if self.filtro is None or self.filtro(p)]
+                for sub_tema, pregunta in validas:
+                    if len(self.preguntas) < self.total:
+                        self.preguntas.append(pregunta)
+                        self._temas_usados.add(sub_tema)
+                fallos_seguidos = 0 if validas else fallos_seguidos + 1
+                if fallos_seguidos >= self.max_fallos:
+                    self.error = ultimo_error or RuntimeError(
+                        f"No se pudo generar una pregunta válida tras {fallos_seguidos} intentos."
+                    )
+                self._condicion.notify_all()
+                if self.error is not None or self.completo:
+                    return
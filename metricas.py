@@ -0,0 +1,291 @@
+import bisect
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# --- Métricas de latencia, tokens y errores ---
+# Registro en memoria, compartido por todo el proceso, con:
+#   - contadores (llamadas, errores, tokens, parseos fallidos...)
+#   - histogramas de duración, en segundos, con buckets fijos (LIMITES_SEGUNDOS); además
+#     guardan las últimas muestras para leer p50/p95/p99 en el proceso (benchmarks, logs)
+# Cada llamada al modelo se emite además como un log estructurado (una línea JSON)
+# en el logger "tutor.metricas". Las métricas se exportan en formato de texto de
+# Prometheus: a un archivo (METRICAS_ARCHIVO, como mucho cada METRICAS_INTERVALO segundos)
+# o por HTTP en /metrics (METRICAS_PUERTO). Los histogramas se pueden sumar entre réplicas;
+# los percentiles se calculan en Prometheus con histogram_quantile(0.95, ..._bucket).
+
+PREFIJO = "tutor_"
+CUANTILES = (0.5, 0.95, 0.99)
+# Desde el render de un PDF (milisegundos) hasta una llamada al modelo con reintentos
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+logger = logging.getLogger("tutor.metricas")
+if os.environ.get("METRICAS_LOGS") == "1" and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class Histograma:
+    """
+    Conteo por bucket (acumulado al exportar), suma y cantidad de todas las observaciones,
+    y percentiles de las últimas `max_muestras`.
+    """
+
+    def __init__(self, limites=LIMITES_SEGUNDOS, max_muestras=2048):
+        self.limites = limites
+        self._buckets = [0] * len(limites)
+        self._muestras = deque(maxlen=max_muestras)
+        self.suma = 0.0
+        self.cuenta = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        # Primer bucket cuyo límite es >= valor; los mayores que todos solo cuentan en +Inf
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            if indice < len(self._buckets):
+                self._buckets[indice] += 1
+            self._muestras.append(valor)
+            self.suma += valor
+            self.cuenta += 1
+
+    def buckets(self):
+        """Retorna [(límite, observaciones <= límite)], terminando en ("+Inf", cuenta)."""
+        with self._lock:
+            conteos, cuenta = list(self._buckets), self.cuenta
+        return list(zip(self.limites, itertools.accumulate(conteos))) + [("+Inf", cuenta)]
+
+    def percentiles(self, cuantiles=CUANTILES):
+        with self._lock:
+            ordenadas = sorted(self._muestras)
+        if not ordenadas:
+            return {q: 0.0 for q in cuantiles}
+        return {q: ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))] for q in cuantiles}
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def _escapar(valor):
+    # Formato de texto de Prometheus: en los valores de etiqueta se escapan la barra invertida,
+    # las comillas y el salto de línea
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ""
+    texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in pares)
+    return "{" + texto + "}"
+
+
+class RegistroMetricas:
+    """Contadores e histogramas identificados por nombre y etiquetas."""
+
+    def __init__(self):
+        self._contadores = {}
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma()
+        histograma.observar(valor)
+
+    def contador(self, nombre, **etiquetas):
+        with self._lock:
+            return self._contadores.get(_clave(nombre, etiquetas), 0)
+
+    def histograma(self, nombre, **etiquetas):
+        with self._lock:
+            return self._histogramas.get(_clave(nombre, etiquetas))
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def exportar_prometheus(self):
+        """Retorna todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted(self._histogramas.items())
+        lineas = []
+        tipos_declarados = set()
+        for (nombre, etiquetas), valor in contadores:
+            if nombre not in tipos_declarados:
+                lineas.append(f"# TYPE {PREFIJO}{nombre} counter")
+                tipos_declarados.add(nombre)
+            lineas.append(f"{PREFIJO}{nombre}{_formatear_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), histograma in histogramas:
+            if nombre not in tipos_declarados:
+                lineas.append(f"# TYPE {PREFIJO}{nombre} histogram")
+                tipos_declarados.add(nombre)
+            for limite, acumuladas in histograma.buckets():
+                lineas.append(f"{PREFIJO}{nombre}_bucket{_formatear_etiquetas(etiquetas, [('le', limite)])} {acumuladas}")
+            lineas.append(f"{PREFIJO}{nombre}_sum{_formatear_etiquetas(etiquetas)} {histograma.suma:.6f}")
+            lineas.append(f"{PREFIJO}{nombre}_count{_formatear_etiquetas(etiquetas)} {histograma.cuenta}")
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    registro.incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, valor, **etiquetas):
+    registro.observar(nombre, valor, **etiquetas)
+
+
+@contextmanager
+def medir(nombre, **etiquetas):
+    """
+    Mide la duración del bloque en segundos y la registra en el histograma `nombre`.
+    Si el bloque lanza una excepción se incrementa además `<nombre>_errores_total`.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        incrementar(f"{nombre}_errores_total", **etiquetas)
+        raise
+    finally:
+        observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+
+def medido(nombre, **etiquetas):
+    """Decorador equivalente a envolver todo el cuerpo de la función en `medir(nombre)`."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(nombre, **etiquetas):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _tokens(respuesta):
+    """Retorna (entrada, salida, entrada servida desde la caché de contexto) de `usage_metadata`."""
+    uso = getattr(respuesta, "usage_metadata", None)
+    if uso is None:
+        return 0, 0, 0
+    return (getattr(uso, "prompt_token_count", 0) or 0, getattr(uso, "candidates_token_count", 0) or 0,
+            getattr(uso, "cached_content_token_count", 0) or 0)
+
+
+def registrar_llamada_modelo(funcion, duracion, respuesta=None, error=None, primer_token=None):
+    """
+    Registra una llamada al modelo: latencia, resultado, tokens de `usage_metadata`
+    y, en streaming, el tiempo hasta el primer fragmento. Emite un log estructurado.
+    """
+    resultado = "error" if error is not None else "ok"
+    observar("modelo_latencia_segundos", duracion, funcion=funcion)
+    incrementar("modelo_llamadas_total", funcion=funcion, resultado=resultado)
+    tokens_entrada, tokens_salida, tokens_cache = _tokens(respuesta)
+    if tokens_entrada:
+        incrementar("modelo_tokens_total", tokens_entrada, funcion=funcion, tipo="entrada")
+    if tokens_salida:
+        incrementar("modelo_tokens_total", tokens_salida, funcion=funcion, tipo="salida")
+    if tokens_cache:
+        # Ya incluidos en "entrada"; se facturan con descuento
+        incrementar("modelo_tokens_total", tokens_cache, funcion=funcion, tipo="entrada_cache")
+    if primer_token is not None:
+        observar("modelo_primer_token_segundos", primer_token, funcion=funcion)
+
+    evento = {
+        "evento": "llamada_modelo",
+        "funcion": funcion,
+        "resultado": resultado,
+        "duracion_ms": round(duracion * 1000, 2),
+        "tokens_entrada": tokens_entrada,
+        "tokens_salida": tokens_salida,
+        "tokens_cache": tokens_cache,
+    }
+    if primer_token is not None:
+        evento["primer_token_ms"] = round(primer_token * 1000, 2)
+    if error is not None:
+        evento["error"] = f"{type(error).__name__}: {error}"
+    logger.info(json.dumps(evento, ensure_ascii=False))
+
+
+_ultimas_escrituras = {}
+_escrituras_lock = threading.Lock()
+
+
+def escribir_prometheus(ruta, intervalo=0.0):
+    """
+    Escribe las métricas en `ruta` de forma atómica (para el textfile collector de node_exporter).
+    Con `intervalo`, no hace nada si la última escritura de `ruta` fue hace menos de `intervalo`
+    segundos: la app la llama en cada rerun y el collector solo lee el archivo cada tanto.
+    """
+    ahora = time.monotonic()
+    with _escrituras_lock:
+        if ahora - _ultimas_escrituras.get(ruta, float("-inf")) < intervalo:
+            return
+        _ultimas_escrituras[ruta] = ahora
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(registro.exportar_prometheus())
+    os.replace(temporal, ruta)
+
+
+def _crear_servidor(puerto):
+    # http.server se importa solo si se pide el servidor: la app lo usa únicamente con METRICAS_PUERTO
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = registro.exportar_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("0.0.0.0", int(puerto)), _ManejadorMetricas)
+
+
+_servidor = None
+_servidor_lock = threading.Lock()
+
+
+def iniciar_servidor_metricas(puerto=None):
+    """
+    Inicia (una sola vez por proceso) un servidor HTTP que expone /metrics.
+    Sin `puerto` se usa METRICAS_PUERTO; si tampoco está definido, no hace nada.
+    """
+    global _servidor
+    puerto = puerto or os.environ.get("METRICAS_PUERTO")
+    if not puerto:
+        return None
+    with _servidor_lock:
+        if _servidor is None:
+            _servidor = _crear_servidor(puerto)
+            threading.Thread(target=_servidor.serve_forever, name="servidor-metricas", daemon=True).start()
+        return _servidor
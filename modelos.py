@@ -0,0 +1,80 @@
+from dataclasses import asdict, dataclass
+
+# --- Registros compactos de preguntas y respuestas del examen ---
+# Streamlit mantiene en memoria el session_state de todas las sesiones abiertas, así que
+# estos registros usan __slots__ (sin __dict__ por instancia) y las respuestas guardan
+# solo el índice de la pregunta y la letra elegida: los textos se leen de la pregunta.
+# `sub_tema`, `nivel` y `segundos` son opcionales (vacíos en los registros anteriores) y
+# alimentan la analítica de exámenes (analitica.py) y el examen adaptativo (adaptativo.py).
+
+
+@dataclass(slots=True, frozen=True)
+class Question:
+    """Pregunta de opción múltiple ya parseada, con las opciones barajadas ("A) ...", "B) ...")."""
+    question: str
+    options: tuple
+    correct_answer_char: str
+    explanation: str
+    sub_tema: str = ""
+    nivel: str = ""
+
+    def opcion(self, letra):
+        """Texto completo de la opción con la letra dada ("B) ..."), o "" si no existe."""
+        for opcion in self.options:
+            if opcion.startswith(letra + ')'):
+                return opcion
+        return ""
+
+    @property
+    def correct_option(self):
+        return self.opcion(self.correct_answer_char)
+
+    def a_dict(self):
+        datos = asdict(self)
+        datos['options'] = list(self.options)
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Crea la pregunta desde un diccionario; ignora claves antiguas como 'original_correct_option_text'."""
+        return cls(
+            question=datos['question'],
+            options=tuple(datos['options']),
+            correct_answer_char=datos['correct_answer_char'],
+            explanation=datos['explanation'],
+            sub_tema=datos.get('sub_tema') or "",
+            nivel=datos.get('nivel') or "",
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Answer:
+    """
+    Respuesta del estudiante: índice de la pregunta en el examen, letra elegida y, si se
+    midió, los segundos que tardó en responderla.
+    """
+    question_index: int
+    user_choice_char: str
+    segundos: float | None = None
+
+    def pregunta(self, questions):
+        return questions[self.question_index]
+
+    def es_correcta(self, questions):
+        return self.user_choice_char == questions[self.question_index].correct_answer_char
+
+    def a_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Acepta también el formato anterior, que repetía los textos de la pregunta."""
+        return cls(question_index=int(datos['question_index']), user_choice_char=datos['user_choice_char'],
+                   segundos=datos.get('segundos'))
+
+
+def a_serializable(valor):
+    """Función `default` para json.dumps: convierte Question/Answer en diccionarios."""
+    if hasattr(valor, 'a_dict'):
+        return valor.a_dict()
+    raise TypeError(f"Objeto no serializable: {type(valor).__name__}")
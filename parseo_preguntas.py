@@ -0,0 +1,237 @@
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# --- Parser tolerante de preguntas de opción múltiple en texto libre ---
+# El modelo no siempre respeta al pie de la letra el formato de FORMATO_PREGUNTA_MC (tutor.py),
+# y cada salida descartada cuesta otra llamada. Se aceptan las variaciones inofensivas:
+#   - etiquetas en negrita, como encabezado o en viñetas ("**Pregunta:**", "## Pregunta 1:", "- A) ...")
+#   - enunciado, opciones o explicación en varias líneas
+#   - "A.", "a)", "(A)", "A:" o "A -" en lugar de "A)"
+#   - respuesta correcta en minúscula, con su texto ("b) 255.255.255.0"), dentro de una frase
+#     ("La correcta es la opción C") o solo con el texto de la opción
+#   - texto antes o después del formato, bloques ``` y separadores "---"
+# y se reparan las salidas incompletas que todavía tienen una única lectura posible:
+#   - sin la etiqueta "Pregunta:": el enunciado es el párrafo que precede a las opciones
+#   - sin línea de respuesta, pero con una opción marcada "(correcta)" o "✅"
+#   - sin explicación: se genera una mínima a partir de la opción correcta
+#   - la pregunta en JSON, con las claves del lote (ver ESQUEMA_LOTE_PREGUNTAS)
+#
+# Es un autómata de una sola pasada: cada línea se normaliza, se clasifica con una gramática
+# compilada (_LINEA) y, según el estado (la sección en curso), abre la sección siguiente o
+# se agrega a la actual. Si la salida no se puede reparar, `motivo` dice por qué (MOTIVOS).
+
+MOTIVOS = (
+    "vacio", "sin_pregunta", "faltan_opciones", "opciones_de_mas", "opcion_vacia",
+    "opciones_repetidas", "sin_respuesta_correcta", "respuesta_ambigua",
+)
+
+_LETRAS = "ABCDEF"
+
+# Una línea ya normalizada es una etiqueta de sección o una opción; si no, es continuación
+_LINEA = re.compile(
+    r"""^(?:
+        (?P<etiqueta>pregunta|enunciado
+            |respuesta(?:\s+correcta)?|opci[oó]n\s+correcta|correcta|soluci[oó]n
+            |explicaci[oó]n|justificaci[oó]n)
+        (?:\s*\d+)?\s*[:.]\s*(?P<resto>.*)
+      | \(?(?P<letra>[a-f])\s*[).:\-]\s*(?P<opcion>.+)
+    )$""",
+    re.I | re.X,
+)
+_DECORACION_INICIAL = re.compile(r"^(?:[#>*•]+\s*|-\s+)+")
+_CERCO = re.compile(r"^(?:```|~~~|---+$|___+$)")
+_NUMERACION = re.compile(r"^\d+[.)]\s+")
+_MARCA_CORRECTA = re.compile(r"\s*(?:\((?:respuesta\s+)?correcta\)|\[(?:respuesta\s+)?correcta\]|✅|✔️?|✓)\s*$", re.I)
+
+# Respuesta que empieza con la letra: "B", "b)", "(B) texto", "B. texto", "B - texto"
+_RESPUESTA_LETRA = re.compile(r"^\(?([a-d])(?:\s*[).:\-]\s*(.*)|\s*)$", re.I)
+# Letra dentro de una frase: "La correcta es la opción C", "es la B". La letra va sola, seguida de
+# puntuación o del final; tras "es" solo cuenta en mayúscula, para no leer "es a su vez" como A
+_RESPUESTA_FRASE = re.compile(
+    r"(?:\b(?:opci[oó]n|letra|inciso|alternativa)\s+\(?([a-d])|\bes\s+(?:la\s+)?\(?(?-i:([A-D])))\)?(?=\s*(?:[.,;:!?]|$))",
+    re.I,
+)
+
+
+@dataclass(slots=True, frozen=True)
+class ResultadoParseo:
+    """
+    Resultado de analizar_pregunta: los campos de la pregunta (con las opciones sin letra y
+    en el orden original) o, si la salida no se pudo reparar, el `motivo`.
+    `reparaciones` enumera lo que se completó o dedujo para aceptarla.
+    """
+    enunciado: str = ""
+    opciones: tuple = ()
+    indice_correcto: int | None = None
+    explicacion: str = ""
+    motivo: str = ""
+    reparaciones: tuple = ()
+
+    @property
+    def ok(self):
+        return not self.motivo
+
+
+def _normalizar_linea(linea):
+    """Quita la decoración Markdown que no es parte del contenido: negritas, encabezados y viñetas."""
+    linea = linea.strip().replace("**", "").replace("__", "")
+    return _DECORACION_INICIAL.sub("", linea).strip()
+
+
+def _clave_texto(texto):
+    """Forma canónica para comparar textos de opciones: sin tildes, mayúsculas ni puntuación final."""
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split()).strip(" .;:,`\"'")
+
+
+def _indice_respuesta(texto, opciones):
+    """Retorna (indice, reparacion) de la opción correcta según el texto de la respuesta, o (None, motivo)."""
+    claves = [_clave_texto(o) for o in opciones]
+    letra = _RESPUESTA_LETRA.match(texto)
+    if letra:
+        indice = ord(letra.group(1).upper()) - 65
+        resto = _clave_texto(letra.group(2) or "")
+        if indice < len(opciones) and (not resto or resto == claves[indice] or resto not in claves):
+            return indice, None
+        if indice < len(opciones):
+            # La letra y el texto señalan opciones distintas
+            return None, "respuesta_ambigua"
+    clave = _clave_texto(texto)
+    if clave in claves:
+        return claves.index(clave), "respuesta_por_texto"
+    contenidas = [i for i, c in enumerate(claves) if c and (c in clave or clave in c)] if clave else []
+    if len(contenidas) == 1:
+        return contenidas[0], "respuesta_por_texto"
+    if len(contenidas) > 1:
+        return None, "respuesta_ambigua"
+    frase = _RESPUESTA_FRASE.search(texto)
+    if frase:
+        indice = ord((frase.group(1) or frase.group(2)).upper()) - 65
+        if indice < len(opciones):
+            return indice, None
+    return None, "sin_respuesta_correcta"
+
+
+def _desde_json(texto):
+    """Acepta la pregunta como un objeto JSON con las claves del lote; None si no lo es."""
+    texto = texto.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    if not texto.startswith("{"):
+        return None
+    try:
+        datos = json.loads(texto)
+    except ValueError:
+        return None
+    if not isinstance(datos, dict):
+        return None
+    enunciado, opciones, indice, explicacion = (datos.get(k) for k in ("pregunta", "opciones", "indice_correcto", "explicacion"))
+    if not (isinstance(enunciado, str) and isinstance(opciones, list) and all(isinstance(o, str) for o in opciones)):
+        return None
+    if isinstance(indice, bool) or not isinstance(indice, int):
+        return None
+    return _validar(enunciado.strip(), [o.strip() for o in opciones], indice,
+                    explicacion.strip() if isinstance(explicacion, str) else "", ["json"])
+
+
+def _validar(enunciado, opciones, indice, explicacion, reparaciones, motivo_respuesta=None):
+    def fallo(motivo):
+        return ResultadoParseo(motivo=motivo, reparaciones=tuple(reparaciones))
+
+    if not enunciado:
+        return fallo("sin_pregunta")
+    if len(opciones) < 4:
+        return fallo("faltan_opciones")
+    if len(opciones) > 4:
+        return fallo("opciones_de_mas")
+    if not all(opciones):
+        return fallo("opcion_vacia")
+    if len({_clave_texto(o) for o in opciones}) != 4:
+        return fallo("opciones_repetidas")
+    if indice is None or not 0 <= indice < 4:
+        return fallo(motivo_respuesta or "sin_respuesta_correcta")
+    if not explicacion:
+        explicacion = f"La respuesta correcta es: {opciones[indice]}."
+        reparaciones.append("explicacion_generada")
+    return ResultadoParseo(enunciado, tuple(opciones), indice, explicacion, reparaciones=tuple(reparaciones))
+
+
+def analizar_pregunta(texto):
+    """Parsea y, si hace falta, repara la salida de generar_pregunta_multiple_choice. Retorna un ResultadoParseo."""
+    if not isinstance(texto, str) or not texto.strip():
+        return ResultadoParseo(motivo="vacio")
+    desde_json = _desde_json(texto)
+    if desde_json is not None:
+        return desde_json
+
+    estado = "inicio"
+    parrafo = []          # Último párrafo antes de las opciones, por si falta "Pregunta:"
+    enunciado = []
+    opciones = []
+    respuesta = []
+    explicacion = []
+    con_etiqueta = False
+    vistas = set()
+    for linea in texto.splitlines():
+        if _CERCO.match(linea.strip()):
+            continue
+        linea = _normalizar_linea(linea)
+        if not linea:
+            if estado == "inicio":
+                parrafo = []
+            continue
+        m = _LINEA.match(linea)
+        etiqueta = m.group("etiqueta").casefold() if m and m.group("etiqueta") else None
+        letra = m.group("letra").upper() if m and m.group("letra") else None
+
+        if etiqueta in ("pregunta", "enunciado") and not opciones:
+            estado, con_etiqueta = "pregunta", True
+            enunciado = [m.group("resto")] if m.group("resto") else []
+        elif letra and letra == _LETRAS[min(len(opciones), len(_LETRAS) - 1)] and estado in ("inicio", "pregunta", "opcion"):
+            # Solo la letra siguiente abre una opción; "B)" dentro de la explicación es texto
+            if not opciones and not con_etiqueta:
+                enunciado = parrafo
+            estado = "opcion"
+            opciones.append(m.group("opcion").strip())
+        elif etiqueta and etiqueta.startswith(("respuesta", "opci", "correcta", "soluci")) and opciones and "respuesta" not in vistas:
+            # Cada sección se abre una sola vez: "Respuesta:" dentro de la explicación es texto
+            estado = "respuesta"
+            vistas.add(estado)
+            respuesta = [m.group("resto")] if m.group("resto") else []
+        elif etiqueta and etiqueta.startswith(("explicaci", "justificaci")) and opciones and "explicacion" not in vistas:
+            estado = "explicacion"
+            vistas.add(estado)
+            explicacion = [m.group("resto")] if m.group("resto") else []
+        elif estado == "inicio":
+            parrafo.append(linea)
+        elif estado == "pregunta":
+            enunciado.append(linea)
+        elif estado == "opcion":
+            # Opción en varias líneas
+            opciones[-1] += " " + linea
+        elif estado == "respuesta":
+            respuesta.append(linea)
+        elif estado == "explicacion":
+            explicacion.append(linea)
+
+    reparaciones = []
+    if opciones and not con_etiqueta and enunciado:
+        reparaciones.append("pregunta_sin_etiqueta")
+        enunciado[0] = _NUMERACION.sub("", enunciado[0])
+    # Las marcas de "correcta" en las opciones se quitan siempre: revelarían la respuesta
+    marcadas = [i for i, o in enumerate(opciones) if _MARCA_CORRECTA.search(o)]
+    opciones = [_MARCA_CORRECTA.sub("", o).strip() for o in opciones]
+
+    indice, motivo_respuesta = None, None
+    if respuesta and opciones:
+        indice, reparacion = _indice_respuesta(" ".join(respuesta).strip(), opciones)
+        if indice is None:
+            motivo_respuesta = reparacion
+        elif reparacion:
+            reparaciones.append(reparacion)
+    if indice is None and len(marcadas) == 1 and motivo_respuesta != "respuesta_ambigua":
+        indice, motivo_respuesta = marcadas[0], None
+        reparaciones.append("respuesta_marcada")
+    return _validar("\n".join(enunciado).strip(), opciones, indice, " ".join(explicacion).strip(),
+                    reparaciones, motivo_respuesta)
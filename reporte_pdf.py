@@ -0,0 +1,187 @@
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from metricas import medido
+from modelos import a_serializable
+
+# ReportLab y pytz se importan recién al generar el primer PDF: importar ReportLab
+# cuesta más de 100 ms y la mayoría de las sesiones nunca descarga un reporte.
+
+# --- Estilos del PDF ---
+# Se construyen una sola vez por proceso en lugar de en cada llamada a generate_exam_pdf
+_estilos = None
+_estilos_lock = threading.Lock()
+
+
+def obtener_estilos():
+    """Retorna la hoja de estilos del PDF, creándola la primera vez."""
+    global _estilos
+    with _estilos_lock:
+        if _estilos is not None:
+            return _estilos
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT # Importar TA_RIGHT
+
+        styles = getSampleStyleSheet()
+
+        # Estilos personalizados para el PDF
+        styles.add(ParagraphStyle(name='TitleStyle', fontSize=20, leading=24,
+                                   alignment=TA_CENTER, spaceAfter=20))
+        # --- Información del estudiante/examen ---
+        styles.add(ParagraphStyle(name='StudentInfoStyle', fontSize=9, leading=10, # Más pequeño
+                                   alignment=TA_RIGHT, spaceAfter=2)) # Alineado a la derecha y más junto
+        styles.add(ParagraphStyle(name='HeaderStyle', fontSize=12, leading=16,
+                                   alignment=TA_LEFT, spaceAfter=10, fontName='Helvetica-Bold'))
+        styles.add(ParagraphStyle(name='NormalStyle', fontSize=10, leading=12,
+                                   alignment=TA_LEFT, spaceAfter=8, leftIndent=10))
+        styles.add(ParagraphStyle(name='OptionStyle', fontSize=9, leading=11,
+                                   alignment=TA_LEFT, spaceAfter=4, leftIndent=30))
+        styles.add(ParagraphStyle(name='CorrectAnswerStyle', fontSize=10, leading=12,
+                                   alignment=TA_LEFT, spaceAfter=8, textColor='green', fontName='Helvetica-Bold', leftIndent=10))
+        styles.add(ParagraphStyle(name='IncorrectAnswerStyle', fontSize=10, leading=12,
+                                   alignment=TA_LEFT, spaceAfter=8, textColor='red', fontName='Helvetica-Bold', leftIndent=10))
+        styles.add(ParagraphStyle(name='ExplanationStyle', fontSize=9, leading=11,
+                                   alignment=TA_LEFT, spaceBefore=5, spaceAfter=10, textColor='gray', leftIndent=20))
+        _estilos = styles
+        return _estilos
+
+
+# --- FUNCIÓN PARA GENERAR PDF ---
+@medido("pdf_generacion_segundos")
+def generate_exam_pdf(score, total_questions, user_answers, all_questions, user_name="Estudiante", level="N/A", topic="N/A", fecha=None,
+                      resumen_adaptativo=None):
+    """
+    Construye el PDF con los resultados del examen y lo retorna en un BytesIO.
+    `user_answers` es una lista de Answer y `all_questions` una lista de Question (ver modelos.py).
+    `fecha` es la fecha y hora a imprimir; por defecto, la hora actual de Perú.
+    `resumen_adaptativo` es, en el examen adaptativo, el resultado de EstimadorHabilidad.resumen().
+    """
+    # --- Importaciones para PDF ---
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+    from reportlab.lib.units import inch
+    # --- Fin Importaciones para PDF ---
+
+    styles = obtener_estilos()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=inch, leftMargin=inch,
+                            topMargin=inch, bottomMargin=inch)
+    story = []
+
+    # Obtener la hora actual en la zona horaria de Puno, Perú
+    current_time_peru = fecha or hora_peru()
+
+    # Título principal del examen
+    story.append(Paragraph("Resultados del Examen de Arquitectura de Redes", styles['TitleStyle']))
+    story.append(Spacer(1, 0.2 * inch)) # Espacio después del título principal
+
+    # --- INFORMACIÓN DEL ESTUDIANTE/EXAMEN (MOVIDO Y AJUSTADO) ---
+    # Usamos un Frame o una tabla para controlar mejor la posición
+    # Para simplicidad sin usar Frames complejos, podemos usar Paragraphs con TA_RIGHT
+    # y control de espaciado.
+    story.append(Paragraph(f"Estudiante: {user_name}", styles['StudentInfoStyle']))
+    story.append(Paragraph(f"Nivel: {level}", styles['StudentInfoStyle']))
+    story.append(Paragraph(f"Tema General: {topic}", styles['StudentInfoStyle']))
+    story.append(Paragraph(f"Fecha y Hora: {current_time_peru}", styles['StudentInfoStyle']))
+    story.append(Spacer(1, 0.3 * inch)) # Espacio después de la información del estudiante
+
+    # Resumen de puntuación
+    story.append(Paragraph(f"Puntuación Final: {score} / {total_questions}", styles['HeaderStyle']))
+    if resumen_adaptativo:
+        # El examen adaptativo tiene largo variable: la nota es la estimación del nivel
+        minimo, maximo = resumen_adaptativo['dominio_intervalo']
+        story.append(Paragraph(f"Examen adaptativo de {resumen_adaptativo['preguntas']} preguntas. "
+                               f"Nivel estimado: {resumen_adaptativo['nivel_estimado']}", styles['NormalStyle']))
+        story.append(Paragraph(f"Dominio del nivel {resumen_adaptativo['nivel_examen']}: {resumen_adaptativo['dominio']:.0%} "
+                               f"(intervalo del 95 %: {minimo:.0%} a {maximo:.0%})", styles['NormalStyle']))
+        for fila in resumen_adaptativo['sub_temas']:
+            story.append(Paragraph(f"{fila['sub_tema']}: {fila['aciertos']} de {fila['preguntas']} correctas, "
+                                   f"dominio estimado {fila['dominio']:.0%}", styles['OptionStyle']))
+    story.append(Spacer(1, 0.2 * inch))
+
+    # Detalles de cada pregunta
+    for i, user_ans_data in enumerate(user_answers):
+        question_info = user_ans_data.pregunta(all_questions)
+        story.append(Paragraph(f"**{i + 1})** {question_info.question}", styles['NormalStyle']))
+        if question_info.nivel:
+            story.append(Paragraph(f"Nivel de la pregunta: {question_info.nivel}", styles['OptionStyle']))
+        story.append(Spacer(1, 0.1 * inch))
+
+        # Mostrar todas las opciones de la pregunta
+        story.append(Paragraph("Opciones:", styles['NormalStyle']))
+        for option_text in question_info.options:
+            story.append(Paragraph(option_text, styles['OptionStyle']))
+        story.append(Spacer(1, 0.1 * inch))
+
+
+        # Mostrar la respuesta del usuario de forma completa
+        story.append(Paragraph(f"Tu respuesta: **{question_info.opcion(user_ans_data.user_choice_char)}**", styles['NormalStyle']))
+
+        # Mostrar la respuesta correcta de forma completa
+        story.append(Paragraph(f"Respuesta correcta: **{question_info.correct_option}**", styles['NormalStyle']))
+
+
+        if user_ans_data.user_choice_char == question_info.correct_answer_char:
+            story.append(Paragraph("Estado: Correcto ✅", styles['CorrectAnswerStyle']))
+        else:
+            story.append(Paragraph("Estado: Incorrecto ❌", styles['IncorrectAnswerStyle']))
+            story.append(Paragraph(f"**Explicación:** {question_info.explanation}", styles['ExplanationStyle']))
+
+        story.append(Spacer(1, 0.2 * inch))
+        if (i + 1) % 3 == 0 and (i + 1) != total_questions: # Añade un salto de página cada 3 preguntas
+            story.append(PageBreak())
+
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def hora_peru():
+    """Fecha y hora actual en la zona horaria de Puno, Perú, con el formato usado en el PDF."""
+    import pytz # Para manejar zonas horarias
+
+    peru_tz = pytz.timezone('America/Lima') # Lima es la zona horaria para Puno, Perú
+    return datetime.now(peru_tz).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- Caché de PDFs ya generados ---
+# Cada examen terminado se identifica por una huella de todos los datos que aparecen
+# en el PDF; así el documento se construye una sola vez aunque Streamlit vuelva a
+# ejecutar el script en cada interacción.
+MAX_PDFS_EN_CACHE = 64
+_pdfs_cache = OrderedDict()
+_pdfs_lock = threading.Lock()
+
+
+def huella_examen(score, total_questions, user_answers, all_questions, user_name, level, topic, fecha, resumen_adaptativo=None):
+    """Retorna un hash estable de todos los datos que determinan el contenido del PDF."""
+    datos = [score, total_questions, user_answers, all_questions, user_name, level, topic, fecha, resumen_adaptativo]
+    serializado = json.dumps(datos, sort_keys=True, ensure_ascii=False, default=a_serializable)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+def generate_exam_pdf_cached(score, total_questions, user_answers, all_questions, user_name="Estudiante", level="N/A", topic="N/A", fecha=None,
+                             resumen_adaptativo=None):
+    """
+    Igual que generate_exam_pdf pero retorna los bytes del PDF, memorizados por huella
+    del examen (LRU de MAX_PDFS_EN_CACHE entradas).
+    """
+    fecha = fecha or hora_peru()
+    huella = huella_examen(score, total_questions, user_answers, all_questions, user_name, level, topic, fecha, resumen_adaptativo)
+    with _pdfs_lock:
+        if huella in _pdfs_cache:
+            _pdfs_cache.move_to_end(huella)
+            return _pdfs_cache[huella]
+    pdf_bytes = generate_exam_pdf(score, total_questions, user_answers, all_questions,
+                                  user_name=user_name, level=level, topic=topic, fecha=fecha,
+                                  resumen_adaptativo=resumen_adaptativo).getvalue()
+    with _pdfs_lock:
+        _pdfs_cache[huella] = pdf_bytes
+        while len(_pdfs_cache) > MAX_PDFS_EN_CACHE:
+            _pdfs_cache.popitem(last=False)
+    return pdf_bytes
@@ -0,0 +1,331 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+
+from metricas import incrementar
+
+# --- Capa de resiliencia para las llamadas al modelo ---
+# ResilientBackend envuelve cualquier backend (ver backends.py) y agrega:
+#   - clasificación de errores reintentables (cuota, sobrecarga, timeouts de red)
+#   - reintentos con backoff exponencial con jitter, respetando el retry-after de la API
+#   - "hedging": si una llamada tarda más que su p95 se lanza una copia y gana la primera
+#   - un circuit breaker que falla rápido mientras la API está caída
+
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitoAbiertoError(RuntimeError):
+    """Se lanza sin llamar al modelo mientras el circuit breaker está abierto."""
+
+
+def es_reintentable(error):
+    """Indica si vale la pena reintentar la llamada que produjo `error`."""
+    if isinstance(error, CircuitoAbiertoError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # google.api_core expone el estado HTTP en `code` (ResourceExhausted -> 429, ServiceUnavailable -> 503...)
+    codigo = getattr(error, "code", None)
+    if isinstance(codigo, int):
+        return codigo in CODIGOS_REINTENTABLES
+    return type(error).__name__ in {"ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded",
+                                    "InternalServerError", "TooManyRequests"}
+
+
+def segundos_retry_after(error):
+    """Extrae del error la espera sugerida por la API, en segundos, o None si no la hay."""
+    valor = getattr(error, "retry_after", None)
+    if valor is None:
+        respuesta = getattr(error, "response", None)
+        encabezados = getattr(respuesta, "headers", None) or {}
+        valor = encabezados.get("Retry-After") if hasattr(encabezados, "get") else None
+    if valor is not None:
+        try:
+            return max(0.0, float(valor))
+        except (TypeError, ValueError):
+            return None
+    # Gemini incluye RetryInfo en el mensaje, por ejemplo "retry_delay { seconds: 7 }"
+    coincidencia = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error)) or \
+        re.search(r"retry in ([\d.]+)\s*s", str(error), re.I)
+    return float(coincidencia.group(1)) if coincidencia else None
+
+
+def espera_backoff(intento, base=0.5, maximo=20.0, rng=random):
+    """Backoff exponencial con "full jitter": un valor al azar entre 0 y base * 2**intento."""
+    return rng.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados.
+    - cerrado: las llamadas pasan; `umbral_fallos` fallos seguidos lo abren.
+    - abierto: las llamadas fallan de inmediato durante `tiempo_apertura` segundos.
+    - semiabierto: se deja pasar una llamada de prueba; si funciona se cierra, si no se reabre.
+      Un error que no es de la API (ver registrar_neutro) no lo cierra ni lo reabre.
+    """
+
+    def __init__(self, umbral_fallos=8, tiempo_apertura=30.0):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = "cerrado"
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def verificar(self):
+        """Lanza CircuitoAbiertoError si la llamada no debe hacerse."""
+        with self._lock:
+            if self.estado == "abierto":
+                if time.monotonic() - self._abierto_desde < self.tiempo_apertura:
+                    raise CircuitoAbiertoError("El servicio del modelo no está disponible en este momento. Inténtalo en unos segundos.")
+                self.estado = "semiabierto"
+                self._prueba_en_curso = False
+            if self.estado == "semiabierto":
+                if self._prueba_en_curso:
+                    raise CircuitoAbiertoError("El servicio del modelo se está recuperando. Inténtalo en unos segundos.")
+                self._prueba_en_curso = True
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self.estado = "cerrado"
+            self._prueba_en_curso = False
+
+    def registrar_neutro(self):
+        """Resultado que no dice nada de la API: no cambia el estado, solo libera la llamada de prueba."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self.estado == "semiabierto" or self._fallos >= self.umbral_fallos:
+                if self.estado != "abierto":
+                    incrementar("circuito_aperturas_total")
+                self.estado = "abierto"
+                self._abierto_desde = time.monotonic()
+                self._prueba_en_curso = False
+
+
+class ResilientBackend:
+    """
+    Envuelve un backend con reintentos, hedging y circuit breaker.
+    Expone la misma interfaz que los backends (generate, generate_stream, generate_async).
+
+    - `max_intentos`: intentos totales por llamada (incluye el primero).
+    - `hedge_minimo`: segundos mínimos antes de lanzar una copia de la llamada.
+    - `muestras_hedge`: latencias observadas necesarias antes de empezar a hacer hedging.
+    - `permitir_hedge()`: función opcional que decide si hay cuota para la copia.
+    - `hilos_hedge`: hilos para las llamadas con hedging; si están todos ocupados, la llamada
+      se hace directamente, sin copia.
+    """
+
+    def __init__(self, backend, max_intentos=4, backoff_base=0.5, backoff_maximo=20.0,
+                 circuito=None, hedge_minimo=1.0, muestras_hedge=20, permitir_hedge=None, hilos_hedge=32):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self.circuito = circuito or CircuitBreaker()
+        self.hedge_minimo = hedge_minimo
+        self.muestras_hedge = muestras_hedge
+        self.permitir_hedge = permitir_hedge or (lambda: True)
+        self._latencias = {}
+        self._lock = threading.Lock()
+        self.hilos_hedge = hilos_hedge
+        self._en_pool = 0
+        self._pool = ThreadPoolExecutor(max_workers=hilos_hedge, thread_name_prefix="hedge-modelo")
+
+    # -- latencias observadas, separadas por tipo de llamada (texto libre o JSON) --
+    @staticmethod
+    def _clase(opciones):
+        return "json" if opciones.get("generation_config") else "texto"
+
+    def _registrar_latencia(self, clase, segundos):
+        with self._lock:
+            self._latencias.setdefault(clase, deque(maxlen=200)).append(segundos)
+
+    def _umbral_hedge(self, clase):
+        with self._lock:
+            muestras = sorted(self._latencias.get(clase, ()))
+        if len(muestras) < self.muestras_hedge:
+            return None
+        return max(self.hedge_minimo, muestras[int(len(muestras) * 0.95) - 1])
+
+    def _espera(self, error, intento):
+        espera = espera_backoff(intento, self.backoff_base, self.backoff_maximo)
+        sugerida = segundos_retry_after(error)
+        if sugerida is not None:
+            espera = max(espera, min(sugerida, self.backoff_maximo))
+        return espera
+
+    def _debe_reintentar(self, error, intento):
+        if es_reintentable(error):
+            self.circuito.registrar_fallo()
+            if intento + 1 < self.max_intentos:
+                incrementar("modelo_reintentos_total")
+                return True
+        else:
+            # Un error del prompt (por ejemplo, contenido inválido) no indica si la API está caída
+            # o disponible: no reinicia los fallos acumulados ni cierra el circuito
+            self.circuito.registrar_neutro()
+        return False
+
+    # -- llamadas síncronas --
+    def _enviar(self, prompt, opciones):
+        """
+        Envía la llamada al pool, o retorna None si no hay un hilo libre: encolarla haría
+        que el tiempo de espera en la cola contara como latencia del modelo.
+        Retorna (futuro, iniciada): `iniciada` se activa cuando un hilo empieza a ejecutarla
+        y guarda ese instante en `iniciada.inicio`.
+        """
+        with self._lock:
+            if self._en_pool >= self.hilos_hedge:
+                return None
+            self._en_pool += 1
+        iniciada = threading.Event()
+
+        def ejecutar():
+            iniciada.inicio = time.perf_counter()
+            iniciada.set()
+            return self.backend.generate(prompt, **opciones)
+
+        futuro = self._pool.submit(ejecutar)
+        futuro.add_done_callback(self._liberar_hilo)
+        return futuro, iniciada
+
+    def _hay_hilo_libre(self):
+        with self._lock:
+            return self._en_pool < self.hilos_hedge
+
+    def _liberar_hilo(self, futuro):
+        # También se llama al cancelar una copia que no llegó a empezar
+        with self._lock:
+            self._en_pool -= 1
+
+    def _llamada_con_hedge(self, prompt, opciones):
+        clase = self._clase(opciones)
+        umbral = self._umbral_hedge(clase)
+        enviada = self._enviar(prompt, opciones) if umbral is not None else None
+        if enviada is None:
+            # Sin historial de latencias o con el pool ocupado: llamada directa, sin hedging
+            inicio = time.perf_counter()
+            resultado = self.backend.generate(prompt, **opciones)
+            self._registrar_latencia(clase, time.perf_counter() - inicio)
+            return resultado
+
+        original, iniciada = enviada
+        # El umbral se cuenta desde que un hilo empieza la llamada, no desde que se encoló
+        iniciada.wait()
+        inicio = iniciada.inicio
+        try:
+            resultado = original.result(timeout=max(0.0, umbral - (time.perf_counter() - inicio)))
+            self._registrar_latencia(clase, time.perf_counter() - inicio)
+            return resultado
+        except FutureTimeoutError:
+            pass
+        # El pool se mira antes de pedir cuota para la copia, para no gastarla si no hay hilo libre
+        copia = self._enviar(prompt, opciones) if self._hay_hilo_libre() and self.permitir_hedge() else None
+        if copia is None:
+            resultado = original.result()
+            self._registrar_latencia(clase, time.perf_counter() - inicio)
+            return resultado
+
+        pendientes = {original: "original", copia[0]: "copia"}
+        ultimo_error = None
+        try:
+            while pendientes:
+                hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    origen = pendientes.pop(futuro)
+                    if futuro.exception() is None:
+                        incrementar("modelo_hedges_total", ganador=origen)
+                        self._registrar_latencia(clase, time.perf_counter() - inicio)
+                        return futuro.result()
+                    ultimo_error = futuro.exception()
+        finally:
+            # La perdedora se descarta si todavía no empezó; si ya está en curso, termina sola
+            for futuro in pendientes:
+                futuro.cancel()
+        raise ultimo_error
+
+    def generate(self, prompt, **opciones):
+        for intento in range(self.max_intentos):
+            self.circuito.verificar()
+            try:
+                resultado = self._llamada_con_hedge(prompt, opciones)
+            except Exception as e:
+                if not self._debe_reintentar(e, intento):
+                    raise
+                time.sleep(self._espera(e, intento))
+                continue
+            self.circuito.registrar_exito()
+            return resultado
+
+    def generate_stream(self, prompt, **opciones):
+        # Solo se reintenta si el error ocurre antes del primer fragmento: después,
+        # el estudiante ya está viendo el texto y reintentar duplicaría la salida
+        for intento in range(self.max_intentos):
+            self.circuito.verificar()
+            try:
+                fragmentos = iter(self.backend.generate_stream(prompt, **opciones))
+                primero = next(fragmentos)
+            except StopIteration:
+                self.circuito.registrar_exito()
+                return
+            except Exception as e:
+                if not self._debe_reintentar(e, intento):
+                    raise
+                time.sleep(self._espera(e, intento))
+                continue
+            self.circuito.registrar_exito()
+            yield primero
+            yield from fragmentos
+            return
+
+    # -- llamadas asíncronas --
+    async def _llamada_con_hedge_async(self, prompt, opciones):
+        clase = self._clase(opciones)
+        inicio = time.perf_counter()
+        umbral = self._umbral_hedge(clase)
+        original = asyncio.ensure_future(self.backend.generate_async(prompt, **opciones))
+        tareas = {original}
+        if umbral is not None:
+            hechos, _ = await asyncio.wait(tareas, timeout=umbral)
+            if not hechos and self.permitir_hedge():
+                tareas.add(asyncio.ensure_future(self.backend.generate_async(prompt, **opciones)))
+        con_copia = len(tareas) > 1
+        ultimo_error = None
+        try:
+            while tareas:
+                hechos, tareas = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechos:
+                    if tarea.exception() is None:
+                        if con_copia:
+                            incrementar("modelo_hedges_total", ganador="original" if tarea is original else "copia")
+                        self._registrar_latencia(clase, time.perf_counter() - inicio)
+                        return tarea.result()
+                    ultimo_error = tarea.exception()
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+        raise ultimo_error
+
+    async def generate_async(self, prompt, **opciones):
+        for intento in range(self.max_intentos):
+            self.circuito.verificar()
+            try:
+                resultado = await self._llamada_con_hedge_async(prompt, opciones)
+            except Exception as e:
+                if not self._debe_reintentar(e, intento):
+                    raise
+                await asyncio.sleep(self._espera(e, intento))
+                continue
+            self.circuito.registrar_exito()
+            return resultado
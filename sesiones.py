@@ -0,0 +1,259 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+from modelos import Answer, Question
+
+# --- Almacén externo del estado de los exámenes ---
+# El progreso de cada examen se guarda fuera del proceso de Streamlit, identificado por
+# un id de examen, para que un examen en curso sobreviva a un reinicio del worker y
+# pueda retomarse desde cualquier réplica detrás del balanceador.
+# Se escribe de forma incremental: al crear el examen, al aparecer preguntas nuevas y en
+# cada "Comprobar" (una fila por respuesta), nunca el estado completo.
+#
+# Se elige con SESIONES_ALMACEN=sqlite (por defecto, archivo SESIONES_DB) o memoria.
+
+
+def nuevo_id_examen():
+    return uuid.uuid4().hex[:16]
+
+
+class AlmacenSesiones(ABC):
+    """Interfaz común de los almacenes de exámenes."""
+
+    @abstractmethod
+    def crear(self, exam_id, user_name, level, topic, total_questions, adaptativo=False):
+        """Registra un examen nuevo; `adaptativo` indica que su largo depende de las respuestas (adaptativo.py)."""
+
+    @abstractmethod
+    def guardar_preguntas(self, exam_id, desde, preguntas):
+        """Guarda las preguntas `preguntas`, que ocupan las posiciones desde `desde` en el examen."""
+
+    @abstractmethod
+    def registrar_respuesta(self, exam_id, numero, respuesta, score, current_question_index, total_questions):
+        """Guarda la respuesta número `numero` y el avance del examen después de responderla."""
+
+    @abstractmethod
+    def finalizar(self, exam_id, finished_at, total_questions):
+        """Marca el examen como terminado en `finished_at`, con su largo final."""
+
+    @abstractmethod
+    def cargar(self, exam_id):
+        """
+        Retorna el estado del examen como diccionario con las mismas claves que
+        st.session_state (questions, user_answers, score, ...), o None si no existe.
+        """
+
+    @abstractmethod
+    def enunciados_de_estudiante(self, user_name, limite):
+        """
+        Retorna hasta `limite` enunciados de las preguntas de los exámenes de `user_name`,
+        empezando por el examen actualizado más recientemente (ver duplicados.historial_examen).
+        """
+
+
+class AlmacenSesionesMemoria(AlmacenSesiones):
+    """Almacén en memoria del proceso; útil para una sola réplica y para pruebas."""
+
+    def __init__(self):
+        self._examenes = {}
+        self._lock = threading.Lock()
+
+    def crear(self, exam_id, user_name, level, topic, total_questions, adaptativo=False):
+        with self._lock:
+            self._examenes[exam_id] = {
+                'exam_id': exam_id, 'user_name': user_name, 'exam_level': level, 'exam_topic': topic,
+                'total_questions': total_questions, 'score': 0, 'current_question_index': 0,
+                'questions': [], 'user_answers': [], 'exam_finished': False, 'exam_finished_at': None,
+                'exam_adaptativo': adaptativo,
+            }
+
+    def guardar_preguntas(self, exam_id, desde, preguntas):
+        with self._lock:
+            examen = self._examenes[exam_id]
+            examen['questions'][desde:desde + len(preguntas)] = list(preguntas)
+
+    def registrar_respuesta(self, exam_id, numero, respuesta, score, current_question_index, total_questions):
+        with self._lock:
+            examen = self._examenes[exam_id]
+            del examen['user_answers'][numero:]
+            examen['user_answers'].append(respuesta)
+            examen.update(score=score, current_question_index=current_question_index, total_questions=total_questions)
+
+    def finalizar(self, exam_id, finished_at, total_questions):
+        with self._lock:
+            self._examenes[exam_id].update(exam_finished=True, exam_finished_at=finished_at, total_questions=total_questions)
+
+    def cargar(self, exam_id):
+        with self._lock:
+            examen = self._examenes.get(exam_id)
+            if examen is None:
+                return None
+            return dict(examen, questions=list(examen['questions']), user_answers=list(examen['user_answers']))
+
+    def enunciados_de_estudiante(self, user_name, limite):
+        with self._lock:
+            # Los exámenes se guardan en orden de creación
+            enunciados = [p.question for examen in reversed(self._examenes.values())
+                          if examen['user_name'] == user_name for p in examen['questions']]
+        return enunciados[:limite]
+
+
+RUTA_SESIONES_POR_DEFECTO = os.environ.get("SESIONES_DB", "sesiones_examen.sqlite3")
+
+
+class AlmacenSesionesSQLite(AlmacenSesiones):
+    """
+    Almacén en un archivo SQLite (WAL), compartido por todas las réplicas que montan el
+    mismo archivo. Los exámenes sin cambios durante `retencion` segundos se eliminan al abrirlo.
+    """
+
+    def __init__(self, ruta=RUTA_SESIONES_POR_DEFECTO, retencion=30 * 24 * 3600):
+        self.ruta = ruta
+        with self._conectar() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """CREATE TABLE IF NOT EXISTS examenes (
+                       id TEXT PRIMARY KEY,
+                       user_name TEXT NOT NULL,
+                       nivel TEXT NOT NULL,
+                       tema TEXT NOT NULL,
+                       total INTEGER NOT NULL,
+                       score INTEGER NOT NULL DEFAULT 0,
+                       indice_actual INTEGER NOT NULL DEFAULT 0,
+                       terminado_en TEXT,
+                       adaptativo INTEGER NOT NULL DEFAULT 0,
+                       actualizado REAL NOT NULL
+                   );
+                   CREATE TABLE IF NOT EXISTS preguntas_examen (
+                       examen_id TEXT NOT NULL,
+                       indice INTEGER NOT NULL,
+                       datos TEXT NOT NULL,
+                       PRIMARY KEY (examen_id, indice)
+                   );
+                   CREATE TABLE IF NOT EXISTS respuestas_examen (
+                       examen_id TEXT NOT NULL,
+                       numero INTEGER NOT NULL,
+                       question_index INTEGER NOT NULL,
+                       user_choice_char TEXT NOT NULL,
+                       segundos REAL,
+                       PRIMARY KEY (examen_id, numero)
+                   );
+                   CREATE INDEX IF NOT EXISTS examenes_por_estudiante ON examenes (user_name, actualizado);"""
+            )
+            if retencion:
+                limite = time.time() - retencion
+                antiguos = "SELECT id FROM examenes WHERE actualizado < ?"
+                conn.execute(f"DELETE FROM preguntas_examen WHERE examen_id IN ({antiguos})", (limite,))
+                conn.execute(f"DELETE FROM respuestas_examen WHERE examen_id IN ({antiguos})", (limite,))
+                conn.execute("DELETE FROM examenes WHERE actualizado < ?", (limite,))
+
+    def _conectar(self):
+        # Una conexión por operación: sqlite3 no permite compartir conexiones entre hilos.
+        # closing(): `with conn` solo confirma la transacción, no cierra la conexión
+        return closing(sqlite3.connect(self.ruta, timeout=30))
+
+    def crear(self, exam_id, user_name, level, topic, total_questions, adaptativo=False):
+        with self._conectar() as conn, conn:
+            conn.execute(
+                "INSERT INTO examenes (id, user_name, nivel, tema, total, adaptativo, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (exam_id, user_name, level, topic, total_questions, int(adaptativo), time.time()),
+            )
+
+    def guardar_preguntas(self, exam_id, desde, preguntas):
+        if not preguntas:
+            return
+        with self._conectar() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO preguntas_examen (examen_id, indice, datos) VALUES (?, ?, ?)",
+                [(exam_id, desde + i, json.dumps(p.a_dict(), ensure_ascii=False)) for i, p in enumerate(preguntas)],
+            )
+            conn.execute("UPDATE examenes SET actualizado = ? WHERE id = ?", (time.time(), exam_id))
+
+    def registrar_respuesta(self, exam_id, numero, respuesta, score, current_question_index, total_questions):
+        # La respuesta y el avance se escriben en la misma transacción
+        with self._conectar() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas_examen (examen_id, numero, question_index, user_choice_char, segundos) VALUES (?, ?, ?, ?, ?)",
+                (exam_id, numero, respuesta.question_index, respuesta.user_choice_char, respuesta.segundos),
+            )
+            conn.execute(
+                "UPDATE examenes SET score = ?, indice_actual = ?, total = ?, actualizado = ? WHERE id = ?",
+                (score, current_question_index, total_questions, time.time(), exam_id),
+            )
+
+    def finalizar(self, exam_id, finished_at, total_questions):
+        with self._conectar() as conn, conn:
+            conn.execute(
+                "UPDATE examenes SET terminado_en = ?, total = ?, actualizado = ? WHERE id = ?",
+                (finished_at, total_questions, time.time(), exam_id),
+            )
+
+    def cargar(self, exam_id):
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT user_name, nivel, tema, total, score, indice_actual, terminado_en, adaptativo FROM examenes WHERE id = ?",
+                (exam_id,),
+            ).fetchone()
+            if fila is None:
+                return None
+            preguntas = conn.execute(
+                "SELECT datos FROM preguntas_examen WHERE examen_id = ? ORDER BY indice", (exam_id,)
+            ).fetchall()
+            respuestas = conn.execute(
+                "SELECT question_index, user_choice_char, segundos FROM respuestas_examen WHERE examen_id = ? ORDER BY numero",
+                (exam_id,),
+            ).fetchall()
+        user_name, nivel, tema, total, score, indice_actual, terminado_en, adaptativo = fila
+        return {
+            'exam_id': exam_id,
+            'user_name': user_name,
+            'exam_level': nivel,
+            'exam_topic': tema,
+            'total_questions': total,
+            'score': score,
+            'current_question_index': indice_actual,
+            'questions': [Question.desde_dict(json.loads(datos)) for (datos,) in preguntas],
+            'user_answers': [Answer(question_index, letra, segundos) for question_index, letra, segundos in respuestas],
+            'exam_finished': terminado_en is not None,
+            'exam_finished_at': terminado_en,
+            'exam_adaptativo': bool(adaptativo),
+        }
+
+    def enunciados_de_estudiante(self, user_name, limite):
+        with self._conectar() as conn:
+            filas = conn.execute(
+                """SELECT json_extract(p.datos, '$.question') FROM examenes e
+                   JOIN preguntas_examen p ON p.examen_id = e.id
+                   WHERE e.user_name = ? ORDER BY e.actualizado DESC, p.indice LIMIT ?""",
+                (user_name, limite),
+            ).fetchall()
+        return [enunciado for (enunciado,) in filas]
+
+
+def crear_almacen(nombre=None):
+    """Crea el almacén indicado ("sqlite" o "memoria"); por defecto usa SESIONES_ALMACEN."""
+    nombre = (nombre or os.environ.get("SESIONES_ALMACEN", "sqlite")).lower()
+    if nombre == "sqlite":
+        return AlmacenSesionesSQLite()
+    if nombre == "memoria":
+        return AlmacenSesionesMemoria()
+    raise ValueError(f"Almacén de sesiones desconocido: {nombre!r}")
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def almacen_global():
+    """Retorna el almacén de exámenes compartido por el proceso, creándolo la primera vez."""
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None:
+            _almacen = crear_almacen()
+        return _almacen
@@ -0,0 +1,533 @@
+import ipaddress
+import random
+import re
+
+from metricas import incrementar
+from modelos import Question
+
+# --- Motor local para los temas calculables (subredes, VLSM, clases IPv4, direcciones privadas) ---
+# Estos sub-temas son aritmética pura: las preguntas y ejercicios se generan aquí con
+# `ipaddress`, con parámetros al azar y distractores que corresponden a errores típicos
+# (confundir red y broadcast, olvidar restar 2 hosts, desplazarse un bloque...), y las
+# respuestas se califican de forma exacta sin llamar al modelo.
+# pregunta_local() retorna una Question igual a las que produce el parser de tutor.py, y
+# ejercicio_local() un EjercicioCalculable que sabe calificar la respuesta del estudiante.
+# Ambas retornan None si el tema no es calculable; en ese caso se usa el modelo.
+
+LETRAS = "ABCD"
+LETRAS_INCISOS = "abcdefgh"
+
+_RANGOS_PRIVADOS = tuple(ipaddress.ip_network(r) for r in ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"))
+
+_PREFIJOS_POR_NIVEL = {
+    "Básico": (8, 16, 24),
+    "Intermedio": tuple(range(17, 30)),
+    "Avanzado": tuple(range(9, 31)),
+}
+
+
+def es_privada(ip):
+    """Indica si `ip` pertenece a los rangos privados de la RFC 1918."""
+    return any(ip in red for red in _RANGOS_PRIVADOS)
+
+
+def clase_ipv4(ip):
+    """Clase (con clases) de la dirección según su primer octeto: "A" a "E"."""
+    primer_octeto = int(ip) >> 24
+    for limite, clase in ((128, "A"), (192, "B"), (224, "C"), (240, "D")):
+        if primer_octeto < limite:
+            return clase
+    return "E"
+
+
+_MASCARA_POR_CLASE = {"A": 8, "B": 16, "C": 24}
+
+
+def hosts_utiles(prefijo):
+    return 2 ** (32 - prefijo) - 2
+
+
+def prefijo_para_hosts(hosts):
+    """Prefijo más largo cuya subred admite `hosts` hosts utilizables."""
+    return 32 - (hosts + 1).bit_length()
+
+
+def _red(ip, prefijo):
+    return ipaddress.ip_network(f"{ip}/{prefijo}", strict=False)
+
+
+def _prefijo(rng, nivel):
+    return rng.choice(_PREFIJOS_POR_NIVEL.get(nivel, _PREFIJOS_POR_NIVEL["Intermedio"]))
+
+
+def _interfaz_aleatoria(rng, nivel, prefijo=None):
+    """Dirección de host privada al azar con su prefijo, que no es ni la red ni el broadcast."""
+    prefijo = prefijo or _prefijo(rng, nivel)
+    rango = rng.choice(_RANGOS_PRIVADOS)
+    while True:
+        interfaz = ipaddress.ip_interface(f"{rango[rng.randrange(rango.num_addresses)]}/{prefijo}")
+        if interfaz.ip not in (interfaz.network.network_address, interfaz.network.broadcast_address):
+            return interfaz
+
+
+def _ip_con_primer_octeto(rng, primer_octeto):
+    return ipaddress.ip_address((primer_octeto << 24) | rng.randrange(1, 2 ** 24 - 1))
+
+
+def _ip_publica(rng):
+    """Dirección pública parecida a una privada, para distractores."""
+    opciones = (
+        lambda: f"172.{rng.choice((rng.randint(1, 15), rng.randint(32, 254)))}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        lambda: f"192.{rng.choice((167, 169, 172))}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        lambda: f"{rng.choice((9, 11, 100))}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        lambda: f"168.192.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+    )
+    return ipaddress.ip_address(rng.choice(opciones)())
+
+
+def _asignar_vlsm(red, hosts_por_segmento):
+    """Asigna subredes contiguas desde el inicio de `red`, de mayor a menor. Retorna [(hosts, subred)]."""
+    asignadas = []
+    siguiente = red.network_address
+    for hosts in sorted(hosts_por_segmento, reverse=True):
+        subred = _red(siguiente, prefijo_para_hosts(hosts))
+        asignadas.append((hosts, subred))
+        siguiente = subred.broadcast_address + 1
+    return asignadas
+
+
+def _asignar_vlsm_ascendente(red, hosts_por_segmento):
+    """Asignación de menor a mayor (un error común), alineando cada subred a su tamaño."""
+    asignadas = []
+    siguiente = red.network_address
+    for hosts in sorted(hosts_por_segmento):
+        prefijo = prefijo_para_hosts(hosts)
+        tamano = 2 ** (32 - prefijo)
+        inicio = ipaddress.ip_address(-(-int(siguiente) // tamano) * tamano)
+        subred = _red(inicio, prefijo)
+        asignadas.append((hosts, subred))
+        siguiente = subred.broadcast_address + 1
+    return asignadas
+
+
+def _segmentos_vlsm(rng, red, cantidad):
+    """Requerimientos de hosts al azar (distintos) que caben en `red` con VLSM."""
+    maximo = max(2, red.num_addresses // 3)
+    while True:
+        hosts = rng.sample(range(2, maximo), cantidad)
+        if sum(2 ** (32 - prefijo_para_hosts(h)) for h in hosts) <= red.num_addresses:
+            return sorted(hosts, reverse=True)
+
+
+def _red_vlsm(rng, nivel):
+    prefijo = rng.choice((22, 23, 24)) if nivel == "Avanzado" else 24
+    return _interfaz_aleatoria(rng, nivel, prefijo=prefijo).network
+
+
+# --- Preguntas de opción múltiple ---
+# Cada generador retorna (enunciado, correcta, distractores, explicación) como textos.
+
+def _p_direccion_red(rng, nivel):
+    interfaz = _interfaz_aleatoria(rng, nivel)
+    red, prefijo = interfaz.network, interfaz.network.prefixlen
+    distractores = [
+        f"{interfaz.ip}/{prefijo}",
+        f"{red.broadcast_address}/{prefijo}",
+        f"{red.broadcast_address + 1}/{prefijo}",
+        str(_red(interfaz.ip, prefijo - 1)),
+        str(_red(interfaz.ip, min(prefijo + 1, 30))),
+    ]
+    explicacion = (f"La máscara /{prefijo} ({red.netmask}) deja {32 - prefijo} bits de host; "
+                   f"al ponerlos en 0 en {interfaz.ip} se obtiene la red {red.network_address}.")
+    return f"¿Cuál es la dirección de red de la interfaz {interfaz}?", str(red), distractores, explicacion
+
+
+def _p_broadcast(rng, nivel):
+    interfaz = _interfaz_aleatoria(rng, nivel)
+    red = interfaz.network
+    distractores = [
+        str(red.network_address),
+        str(red.broadcast_address - 1),
+        str(_red(interfaz.ip, red.prefixlen - 1).broadcast_address),
+        str(_red(interfaz.ip, min(red.prefixlen + 1, 30)).broadcast_address),
+        str(red.broadcast_address + 1),
+    ]
+    explicacion = (f"El broadcast se obtiene poniendo en 1 los {32 - red.prefixlen} bits de host de la red "
+                   f"{red}: {red.broadcast_address}.")
+    return f"¿Cuál es la dirección de broadcast de la subred de {interfaz}?", str(red.broadcast_address), distractores, explicacion
+
+
+def _p_hosts_utiles(rng, nivel):
+    prefijo = min(_prefijo(rng, nivel), 30)
+    bits = 32 - prefijo
+    distractores = [str(2 ** bits), str(2 ** bits - 1), str(2 ** (bits - 1) - 2), str(2 ** (bits + 1) - 2)]
+    explicacion = f"Con /{prefijo} quedan {bits} bits de host: 2^{bits} - 2 = {hosts_utiles(prefijo)} (se restan la red y el broadcast)."
+    mascara = ipaddress.ip_network(f"0.0.0.0/{prefijo}").netmask
+    return (f"¿Cuántos hosts utilizables tiene una subred /{prefijo} (máscara {mascara})?",
+            str(hosts_utiles(prefijo)), distractores, explicacion)
+
+
+def _p_mascara(rng, nivel):
+    prefijo = _prefijo(rng, nivel)
+    red = ipaddress.ip_network(f"0.0.0.0/{prefijo}")
+    distractores = [str(red.hostmask)] + [
+        str(ipaddress.ip_network(f"0.0.0.0/{p}").netmask) for p in (prefijo - 1, prefijo + 1, prefijo - 8, prefijo + 8)
+        if 0 < p <= 32
+    ]
+    explicacion = f"/{prefijo} son {prefijo} bits en 1 seguidos de {32 - prefijo} bits en 0: {red.netmask}."
+    return f"¿Qué máscara en decimal punteado corresponde al prefijo /{prefijo}?", str(red.netmask), distractores, explicacion
+
+
+def _p_rango_hosts(rng, nivel):
+    red = _interfaz_aleatoria(rng, nivel, prefijo=min(_prefijo(rng, nivel), 30)).network
+    primero, ultimo = red.network_address + 1, red.broadcast_address - 1
+    siguiente = _red(red.broadcast_address + 1, red.prefixlen)
+    distractores = [
+        f"{red.network_address} – {red.broadcast_address}",
+        f"{primero} – {red.broadcast_address}",
+        f"{red.network_address} – {ultimo}",
+        f"{siguiente.network_address + 1} – {siguiente.broadcast_address - 1}",
+    ]
+    explicacion = f"Los hosts van desde la red + 1 ({primero}) hasta el broadcast - 1 ({ultimo})."
+    return f"¿Cuál es el rango de hosts utilizables de la subred {red}?", f"{primero} – {ultimo}", distractores, explicacion
+
+
+def _p_prefijo_subredes(rng, nivel):
+    subredes = rng.randint(3, 12 if nivel == "Básico" else 60)
+    bits = (subredes - 1).bit_length()
+    red = _interfaz_aleatoria(rng, nivel, prefijo=min(_prefijo(rng, nivel), 30 - bits)).network
+    nuevo = red.prefixlen + bits
+
+    def texto(prefijo):
+        return f"/{prefijo} ({ipaddress.ip_network(f'0.0.0.0/{prefijo}').netmask})"
+
+    distractores = [texto(p) for p in (nuevo - 1, nuevo + 1, nuevo + 2, nuevo - 2) if red.prefixlen < p <= 30]
+    explicacion = (f"Hacen falta {bits} bits prestados porque 2^{bits} = {2 ** bits} ≥ {subredes}; "
+                   f"/{red.prefixlen} + {bits} = /{nuevo}.")
+    return (f"La red {red} debe dividirse en al menos {subredes} subredes del mismo tamaño, con la mayor cantidad "
+            f"de hosts posible en cada una. ¿Qué prefijo usa cada subred?", texto(nuevo), distractores, explicacion)
+
+
+def _p_vlsm(rng, nivel):
+    red = _red_vlsm(rng, nivel)
+    hosts = _segmentos_vlsm(rng, red, 4 if nivel == "Avanzado" else 3)
+    asignadas = _asignar_vlsm(red, hosts)
+    posicion = rng.randrange(1, len(asignadas))
+    pedido, correcta = asignadas[posicion]
+    anterior = asignadas[posicion - 1][1]
+    # Errores típicos: no reservar red y broadcast, asignar de menor a mayor, repartir en partes iguales
+    sin_reserva = _red(correcta.network_address, 32 - max(1, (pedido - 1).bit_length()))
+    ascendente = dict(_asignar_vlsm_ascendente(red, hosts))[pedido]
+    iguales = list(red.subnets(prefixlen_diff=(len(hosts) - 1).bit_length()))[posicion]
+    distractores = [str(sin_reserva), str(ascendente), str(iguales), str(_red(anterior.network_address, correcta.prefixlen)),
+                    str(_red(correcta.network_address, correcta.prefixlen - 1))]
+    requerimientos = ", ".join(str(h) for h in hosts)
+    explicacion = (f"Se asigna de mayor a menor desde {red.network_address}: "
+                   + "; ".join(f"{h} hosts → {s}" for h, s in asignadas) + ".")
+    return (f"Con VLSM se reparte la red {red} entre segmentos de {requerimientos} hosts, asignando primero el más "
+            f"grande. ¿Qué subred recibe el segmento de {pedido} hosts?", str(correcta), distractores, explicacion)
+
+
+def _primer_octeto_de_clase(rng, clase):
+    desde, hasta = {"A": (1, 126), "B": (128, 191), "C": (192, 223), "D": (224, 239), "E": (240, 254)}[clase]
+    return rng.randint(desde, hasta)
+
+
+def _p_clase(rng, nivel):
+    clase = rng.choice("ABC" if nivel == "Básico" else "ABCDE")
+    ip = _ip_con_primer_octeto(rng, _primer_octeto_de_clase(rng, clase))
+    distractores = [f"Clase {c}" for c in rng.sample([c for c in "ABCDE" if c != clase], 4)]
+    explicacion = (f"El primer octeto es {int(ip) >> 24}: A = 1-126, B = 128-191, C = 192-223, "
+                   f"D (multicast) = 224-239, E (experimental) = 240-255. Por lo tanto es clase {clase}.")
+    return f"¿A qué clase pertenece la dirección {ip}?", f"Clase {clase}", distractores, explicacion
+
+
+def _p_mascara_por_defecto(rng, nivel):
+    clase = rng.choice("ABC")
+    ip = _ip_con_primer_octeto(rng, _primer_octeto_de_clase(rng, clase))
+    correcta = ipaddress.ip_network(f"0.0.0.0/{_MASCARA_POR_CLASE[clase]}").netmask
+    distractores = ["255.0.0.0", "255.255.0.0", "255.255.255.0", "255.255.255.255", "255.255.255.128"]
+    explicacion = f"{ip} es de clase {clase} y su máscara por defecto es /{_MASCARA_POR_CLASE[clase]} ({correcta})."
+    return f"¿Cuál es la máscara por defecto (direccionamiento con clases) de {ip}?", str(correcta), distractores, explicacion
+
+
+def _p_privada(rng, nivel):
+    rango = rng.choice(_RANGOS_PRIVADOS)
+    ip = rango[rng.randrange(1, rango.num_addresses - 1)]
+    distractores = [str(_ip_publica(rng)) for _ in range(5)]
+    explicacion = (f"{ip} está dentro de {rango}. Los rangos privados de la RFC 1918 son 10.0.0.0/8, "
+                   f"172.16.0.0/12 (172.16.0.0 a 172.31.255.255) y 192.168.0.0/16.")
+    return "¿Cuál de las siguientes direcciones es privada según la RFC 1918?", str(ip), distractores, explicacion
+
+
+_PREGUNTAS = {
+    "Máscaras de subred y cálculo": (_p_direccion_red, _p_broadcast, _p_hosts_utiles, _p_mascara),
+    "Subredes": (_p_direccion_red, _p_rango_hosts, _p_prefijo_subredes, _p_broadcast),
+    "VLSM": (_p_vlsm,),
+    "Direccionamiento IPv4 y Clases": (_p_clase, _p_mascara_por_defecto),
+    "Direccionamiento IPv4 Privado": (_p_privada,),
+}
+
+
+def es_calculable(tema):
+    """Indica si las preguntas de `tema` se generan localmente."""
+    return tema in _PREGUNTAS
+
+
+def _armar_pregunta(rng, sub_tema, enunciado, correcta, distractores, explicacion):
+    opciones = [correcta]
+    for distractor in distractores:
+        if distractor not in opciones:
+            opciones.append(distractor)
+        if len(opciones) == len(LETRAS):
+            break
+    else:
+        return None
+    rng.shuffle(opciones)
+    return Question(
+        question=enunciado,
+        options=tuple(f"{letra}) {opcion}" for letra, opcion in zip(LETRAS, opciones)),
+        correct_answer_char=LETRAS[opciones.index(correcta)],
+        explanation=explicacion,
+        sub_tema=sub_tema,
+    )
+
+
+def pregunta_local(tema, nivel, rng=random):
+    """Genera una pregunta de opción múltiple de `tema`, o None si el tema no es calculable."""
+    generadores = _PREGUNTAS.get(tema)
+    if not generadores:
+        return None
+    while True:
+        # Con pocos bits de host algunos distractores coinciden; se sortean otros parámetros
+        pregunta = _armar_pregunta(rng, tema, *rng.choice(generadores)(rng, nivel))
+        if pregunta is not None:
+            incrementar("generacion_local_total", tipo="pregunta")
+            return pregunta
+
+
+# --- Ejercicios con calificación exacta ---
+
+_IP = r"\d{1,3}(?:\.\d{1,3}){3}"
+_RE_IP = re.compile(rf"(?<![\d.])({_IP})(?![\d.])")
+_RE_RED = re.compile(rf"({_IP})\s*(?:/\s*({_IP}|\d{{1,2}})|\s+(?:m[aá]scara\s+)?(255(?:\.\d{{1,3}}){{3}}))", re.I)
+_RE_ETIQUETA = re.compile(r"^\s*\(?([a-hA-H])[\)\.:\-]\s*")
+_RE_ENTERO = re.compile(r"\d+")
+
+
+def _leer_valor(tipo, texto):
+    """Extrae de `texto` un valor del tipo indicado, o None si no se encuentra."""
+    if tipo == "ip":
+        coincidencia = _RE_IP.search(texto)
+        try:
+            return ipaddress.ip_address(coincidencia.group(1)) if coincidencia else None
+        except ValueError:
+            return None
+    if tipo == "red":
+        coincidencia = _RE_RED.search(texto)
+        if not coincidencia:
+            return None
+        try:
+            # strict=True: una dirección de host con prefijo no es la dirección de red
+            return ipaddress.ip_network(f"{coincidencia.group(1)}/{coincidencia.group(2) or coincidencia.group(3)}")
+        except ValueError:
+            return None
+    if tipo == "entero":
+        texto = _RE_IP.sub(" ", texto)
+        # "2^6 - 2 = 62": cuenta el resultado, no la fórmula
+        enteros = _RE_ENTERO.findall(texto.rsplit("=", 1)[-1])
+        return int(enteros[0]) if enteros else None
+    if tipo == "clase":
+        coincidencia = re.search(r"clase\s+([a-e])\b", texto, re.I) or re.fullmatch(r"\s*([a-eA-E])\s*\.?\s*", texto) \
+            or re.search(r"\b([A-E])\b", texto)
+        return coincidencia.group(1).upper() if coincidencia else None
+    if tipo == "privada":
+        texto = texto.lower()
+        # Las negaciones primero: "no es pública" contiene "públic"
+        if re.search(r"no\s+es\s+p[uú]blic", texto):
+            return True
+        if re.search(r"p[uú]blic|no\s+es\s+privad", texto):
+            return False
+        if "privad" in texto:
+            return True
+        return None
+    raise ValueError(f"Tipo de inciso desconocido: {tipo!r}")
+
+
+def _formatear(tipo, valor):
+    if tipo == "clase":
+        return f"Clase {valor}"
+    if tipo == "privada":
+        return "privada" if valor else "pública"
+    return str(valor)
+
+
+def _respuestas_por_inciso(respuesta, cantidad):
+    """
+    Reparte las líneas de la respuesta entre los incisos: las líneas con etiqueta ("b) ...")
+    van a su inciso y las demás ocupan, en orden, los incisos todavía vacíos.
+    """
+    asignadas = [None] * cantidad
+    for linea in respuesta.splitlines():
+        if not linea.strip():
+            continue
+        etiqueta = _RE_ETIQUETA.match(linea)
+        if etiqueta and ord(etiqueta.group(1).lower()) - ord("a") < cantidad:
+            asignadas[ord(etiqueta.group(1).lower()) - ord("a")] = linea[etiqueta.end():]
+            continue
+        libres = [i for i, texto in enumerate(asignadas) if texto is None]
+        if not libres:
+            break
+        asignadas[libres[0]] = linea
+    return asignadas
+
+
+class EjercicioCalculable:
+    """
+    Ejercicio con incisos de respuesta única.
+    - `enunciado`: texto en Markdown para mostrar al estudiante.
+    - `incisos`: tuplas (descripción, tipo, valor esperado); tipo es "ip", "red", "entero", "clase" o "privada".
+    - `solucion`: desarrollo paso a paso en Markdown.
+    """
+
+    __slots__ = ("enunciado", "incisos", "solucion")
+
+    def __init__(self, planteamiento, incisos, solucion):
+        self.incisos = tuple(incisos)
+        self.solucion = solucion
+        lineas = "\n".join(f"- **{LETRAS_INCISOS[i]})** {descripcion}" for i, (descripcion, _, _) in enumerate(self.incisos))
+        self.enunciado = (f"{planteamiento}\n\n{lineas}\n\n"
+                          f"_Responde con una línea por inciso, por ejemplo: `a) 192.168.1.0/24`._")
+
+    def calificar(self, respuesta):
+        """Retorna (aciertos, total, retroalimentación en Markdown)."""
+        aciertos = 0
+        lineas = []
+        for i, ((descripcion, tipo, esperado), texto) in enumerate(zip(self.incisos, _respuestas_por_inciso(respuesta, len(self.incisos)))):
+            valor = _leer_valor(tipo, texto) if texto is not None else None
+            etiqueta = LETRAS_INCISOS[i]
+            if valor == esperado:
+                aciertos += 1
+                lineas.append(f"- ✅ **{etiqueta})** {descripcion}: `{_formatear(tipo, esperado)}`")
+            else:
+                leida = "no respondiste" if texto is None or not texto.strip() else f"respondiste `{texto.strip()}`"
+                lineas.append(f"- ❌ **{etiqueta})** {descripcion}: {leida}; "
+                              f"lo correcto es `{_formatear(tipo, esperado)}`")
+        incrementar("generacion_local_total", tipo="calificacion")
+        total = len(self.incisos)
+        resultado = "¡Todo correcto! 🎉" if aciertos == total else f"{aciertos} de {total} incisos correctos."
+        retroalimentacion = f"**Resultado:** {resultado}\n\n" + "\n".join(lineas) + f"\n\n### Solución paso a paso\n\n{self.solucion}"
+        return aciertos, total, retroalimentacion
+
+
+
+def _e_analisis_interfaz(rng, nivel):
+    interfaz = _interfaz_aleatoria(rng, nivel, prefijo=min(_prefijo(rng, nivel), 30))
+    red, prefijo = interfaz.network, interfaz.network.prefixlen
+    primero, ultimo = red.network_address + 1, red.broadcast_address - 1
+    solucion = (
+        f"1. /{prefijo} equivale a la máscara {red.netmask}: quedan {32 - prefijo} bits de host.\n"
+        f"2. Red: {interfaz.ip} AND {red.netmask} = **{red}**.\n"
+        f"3. Broadcast: bits de host en 1 = **{red.broadcast_address}**.\n"
+        f"4. Hosts utilizables: de **{primero}** a **{ultimo}**.\n"
+        f"5. Cantidad: 2^{32 - prefijo} - 2 = **{hosts_utiles(prefijo)}**."
+    )
+    return EjercicioCalculable(
+        f"Para la interfaz **{interfaz}** calcula:",
+        [("Dirección de red (con prefijo)", "red", red),
+         ("Dirección de broadcast", "ip", red.broadcast_address),
+         ("Primer host utilizable", "ip", primero),
+         ("Último host utilizable", "ip", ultimo),
+         ("Cantidad de hosts utilizables", "entero", hosts_utiles(prefijo))],
+        solucion,
+    )
+
+
+def _e_division_subredes(rng, nivel):
+    subredes = rng.randint(3, 12 if nivel == "Básico" else 60)
+    bits = (subredes - 1).bit_length()
+    red = _interfaz_aleatoria(rng, nivel, prefijo=min(_prefijo(rng, nivel), 30 - bits)).network
+    nuevo = red.prefixlen + bits
+    numero = rng.randint(2, min(subredes, 2 ** bits))
+    subred = _red(red.network_address + (numero - 1) * 2 ** (32 - nuevo), nuevo)
+    solucion = (
+        f"1. Bits prestados: 2^{bits} = {2 ** bits} ≥ {subredes}, así que se toman {bits} bits.\n"
+        f"2. Nuevo prefijo: /{red.prefixlen} + {bits} = **/{nuevo}** ({subred.netmask}).\n"
+        f"3. Hosts por subred: 2^{32 - nuevo} - 2 = **{hosts_utiles(nuevo)}**.\n"
+        f"4. Cada subred avanza {2 ** (32 - nuevo)} direcciones; la subred número {numero} empieza en "
+        f"{red.network_address} + {numero - 1} × {2 ** (32 - nuevo)} = **{subred}**.\n"
+        f"5. Su broadcast es **{subred.broadcast_address}**."
+    )
+    return EjercicioCalculable(
+        f"La red **{red}** debe dividirse en al menos **{subredes}** subredes del mismo tamaño, "
+        f"con la mayor cantidad de hosts posible en cada una (numeradas desde 1 a partir de {red.network_address}).",
+        [("Prefijo de cada subred", "entero", nuevo),
+         ("Hosts utilizables por subred", "entero", hosts_utiles(nuevo)),
+         (f"Dirección de la subred número {numero} (con prefijo)", "red", subred),
+         (f"Broadcast de la subred número {numero}", "ip", subred.broadcast_address)],
+        solucion,
+    )
+
+
+def _e_vlsm(rng, nivel):
+    red = _red_vlsm(rng, nivel)
+    hosts = _segmentos_vlsm(rng, red, 4 if nivel == "Avanzado" else 3)
+    asignadas = _asignar_vlsm(red, hosts)
+    solucion = "\n".join(
+        f"{i}. {h} hosts necesitan 2^{32 - s.prefixlen} = {s.num_addresses} direcciones (/{s.prefixlen}) → **{s}**."
+        for i, (h, s) in enumerate(asignadas, start=1)
+    )
+    return EjercicioCalculable(
+        f"Aplica VLSM a la red **{red}**: asigna a cada segmento la subred más pequeña que lo admita, "
+        f"empezando por el segmento más grande y de forma contigua desde {red.network_address}.",
+        [(f"Segmento de {h} hosts (dirección de red con prefijo)", "red", s) for h, s in asignadas],
+        "Se ordenan los segmentos de mayor a menor:\n\n" + solucion,
+    )
+
+
+def _e_clases(rng, nivel):
+    ips = [_ip_con_primer_octeto(rng, _primer_octeto_de_clase(rng, rng.choice("ABC" if nivel == "Básico" else "ABCDE")))
+           for _ in range(4)]
+    clases = [clase_ipv4(ip) for ip in ips]
+    solucion = ("Se mira el primer octeto: A = 1-126, B = 128-191, C = 192-223, D = 224-239, E = 240-255.\n\n"
+                + "\n".join(f"- {ip}: primer octeto {int(ip) >> 24} → **clase {c}**" for ip, c in zip(ips, clases)))
+    return EjercicioCalculable(
+        "Indica la clase (A, B, C, D o E) de cada dirección:",
+        [(str(ip), "clase", c) for ip, c in zip(ips, clases)],
+        solucion,
+    )
+
+
+def _e_privadas(rng, nivel):
+    ips = []
+    for _ in range(5):
+        if rng.random() < 0.5:
+            rango = rng.choice(_RANGOS_PRIVADOS)
+            ips.append(rango[rng.randrange(1, rango.num_addresses - 1)])
+        else:
+            ips.append(_ip_publica(rng))
+    solucion = ("Los rangos privados (RFC 1918) son 10.0.0.0/8, 172.16.0.0/12 y 192.168.0.0/16.\n\n"
+                + "\n".join(f"- {ip} → **{_formatear('privada', es_privada(ip))}**" for ip in ips))
+    return EjercicioCalculable(
+        "Indica si cada dirección es **privada** o **pública**:",
+        [(str(ip), "privada", es_privada(ip)) for ip in ips],
+        solucion,
+    )
+
+
+_EJERCICIOS = {
+    "Máscaras de subred y cálculo": (_e_analisis_interfaz,),
+    "Subredes": (_e_analisis_interfaz, _e_division_subredes, _e_vlsm),
+    "VLSM": (_e_vlsm,),
+    "Direccionamiento IPv4 y Clases": (_e_clases,),
+    "Direccionamiento IPv4 Privado": (_e_privadas,),
+}
+
+
+def ejercicio_local(tema, nivel, rng=random):
+    """Genera un EjercicioCalculable de `tema`, o None si el tema no es calculable."""
+    generadores = _EJERCICIOS.get(tema)
+    if not generadores:
+        return None
+    incrementar("generacion_local_total", tipo="ejercicio")
+    return rng.choice(generadores)(rng, nivel)
@@ -0,0 +1,30 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# --- Envío acotado de trabajos a un pool, para los comandos masivos ---
+# exportar_reportes.py y calificar_tareas.py recorren archivos de miles de líneas: se leen en
+# streaming y solo hay unos pocos trabajos en vuelo a la vez, así que la memoria no crece con
+# el tamaño de la entrada y los resultados se escriben a medida que terminan.
+
+
+def _recoger(pendientes, bloquear):
+    if not pendientes:
+        return
+    listos, _ = wait(pendientes, timeout=None if bloquear else 0, return_when=FIRST_COMPLETED)
+    for futuro in listos:
+        yield pendientes.pop(futuro), futuro
+
+
+def enviar_acotado(pool, funcion, trabajos, max_en_vuelo):
+    """
+    Envía `funcion(*argumentos)` al `pool` por cada (etiqueta, argumentos) de `trabajos`, con
+    a lo sumo `max_en_vuelo` llamadas sin terminar, y genera (etiqueta, futuro) en orden de
+    llegada. `trabajos` se consume de a poco, solo cuando hay lugar para otra llamada.
+    """
+    pendientes = {}
+    for etiqueta, argumentos in trabajos:
+        while len(pendientes) >= max_en_vuelo:
+            yield from _recoger(pendientes, bloquear=True)
+        pendientes[pool.submit(funcion, *argumentos)] = etiqueta
+        yield from _recoger(pendientes, bloquear=False)
+    while pendientes:
+        yield from _recoger(pendientes, bloquear=True)
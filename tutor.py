@@ -0,0 +1,346 @@
+import asyncio
+import json
+import random
+import time
+
+from backends import backend_global
+from cache_respuestas import cache_explicaciones, clave_cache
+from coalescencia import coalescedor, coalescible
+from metricas import incrementar, registrar_llamada_modelo
+from modelos import Question
+from parseo_preguntas import analizar_pregunta
+
+# Las funciones del tutor no dependen de Streamlit: las usan la app, los scripts por lotes
+# y los benchmarks. Todas hablan con el modelo a través del backend compartido (backends.py).
+
+# --- Prompts (compartidos por las versiones síncronas y asíncronas) ---
+# Cada llamada envía una instrucción de sistema fija (INSTRUCCION_SISTEMA), un contexto
+# estable opcional (formato de salida o ejercicio en curso, cacheable en el modelo; ver
+# backends.py) y un prompt corto con lo que cambia en cada llamada.
+
+INSTRUCCION_SISTEMA = """Eres un tutor experto en Arquitectura de Redes para estudiantes universitarios. Respondes en español, de forma clara, concisa y paso a paso, con ejemplos cuando son pertinentes y en formato Markdown (por ejemplo, listas numeradas para los pasos)."""
+
+FORMATO_PREGUNTA_MC = """Cuando se te pida una pregunta de opción múltiple, debe ser nueva, original, diferente a las anteriores y variada, con 4 opciones de respuesta (A, B, C, D), de las cuales solo una es correcta.
+Formatea la salida estrictamente de la siguiente manera, sin texto adicional antes o después de este formato:
+
+Pregunta: [Tu pregunta aquí]
+A) [Opción A]
+B) [Opción B]
+C) [Opción C]
+D) [Opción D]
+Respuesta Correcta: [Letra de la opción correcta, por ejemplo, A]
+Explicación: [Breve explicación de por qué la respuesta es correcta]"""
+
+CRITERIOS_EVALUACION = """Tu tarea es evaluar la respuesta de un estudiante al problema indicado abajo y proporcionar retroalimentación detallada:
+- Primero, indica si la respuesta del estudiante es correcta o incorrecta.
+- Si es incorrecta, explica *por qué* es incorrecta, señalando los errores conceptuales o de cálculo.
+- Luego, proporciona la solución *completa y detallada* paso a paso del ejercicio original."""
+
+def _prompt_explicacion(tema):
+    return f"Explica el concepto de {tema} como si se lo explicaras a un estudiante universitario."
+
+def _prompt_ejercicio(tema, nivel):
+    return f"Crea un problema nuevo y original sobre {tema} para un estudiante de nivel {nivel}, relevante para el tema y el nivel de dificultad. No incluyas la solución."
+
+def _contexto_evaluacion(ejercicio):
+    # El ejercicio es el mismo en todos los intentos del estudiante: va en el contexto cacheable
+    return f"{CRITERIOS_EVALUACION}\n\nProblema: {ejercicio}"
+
+def _prompt_evaluacion(respuesta_estudiante):
+    return f"Respuesta del estudiante: {respuesta_estudiante}"
+
+def _prompt_pregunta_multiple_choice(tema, nivel):
+    return f'Crea una pregunta de opción múltiple sobre **"{tema}"** para un estudiante de nivel **"{nivel}"**.'
+
+# --- Funciones Core del Chatbot ---
+
+def _clave_llamada(prompt, opciones):
+    """Clave de coalescencia: modelo, prompt y opciones (contexto, configuración de generación)."""
+    return clave_cache(backend_global().model_name, INSTRUCCION_SISTEMA + prompt, repr(sorted(opciones.items())))
+
+def _generar(funcion, prompt, coalescer=True, **opciones):
+    """
+    Llama al modelo con la instrucción de sistema del tutor y registra latencia, tokens
+    y errores bajo el nombre `funcion`. `opciones` puede incluir `contexto` (ver backends.py).
+    Las llamadas concurrentes idénticas comparten una sola llamada al modelo (ver coalescencia.py),
+    salvo con `coalescer=False` o si `funcion` está excluida.
+    """
+    if coalescer and coalescible(funcion):
+        return coalescedor.hacer(_clave_llamada(prompt, opciones),
+                                 lambda: _generar(funcion, prompt, coalescer=False, **opciones), funcion)
+    inicio = time.perf_counter()
+    try:
+        respuesta = backend_global().generate(prompt, instruccion_sistema=INSTRUCCION_SISTEMA, **opciones)
+    except Exception as e:
+        registrar_llamada_modelo(funcion, time.perf_counter() - inicio, error=e)
+        raise
+    registrar_llamada_modelo(funcion, time.perf_counter() - inicio, respuesta)
+    return respuesta
+
+def _texto_fragmento(chunk):
+    """
+    Texto de un fragmento del stream. En google-generativeai, `.text` lanza ValueError si el
+    fragmento no trae partes (fin del stream, filtro de seguridad o solo uso de tokens).
+    """
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+def _stream_texto(funcion, prompt, coalescer=True, **opciones):
+    """Generador que entrega el texto de la respuesta del modelo a medida que llega."""
+    if coalescer and coalescible(funcion):
+        yield from coalescedor.hacer_stream(_clave_llamada(prompt, opciones),
+                                            lambda: _stream_texto(funcion, prompt, coalescer=False, **opciones), funcion)
+        return
+    inicio = time.perf_counter()
+    primer_token = None
+    ultimo = None
+    try:
+        for chunk in backend_global().generate_stream(prompt, instruccion_sistema=INSTRUCCION_SISTEMA, **opciones):
+            # El fragmento se guarda aunque no traiga texto: el uso de tokens llega en el último
+            ultimo = chunk
+            texto = _texto_fragmento(chunk)
+            if texto:
+                if primer_token is None:
+                    primer_token = time.perf_counter() - inicio
+                yield texto
+    except Exception as e:
+        registrar_llamada_modelo(funcion, time.perf_counter() - inicio, error=e, primer_token=primer_token)
+        raise
+    # En streaming, el uso de tokens llega en el último fragmento
+    registrar_llamada_modelo(funcion, time.perf_counter() - inicio, ultimo, primer_token=primer_token)
+
+def _stream_y_guardar(chunks, clave, cache):
+    """Reenvía los fragmentos y, al terminar el stream, guarda el texto completo en la caché."""
+    partes = []
+    for parte in chunks:
+        partes.append(parte)
+        yield parte
+    cache.guardar(clave, "".join(partes))
+
+def explicar_concepto(tema, regenerar=False, stream=False):
+    """
+    Genera una explicación detallada de un concepto de red.
+    Las explicaciones se guardan en una caché compartida por todas las sesiones;
+    con `regenerar=True` se pide una explicación nueva al modelo.
+    Con `stream=True` retorna un generador de fragmentos de texto.
+    """
+    prompt = _prompt_explicacion(tema)
+    backend = backend_global()
+    clave = clave_cache(backend.model_name, INSTRUCCION_SISTEMA + prompt, tema)
+    cache = cache_explicaciones()
+    # Una explicación regenerada debe ser nueva: no se comparte con otra llamada en curso
+    if not stream:
+        return cache.obtener_o_calcular(clave, lambda: _generar('explicar_concepto', prompt, coalescer=not regenerar).text,
+                                        regenerar=regenerar)
+    guardada = None if regenerar else cache.obtener(clave)
+    if guardada is not None:
+        return iter([guardada])
+    return _stream_y_guardar(_stream_texto('explicar_concepto', prompt, coalescer=not regenerar), clave, cache)
+
+def generar_ejercicio(tema, nivel, stream=False):
+    """
+    Crea un problema nuevo y original sobre un tema específico para un nivel dado.
+    Con `stream=True` retorna un generador de fragmentos de texto.
+    """
+    prompt = _prompt_ejercicio(tema, nivel)
+    if stream:
+        return _stream_texto('generar_ejercicio', prompt)
+    response = _generar('generar_ejercicio', prompt)
+    return response.text
+
+def evaluar_respuesta_y_dar_feedback(ejercicio, respuesta_estudiante, stream=False):
+    """
+    Evalúa la respuesta de un estudiante a un ejercicio y proporciona retroalimentación.
+    Con `stream=True` retorna un generador de fragmentos de texto.
+    """
+    prompt = _prompt_evaluacion(respuesta_estudiante)
+    contexto = _contexto_evaluacion(ejercicio)
+    if stream:
+        return _stream_texto('evaluar_respuesta_y_dar_feedback', prompt, contexto=contexto)
+    response = _generar('evaluar_respuesta_y_dar_feedback', prompt, contexto=contexto)
+    return response.text
+
+def generar_pregunta_multiple_choice(tema, nivel):
+    """
+    Crea una pregunta de opción múltiple con 4 opciones, una correcta y una explicación.
+    Se enfatiza la originalidad para evitar repeticiones.
+    """
+    prompt = _prompt_pregunta_multiple_choice(tema, nivel)
+    response = _generar('generar_pregunta_multiple_choice', prompt, contexto=FORMATO_PREGUNTA_MC)
+    return response.text
+
+def parse_multiple_choice_question(raw_data):
+    """
+    Parsea la cadena de texto de la pregunta de opción múltiple generada por Gemini.
+    Tolera las variaciones de formato habituales y repara las salidas recuperables
+    (ver parseo_preguntas.py) en lugar de descartarlas y volver a pedir la pregunta.
+    Retorna una Question con las opciones barajadas, o None si no se pudo reparar.
+    """
+    resultado = analizar_pregunta(raw_data)
+    for reparacion in resultado.reparaciones:
+        incrementar("parseo_preguntas_reparaciones_total", reparacion=reparacion)
+    if not resultado.ok:
+        incrementar("parseo_preguntas_total", resultado="fallido")
+        incrementar("parseo_preguntas_fallidas_total", motivo=resultado.motivo)
+        return None
+
+    incrementar("parseo_preguntas_total", resultado="ok")
+    return _armar_pregunta(resultado.enunciado, resultado.opciones, resultado.indice_correcto, resultado.explicacion)
+
+
+# --- Generación por lotes con salida JSON estructurada ---
+
+# Esquema de respuesta para pedir varias preguntas en una sola llamada
+ESQUEMA_LOTE_PREGUNTAS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "sub_tema": {"type": "string"},
+            "pregunta": {"type": "string"},
+            "opciones": {"type": "array", "items": {"type": "string"}},
+            "indice_correcto": {"type": "integer"},
+            "explicacion": {"type": "string"},
+        },
+        "required": ["sub_tema", "pregunta", "opciones", "indice_correcto", "explicacion"],
+    },
+}
+
+CONFIG_LOTE_PREGUNTAS = {
+    "response_mime_type": "application/json",
+    "response_schema": ESQUEMA_LOTE_PREGUNTAS,
+}
+
+FORMATO_LOTE = """Cuando se te pida un lote de preguntas de opción múltiple, crea preguntas **nuevas, originales y variadas**, una por cada sub-tema de la lista y en el mismo orden.
+Cada pregunta debe tener exactamente 4 opciones de respuesta (sin letras ni prefijos), de las cuales solo una es correcta.
+Para cada pregunta devuelve: "sub_tema" (copiado exactamente de la lista), "pregunta", "opciones" (4 textos),
+"indice_correcto" (0 a 3, posición de la opción correcta) y "explicacion" (breve explicación de por qué es correcta)."""
+
+def _prompt_lote(temas, nivel):
+    lista_temas = "\n".join(f"{i + 1}. {tema}" for i, tema in enumerate(temas))
+    return f"""Crea {len(temas)} preguntas para un estudiante de nivel **"{nivel}"** sobre estos sub-temas:
+{lista_temas}"""
+
+def generar_preguntas_lote(temas, nivel):
+    """
+    Pide al modelo una pregunta de opción múltiple por cada sub-tema de `temas`
+    en una única llamada, con salida JSON según ESQUEMA_LOTE_PREGUNTAS.
+    """
+    prompt = _prompt_lote(temas, nivel)
+    response = _generar('generar_preguntas_lote', prompt, contexto=FORMATO_LOTE, generation_config=CONFIG_LOTE_PREGUNTAS)
+    return response.text
+
+def _armar_pregunta(question_text, opciones, indice_correcto, explanation, sub_tema=""):
+    """Baraja las opciones y arma la Question con el mismo formato que parse_multiple_choice_question."""
+    orden = list(range(len(opciones)))
+    random.shuffle(orden)
+    return Question(
+        question=question_text,
+        options=tuple(f"{chr(65 + i)}) {opciones[j]}" for i, j in enumerate(orden)),
+        correct_answer_char=chr(65 + orden.index(indice_correcto)),
+        explanation=explanation,
+        sub_tema=sub_tema,
+    )
+
+def _validar_item_lote(item, sub_tema=""):
+    """Retorna la pregunta armada si el elemento del lote es válido, o None."""
+    if not isinstance(item, dict):
+        return None
+    pregunta = item.get("pregunta")
+    opciones = item.get("opciones")
+    indice = item.get("indice_correcto")
+    explicacion = item.get("explicacion")
+    if not (isinstance(pregunta, str) and pregunta.strip()):
+        return None
+    if not (isinstance(explicacion, str) and explicacion.strip()):
+        return None
+    if not (isinstance(opciones, list) and len(opciones) == 4):
+        return None
+    opciones = [o.strip() if isinstance(o, str) else "" for o in opciones]
+    if not all(opciones) or len(set(opciones)) != 4:
+        return None
+    if isinstance(indice, bool) or not isinstance(indice, int) or not 0 <= indice < 4:
+        return None
+    return _armar_pregunta(pregunta.strip(), opciones, indice, explicacion.strip(), sub_tema)
+
+def parse_lote_preguntas(raw_data, temas):
+    """
+    Parsea y valida la respuesta JSON de generar_preguntas_lote.
+    Retorna (validas, temas_fallidos): `validas` es una lista de tuplas (sub_tema, pregunta)
+    y `temas_fallidos` los sub-temas cuya pregunta falta o es inválida, para volver a pedirlos.
+    """
+    try:
+        items = json.loads(raw_data)
+    except (TypeError, ValueError):
+        items = None
+    if not isinstance(items, list):
+        incrementar("parseo_preguntas_lote_total", len(temas), resultado="fallido")
+        return [], list(temas)
+
+    pendientes = list(temas)
+    validas = []
+    for posicion, item in enumerate(items):
+        # Se asocia cada elemento a su sub-tema por nombre y, si no coincide, por posición
+        sub_tema = item.get("sub_tema") if isinstance(item, dict) else None
+        if sub_tema not in pendientes:
+            sub_tema = temas[posicion] if posicion < len(temas) and temas[posicion] in pendientes else None
+        if sub_tema is None:
+            continue
+        pregunta = _validar_item_lote(item, sub_tema)
+        if pregunta:
+            validas.append((sub_tema, pregunta))
+            pendientes.remove(sub_tema)
+    incrementar("parseo_preguntas_lote_total", len(validas), resultado="ok")
+    incrementar("parseo_preguntas_lote_total", len(pendientes), resultado="fallido")
+    return validas, pendientes
+
+
+# --- Versiones asíncronas, para la API HTTP (api.py) ---
+# Usan generate_async del mismo backend compartido, así que reutilizan su cliente y sus
+# conexiones, sus reintentos y su circuit breaker.
+
+async def _generar_async(funcion, prompt, coalescer=True, **opciones):
+    """Igual que _generar, pero sin bloquear el event loop."""
+    if coalescer and coalescible(funcion):
+        return await coalescedor.hacer_async(_clave_llamada(prompt, opciones),
+                                             lambda: _generar_async(funcion, prompt, coalescer=False, **opciones), funcion)
+    inicio = time.perf_counter()
+    try:
+        respuesta = await backend_global().generate_async(prompt, instruccion_sistema=INSTRUCCION_SISTEMA, **opciones)
+    except Exception as e:
+        registrar_llamada_modelo(funcion, time.perf_counter() - inicio, error=e)
+        raise
+    registrar_llamada_modelo(funcion, time.perf_counter() - inicio, respuesta)
+    return respuesta
+
+async def explicar_concepto_async(tema, regenerar=False):
+    """Versión asíncrona de explicar_concepto; comparte la misma caché de explicaciones."""
+    prompt = _prompt_explicacion(tema)
+    clave = clave_cache(backend_global().model_name, INSTRUCCION_SISTEMA + prompt, tema)
+    cache = cache_explicaciones()
+    # La caché puede leer y escribir en SQLite: se consulta fuera del event loop
+    guardada = None if regenerar else await asyncio.to_thread(cache.obtener, clave)
+    if guardada is not None:
+        return guardada
+    texto = (await _generar_async('explicar_concepto', prompt, coalescer=not regenerar)).text
+    await asyncio.to_thread(cache.guardar, clave, texto)
+    return texto
+
+async def generar_ejercicio_async(tema, nivel):
+    return (await _generar_async('generar_ejercicio', _prompt_ejercicio(tema, nivel))).text
+
+async def evaluar_respuesta_y_dar_feedback_async(ejercicio, respuesta_estudiante):
+    prompt = _prompt_evaluacion(respuesta_estudiante)
+    return (await _generar_async('evaluar_respuesta_y_dar_feedback', prompt, contexto=_contexto_evaluacion(ejercicio))).text
+
+async def generar_pregunta_multiple_choice_async(tema, nivel):
+    prompt = _prompt_pregunta_multiple_choice(tema, nivel)
+    return (await _generar_async('generar_pregunta_multiple_choice', prompt, contexto=FORMATO_PREGUNTA_MC)).text
+
+async def generar_preguntas_lote_async(temas, nivel):
+    prompt = _prompt_lote(temas, nivel)
+    respuesta = await _generar_async('generar_preguntas_lote', prompt, contexto=FORMATO_LOTE,
+                                     generation_config=CONFIG_LOTE_PREGUNTAS)
+    return respuesta.text